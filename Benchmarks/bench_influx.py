@@ -0,0 +1,37 @@
+import pytest
+from datetime import datetime
+from influx import Influx, AREAS
+from conftest import price_response
+
+# Writing a day of prices for both areas (48 points) to a local stand-in for InfluxDB,
+# one request per point against one request for all of them
+RESPONSE = price_response()
+
+
+@pytest.fixture
+def db(influx_stand_in):
+    db = Influx(url=f"http://127.0.0.1:{influx_stand_in.server_port}", bucket="elpris", org="ucl", token="benchmark")
+    yield db
+    db.exit()
+
+
+def bench_write_per_point(benchmark, db, influx_stand_in):
+    points = [(datetime.fromisoformat(entry["hour"]), area, entry["price"], entry["tarifPrice"])
+              for area, key in AREAS.items() for day in RESPONSE[key].values() for entry in day["prices"]]
+
+    def write():
+        for time, area, price, tarif in points:
+            db.write("prices", time, {"key": "area", "value": area}, {"key": "price", "value": price},
+                     {"key": "tarif_price", "value": tarif})
+
+    before = influx_stand_in.requests
+    write()
+    assert influx_stand_in.requests - before == len(points)
+    benchmark.pedantic(write, rounds=10)
+
+
+def bench_write_batched(benchmark, db, influx_stand_in):
+    before = influx_stand_in.requests
+    assert db.write_prices(RESPONSE)
+    assert influx_stand_in.requests - before == 1
+    benchmark.pedantic(db.write_prices, args=(RESPONSE,), rounds=10)
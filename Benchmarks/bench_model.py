@@ -0,0 +1,40 @@
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.preprocessing import StandardScaler
+from features import DEFAULT_SCHEMA, build_features, feature_columns
+from model_registry import ModelBundle
+from conftest import DAY, dataset
+
+# Feature building and prediction as prediction.py does it for one day, and for training
+HISTORY = dataset()
+TODAY = dataset(days=1, start=DAY, seed=2)
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    """A model trained like prediction_ml.py does, on the synthetic year."""
+    features = build_features(HISTORY, DEFAULT_SCHEMA)
+    complete = features.notna().all(axis=1)
+    scaler = StandardScaler()
+    X = scaler.fit_transform(features[complete])
+    model = MultiOutputRegressor(RandomForestRegressor(n_estimators=100, max_depth=20, random_state=1))
+    model.fit(X, HISTORY.loc[complete, ["west_price", "east_price"]])
+    metadata = {"features": feature_columns(DEFAULT_SCHEMA), "feature_schema": DEFAULT_SCHEMA}
+    return ModelBundle("benchmark", model, scaler, metadata)
+
+
+def bench_build_features_day(benchmark):
+    features = benchmark(build_features, TODAY, DEFAULT_SCHEMA, HISTORY)
+    assert len(features) == 24 and features.notna().all().all()
+
+
+def bench_build_features_year(benchmark):
+    features = benchmark(build_features, HISTORY, DEFAULT_SCHEMA)
+    assert len(features) == len(HISTORY)
+
+
+def bench_predict_day(benchmark, bundle):
+    features = build_features(TODAY, DEFAULT_SCHEMA, HISTORY)
+    predicted = benchmark(bundle.predict, features)
+    assert predicted.shape == (24, 2)
@@ -0,0 +1,58 @@
+import json
+import data_til_esp
+import ml_data
+import prediction
+from features import append_rows
+from conftest import DAY, price_response, dataset
+
+# Turning an Energi Fyn response into the ESP32 schedule and the dataset rows
+RESPONSE = price_response()
+
+
+def bench_prepare_data_esp(benchmark):
+    hours = benchmark(data_til_esp.prepare_data, "west", RESPONSE, 6, 2, 1)
+    assert len(hours) == 6
+
+
+def bench_prepare_data_prediction(benchmark):
+    prices = benchmark(prediction.prepare_data, "west", RESPONSE)
+    assert len(prices) == 24
+
+
+def bench_combine_hourly_data(benchmark):
+    west = prediction.prepare_data("west", RESPONSE)
+    east = prediction.prepare_data("east", RESPONSE)
+    weather = [[float(i) for i in range(24)]] * 3
+    rows = benchmark(ml_data.combine_hourly_data, DAY, *weather, west, east)
+    assert len(rows) == 24
+
+
+def _year_file(tmp_path):
+    """A dataset file with a year of rows, written fresh for every round."""
+    rows = dataset().assign(timestamp=lambda df: df["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S")).to_dict("records")
+    text = json.dumps(rows, indent=4)
+    path = str(tmp_path / "ml_data.json")
+
+    def setup():
+        with open(path, "w") as f:
+            f.write(text)
+        return (), {}
+    return path, setup
+
+
+def _day_rows():
+    return dataset(days=1, start=DAY).assign(timestamp=lambda df: df["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S")).to_dict("records")
+
+
+def bench_save_to_json(benchmark, tmp_path):
+    """One day added to a year of data by ml_data.save_to_json, which rewrites the file."""
+    path, setup = _year_file(tmp_path)
+    rows = _day_rows()
+    benchmark.pedantic(lambda: ml_data.save_to_json(rows, path), setup=setup, rounds=10)
+
+
+def bench_append_rows(benchmark, tmp_path):
+    """The same with features.append_rows, which only writes the new rows."""
+    path, setup = _year_file(tmp_path)
+    rows = _day_rows()
+    benchmark.pedantic(lambda: append_rows(rows, path), setup=setup, rounds=10)
@@ -0,0 +1,22 @@
+import pytest
+import ml_data
+import prediction
+from conftest import observations, stations, DAY
+
+# Turning DMI observations into hourly values, and finding the closest station
+OBSERVATIONS = observations()
+STATIONS = stations()
+ODENSE = [10.3883, 55.3959]
+
+
+@pytest.mark.parametrize("module", [ml_data, prediction], ids=["ml_data", "prediction"])
+def bench_average_hourly(benchmark, module):
+    hourly = benchmark(module.average_hourly, OBSERVATIONS)
+    assert len(hourly) == 24
+
+
+@pytest.mark.parametrize("module", [ml_data, prediction], ids=["ml_data", "prediction"])
+def bench_find_closest_station(benchmark, module):
+    candidates = [station for station in STATIONS if "temp_dry" in station["properties"]["parameterId"]]
+    station = benchmark(module.find_closest_station, candidates, ODENSE)
+    assert "temp_dry" in station["properties"]["parameterId"]
@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import pytest
+
+# The benchmarked code lives in the other folders
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ('Prediction', 'Esp', 'Influx'):
+    sys.path.append(os.path.join(ROOT, folder))
+
+# prediction.py and ml_data.py create a DMI client when they are imported; it needs a key,
+# but the benchmarks never call DMI
+os.environ.setdefault("DMI_MET_OBS", "benchmark")
+
+DAY = datetime(2024, 5, 1)
+
+
+def daily_curve(seed):
+    """24 hourly prices with a morning and an evening peak."""
+    rng = np.random.default_rng(seed)
+    hour = np.arange(24)
+    curve = 1.5 + 0.6 * np.exp(-((hour - 8) ** 2) / 6) + 0.9 * np.exp(-((hour - 18) ** 2) / 6)
+    return np.round(curve + rng.normal(0, 0.1, 24), 4)
+
+
+def price_response(day=DAY):
+    """An Energi Fyn consumptionprice response for one day, both areas."""
+    response = {}
+    for seed, key in enumerate(("westPrices", "eastPrices")):
+        prices = daily_curve(seed)
+        response[key] = {day.strftime("%d-%m-%Y"): {"prices": [
+            {"hour": (day + timedelta(hours=hour)).isoformat(), "price": float(price), "tarifPrice": round(float(price) * 0.3, 4)}
+            for hour, price in enumerate(prices)
+        ]}}
+    return response
+
+
+def observations(day=DAY, minutes=10, seed=1):
+    """DMI observations for one day and parameter, one every `minutes`, newest first like the API."""
+    rng = np.random.default_rng(seed)
+    count = 24 * 60 // minutes
+    values = 10 + 5 * np.sin(np.arange(count) / count * 2 * np.pi) + rng.normal(0, 0.5, count)
+    return [{"properties": {"observed": (day + timedelta(minutes=i * minutes)).isoformat() + "Z", "value": float(value)}}
+            for i, value in reversed(list(enumerate(values)))]
+
+
+def stations(count=10000, seed=1):
+    """DMI stations spread over Denmark, with the parameters some of them measure."""
+    rng = np.random.default_rng(seed)
+    parameters = ("cloud_cover", "temp_dry", "wind_speed")
+    return [{
+        "geometry": {"coordinates": [float(rng.uniform(8, 13)), float(rng.uniform(54.5, 57.7))]},
+        "properties": {"stationId": f"{i:05d}", "parameterId": [p for p in parameters if rng.random() < 0.5]},
+    } for i in range(count)]
+
+
+def dataset(days=365, start=DAY - timedelta(days=365), seed=1):
+    """Hourly rows in the ml_data.json format."""
+    rng = np.random.default_rng(seed)
+    hours = days * 24
+    timestamps = pd.date_range(start, periods=hours, freq="h")
+    west = np.concatenate([daily_curve(seed + day) for day in range(days)])
+    return pd.DataFrame({
+        "timestamp": timestamps,
+        "cloud_cover": rng.uniform(0, 100, hours).round(1),
+        "temperature": (8 + 8 * np.sin((timestamps.dayofyear - 100) / 365 * 2 * np.pi) + rng.normal(0, 2, hours)).round(1),
+        "wind_speed": rng.gamma(2, 2.5, hours).round(1),
+        "west_price": west,
+        "east_price": (west * 1.05).round(4),
+    })
+
+
+class WriteHandler(BaseHTTPRequestHandler):
+    """Answers InfluxDB writes like the real server, without storing anything."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests += 1
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def influx_stand_in():
+    """URL of a local server that accepts InfluxDB writes."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WriteHandler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
@@ -0,0 +1,54 @@
+import time
+import numpy as np
+from fleet import schedule_fleet, fleet_cost
+
+# Benchmark of the fleet scheduler: 10,000 heat pumps on a day of 96 quarter-hour slots
+DEVICES = 10000
+SLOTS = 96
+REPEATS = 5
+
+
+def make_fleet(devices=DEVICES, slots=SLOTS, seed=1):
+    """Random but realistic fleet: a daily price curve, 4-10 hours per device, some blocked hours."""
+    rng = np.random.default_rng(seed)
+    hour = np.arange(slots) * 24 / slots
+    prices = 1.5 + 0.8 * np.sin((hour - 9) / 24 * 2 * np.pi) + 0.5 * np.exp(-((hour - 18) ** 2) / 4) + rng.normal(0, 0.1, slots)
+    hours = rng.integers(4, 11, devices) * slots // 24
+    loads = rng.uniform(1.0, 3.0, devices)
+
+    # Every device is blocked for a random 2-6 hour window (e.g. when the household is home)
+    allowed = np.ones((devices, slots), dtype=bool)
+    starts = rng.integers(0, slots, devices)
+    lengths = rng.integers(2, 7, devices) * slots // 24
+    columns = np.arange(slots)
+    allowed &= ~((columns >= starts[:, None]) & (columns < (starts + lengths)[:, None]))
+    return prices, hours, loads, allowed
+
+
+def main():
+    prices, hours, loads, allowed = make_fleet()
+
+    # The cap is 20 % above the load if the total demand was spread evenly over the day
+    cap = 1.2 * (loads * hours).sum() / SLOTS
+
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        plan, overflow = schedule_fleet(prices, hours, cap, loads, allowed)
+        timings.append(time.perf_counter() - start)
+
+    load = loads @ plan
+    print(f"{DEVICES} devices x {SLOTS} slots")
+    print(f"Time: best {min(timings) * 1000:.1f} ms, mean {np.mean(timings) * 1000:.1f} ms over {REPEATS} runs")
+    print(f"Cost: {fleet_cost(prices, plan, loads):.0f}")
+    print(f"Peak load: {load.max():.0f} kW (cap {cap:.0f} kW), overflow {overflow.sum():.0f} kW")
+
+    # For comparison: every device takes its own cheapest allowed slots
+    masked = np.where(allowed, prices, np.inf)
+    ranks = np.argsort(np.argsort(masked, axis=1, kind='stable'), axis=1)
+    selfish = ranks < hours[:, None]
+    print(f"Everybody cheapest: cost {fleet_cost(prices, selfish, loads):.0f}, peak load {(loads @ selfish).max():.0f} kW")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,42 @@
 import requests
 from datetime import datetime
+from scheduler import plan
 
+# API URL to fetch electricity prices from Energi Fyn
+API_URL = "https://api.energifyn.dk/api/graph/consumptionprice?date="
+FETCH_TIMEOUT = 10  # Seconds, so a slow API can't hang the caller
 
-# Get the current date in the format "dd-mm-yyyy"
-time = datetime.now()
-time = time.strftime("%d-%m-%Y")
-
-# Define the API URL to fetch electricity prices from Energi Fyn
-url = "https://api.energifyn.dk/api/graph/consumptionprice?date="+time
-
-# Make a GET request to the API
-response = requests.get(url)
+def fetch_prices(day=None, timeout=FETCH_TIMEOUT):
+    """
+    Fetch the prices for a day (default today) from Energi Fyn and return the parsed JSON response.
+    Raises requests.RequestException if the API can't be reached or answers with an error.
+    """
+    # Get the date in the format "dd-mm-yyyy"
+    day = day or datetime.now()
+    response = requests.get(API_URL + day.strftime("%d-%m-%Y"), timeout=timeout)
+    response.raise_for_status()
+    return response.json()
 
-# Parse the JSON response
-response_data = response.json()
+def area_prices(EW: str, data: dict):
+    """
+    Get the list of {"hour": ..., "price": ...} entries for East or West from an Energi Fyn response.
+    Returns None if the area is unknown or there are no prices in the response.
+    """
+    ugh = {'east': 'eastPrices', 'west': 'westPrices'}.get(EW.lower())
+    if ugh is None or not data.get(ugh):
+        return None
+    # Get the first available date key in the data
+    key = next(iter(data[ugh]))
+    return data[ugh][key].get("prices") or None
 
-def prepare_data(EW: str, data: dict, timer_aktiv: int):
+def prepare_data(EW: str, data: dict, timer_aktiv: int, min_run=1, min_off=1, max_starts=None, must_run=()):
     """
     This function takes the convoluted mess of data from energi Fyn and transforms it 
     into a set of times that the price is lowest. The function call looks like this:
     prepare_data(East/West of storebaelt (string), The data from Energi Fyn (dict), Amount of hours you want to receive (int))
+
+    The heat pump constraints are optional (see scheduler.plan):
+    min_run/min_off (minimum hours on/off in a row), max_starts (per day) and must_run (hour indexes that must be on)
     """
     # Convert the region string to lowercase for case-insensitive comparison
     EW = EW.lower()
@@ -36,45 +53,28 @@ def prepare_data(EW: str, data: dict, timer_aktiv: int):
         error = "You can only get prices from East and West"
         return error
     
-    # Get the first available date key in the data
-    key = response_data[ugh].keys()
-    key = next(iter(key))
-
-    # Extract the prices data for the specified date
-    short_data = response_data[ugh][key]["prices"]
-    data_data = [] # To store price and time data
-    esp_data = [] # To store the final extracted times
-
-    # Store the number of hours (lowest prices) to retrieve
-    timer_aktiv = timer_aktiv
-
-    # Loop through the price data and build a list of dictionaries with time and price
-    for data in short_data:
-        # Add the hour and price information
-        data_data.append({"hour": data['hour'], "price": data["price"]})
+    # Extract the prices data for the first available date in the data
+    short_data = area_prices(EW, data)
+    if short_data is None:
+        return "No prices available for " + ugh
 
-    # Sort the list based on the 'price' key in ascending order
-    sorted_data = sorted(data_data, key=lambda x: x['price'])
+    # Find the cheapest plan that respects the heat pump constraints
+    prices = [entry["price"] for entry in short_data]
+    schedule = plan(prices, timer_aktiv, min_run, min_off, max_starts, must_run)
 
-    final_data = [] # To store the sorted times with the lowest prices
+    # Extract only the hour part from the "hour" field (split on 'T') for the hours that are on
+    esp_data = [entry['hour'].split("T")[1] for entry, on in zip(short_data, schedule) if on]
 
-    # Collect the times corresponding to the lowest prices, up to the limit of 'timer_aktiv'
-    for data in sorted_data:
-        final_data.append(data['hour'])
-        if len(final_data) == timer_aktiv:
-            break # Stop once the required number of hours is collected
-    
-    # Extract only the hour part from the "hour" field (split on 'T')
-    for data in final_data:
-        data = data.split("T")
-        esp_data.append(data[1]) # Append the hour (second part of the split)
-    
     # sorter efter tid
     esp_data.sort()
 
     return esp_data # Return the list of times with the lowest prices
 
 
-# Example usage of the function to get 6 hours of lowest prices for West and East
-print("west data: ", prepare_data("West", response_data, 5))
-print("east data: ", prepare_data("east", response_data, 6))
\ No newline at end of file
+if __name__ == "__main__":
+    response_data = fetch_prices()
+
+    # Example usage of the function to get 6 hours of lowest prices for West and East
+    print("west data: ", prepare_data("West", response_data, 5))
+    print("east data: ", prepare_data("east", response_data, 6))
+    print("west data, min. 2 hours per run: ", prepare_data("West", response_data, 6, min_run=2, min_off=2))
\ No newline at end of file
@@ -0,0 +1,125 @@
+import numpy as np
+from scheduler import plan as plan_device
+
+
+def schedule_fleet(prices, hours, load_cap, loads=None, allowed=None, must_run=None, min_run=1, min_off=1, max_starts=None):
+    """
+    Assign run slots to a fleet of heat pumps under a cap on the total load per slot.
+
+    If every household just takes its own cheapest hours, they all run at the same time
+    and create a new peak. Here the slots are filled from the cheapest one up until the cap
+    is reached, and the devices with the least room to move get their slot first: a device
+    whose remaining allowed slots are all needed is always picked.
+
+    This is a greedy heuristic, not an optimiser. With equal loads and no restrictions it
+    gives the lowest possible total cost, but with allowed/must-run restrictions or different
+    loads a device can take a slot that another device needed more, and the plan can cost
+    a little more than the optimum.
+
+    Everything works on the whole fleet at once with NumPy, one step per slot.
+
+    Devices with run-length constraints (min_run, min_off, max_starts) can't be filled slot by
+    slot. They are planned first, one at a time with scheduler.plan, each avoiding the slots
+    the devices before it have filled up; the rest of the fleet then fills what is left. That
+    costs a dynamic programme per constrained device, so it is much slower for those devices.
+
+    Args:
+        prices (array): Price per slot, shape (slots,).
+        hours (array): Slots each device must run, shape (devices,).
+        load_cap (float or array): Maximum total load per slot (kW), a number or shape (slots,).
+        loads (array): Load of each device when running (kW), default 1 for all.
+        allowed (array): True where a device may run, shape (devices, slots), default all.
+        must_run (array): True where a device has to run, shape (devices, slots), default none.
+        min_run (int or array): Minimum slots in a row once a device is started, per device.
+        min_off (int or array): Minimum slots in a row a device is off between runs, per device.
+        max_starts (int or list): Maximum starts per device, None for no limit (also per device).
+
+    Returns:
+        tuple: (plan, overflow) where plan is a (devices, slots) bool array and overflow is the
+               load above the cap per slot (all zeros when the cap could be kept).
+    """
+    prices = np.asarray(prices, dtype=float)
+    hours = np.asarray(hours, dtype=np.int64)
+    n_devices, n_slots = len(hours), len(prices)
+
+    loads = np.ones(n_devices) if loads is None else np.asarray(loads, dtype=float)
+    cap = np.broadcast_to(np.asarray(load_cap, dtype=float), (n_slots,))
+    allowed = np.ones((n_devices, n_slots), dtype=bool) if allowed is None else np.asarray(allowed, dtype=bool)
+    must_run = np.zeros((n_devices, n_slots), dtype=bool) if must_run is None else np.asarray(must_run, dtype=bool)
+
+    plan = must_run.copy()
+    needed = hours - plan.sum(axis=1)
+    if (needed < 0).any():
+        raise ValueError("Some devices have more must-run slots than hours")
+
+    # Slots left to choose from; the must-run slots are already taken
+    free = allowed & ~must_run
+    if (free.sum(axis=1) < needed).any():
+        raise ValueError("Some devices don't have enough allowed slots")
+
+    # The devices with run-length constraints go first, the least flexible one first
+    min_run = np.broadcast_to(np.asarray(min_run, dtype=np.int64), (n_devices,))
+    min_off = np.broadcast_to(np.asarray(min_off, dtype=np.int64), (n_devices,))
+    max_starts = list(max_starts) if isinstance(max_starts, (list, tuple, np.ndarray)) else [max_starts] * n_devices
+    limited = np.array([starts is not None for starts in max_starts], dtype=bool)
+    constrained = np.flatnonzero((min_run > 1) | (min_off > 1) | limited)
+    constrained = constrained[np.argsort(free[constrained].sum(axis=1) - needed[constrained], kind='stable')]
+
+    used = loads @ must_run
+    for device in constrained:
+        used -= loads[device] * must_run[device]
+        full = used + loads[device] > cap
+        arguments = (prices, hours[device], min_run[device], min_off[device], max_starts[device], np.flatnonzero(must_run[device]))
+        try:
+            row = plan_device(*arguments, np.flatnonzero(~allowed[device] | (full & ~must_run[device])))
+        except ValueError:
+            # No plan fits under the cap, go over it where it is cheapest
+            try:
+                row = plan_device(*arguments, np.flatnonzero(~allowed[device]))
+            except ValueError:
+                raise ValueError(f"Device {device} can't keep its run-length constraints") from None
+        plan[device] = row
+        used += loads[device] * plan[device]
+    needed[constrained] = 0
+    free[constrained] = False
+
+    # Visit the slots from the cheapest; remaining[i] counts the allowed slots device i has left
+    order = np.argsort(prices, kind='stable')
+    remaining = free.sum(axis=1)
+
+    for slot in order:
+        candidates = np.flatnonzero(free[:, slot] & (needed > 0))
+        remaining[free[:, slot]] -= 1
+        if len(candidates) == 0:
+            continue
+
+        # Slack: how many of the slots still to come the device could skip
+        slack = remaining[candidates] - needed[candidates]
+        forced = candidates[slack < 0]
+        optional = candidates[slack >= 0]
+
+        # Forced devices always run, the rest fill the capacity left, least slack first
+        space = cap[slot] - used[slot] - loads[forced].sum()
+        if len(optional) and space > 0:
+            optional = optional[np.argsort(slack[slack >= 0], kind='stable')]
+            fits = np.cumsum(loads[optional]) <= space
+            optional = optional[fits]
+        else:
+            optional = optional[:0]
+
+        chosen = np.concatenate([forced, optional])
+        plan[chosen, slot] = True
+        needed[chosen] -= 1
+        used[slot] += loads[chosen].sum()
+
+    if (needed > 0).any():
+        raise ValueError("The load cap leaves some devices without enough slots")
+
+    overflow = np.maximum(used - cap, 0)
+    return plan, overflow
+
+
+def fleet_cost(prices, plan, loads=None):
+    """Returns the total cost of a fleet plan (price times load for every slot that is on)."""
+    loads = np.ones(plan.shape[0]) if loads is None else np.asarray(loads, dtype=float)
+    return float(loads @ plan @ np.asarray(prices, dtype=float))
@@ -0,0 +1,294 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from scheduler import plan
+from data_til_esp import fetch_prices, area_prices
+
+# The Influx class lives in the Influx folder next to this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Influx'))
+from influx import Influx
+
+load_dotenv()
+
+
+class HorizonPlanner:
+    """
+    Plans the heat pump over a rolling window (default 48 hours) that crosses midnight.
+
+    Actual prices from Energi Fyn are used where they are published, and predicted prices
+    fill in the rest of the window. Every slot in the plan says whether its price is predicted.
+    prediction.py only predicts days that have passed (the model needs observed weather), so
+    the predictions for the coming hours are normally the price profile (load_profile_prices).
+
+    The heat pump has to run hours_per_day on every calendar day. What already ran earlier
+    in the day counts, so each day in the window is planned for what it still needs. Only
+    the part of the plan from the first slot whose price changed is planned again; the slots
+    before it are kept, so the plan the device already follows doesn't jump around every
+    time new prices arrive.
+
+    python horizon.py --simulate re-plans a week hour by hour and checks the hours per day.
+    """
+
+    def __init__(self, hours_per_day, horizon_hours=48, slot_minutes=60, min_run=1, min_off=1, max_starts=None):
+        self.hours_per_day = hours_per_day
+        self.slot = timedelta(minutes=slot_minutes)
+        self.slots = horizon_hours * 60 // slot_minutes
+        self.slots_per_day = 24 * 60 // slot_minutes
+        self.min_run = min_run
+        self.min_off = min_off
+        self.max_starts = max_starts
+
+        self.actual = {}     # slot start -> actual price
+        self.predicted = {}  # slot start -> predicted price
+        self.history = {}    # slot start -> True/False, what was planned for slots that have passed
+        self.last_plan = []  # [(slot start, price, on)] from the last call to plan()
+
+    def set_prices(self, prices, predicted=False):
+        """
+        Add prices to the planner.
+
+        Args:
+            prices (dict): Slot start (datetime) -> price.
+            predicted (bool): Whether these are model predictions or published prices.
+        """
+        (self.predicted if predicted else self.actual).update(prices)
+
+    def _slot_start(self, now):
+        minutes = (now.hour * 60 + now.minute) // (self.slot.seconds // 60) * (self.slot.seconds // 60)
+        return now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=minutes)
+
+    def _initial_state(self, start):
+        """How long the pump has been on/off before the window starts, from the earlier plans."""
+        previous = self.history.get(start - self.slot)
+        if previous is None:
+            return False, None
+        length = 0
+        time = start - self.slot
+        while self.history.get(time) == previous and length < max(self.min_run, self.min_off):
+            length += 1
+            time -= self.slot
+        return previous, length
+
+    def plan(self, now=None):
+        """
+        Plan the window starting at the current slot.
+
+        Returns:
+            list: One dict per slot with 'time', 'price', 'predicted' and 'on'.
+        """
+        start = self._slot_start(now or datetime.now())
+        times = [start + i * self.slot for i in range(self.slots)]
+
+        # Stop at the first slot without any price, the window can't be planned past it
+        prices = []
+        for time in times:
+            price = self.actual.get(time, self.predicted.get(time))
+            if price is None:
+                break
+            prices.append(price)
+        times = times[:len(prices)]
+
+        # Remember what was planned for the slots that have passed since the last plan
+        previous = {time: (price, on) for time, price, on in self.last_plan}
+        for time, (_, on) in previous.items():
+            if time < start:
+                self.history[time] = on
+        for time in [time for time in self.history if time < start - timedelta(days=2)]:
+            del self.history[time]
+
+        # Keep the slots from before the first changed price, plan the rest again
+        keep = 0
+        for time, price in zip(times, prices):
+            if previous.get(time, (None,))[0] != price:
+                break
+            keep += 1
+
+        try:
+            schedule = self._plan_from(times, prices, keep, previous)
+        except ValueError:
+            # The kept part can make the rest impossible, then plan the whole window again
+            schedule = self._plan_from(times, prices, 0, previous)
+
+        self.last_plan = list(zip(times, prices, schedule))
+        return [
+            {'time': time, 'price': price, 'predicted': time not in self.actual, 'on': on}
+            for time, price, on in self.last_plan
+        ]
+
+    def _plan_from(self, times, prices, keep, previous):
+        """Keep the first `keep` slots of the previous plan and plan the rest of the window."""
+        kept = [previous[time][1] for time in times[:keep]]
+
+        initial_on, initial_length = self._initial_state(times[keep]) if keep < len(times) else (False, None)
+        if keep:
+            # The state at the end of the kept part is the starting point for the rest
+            initial_on = kept[-1]
+            initial_length = 0
+            for on in reversed(kept):
+                if on != initial_on:
+                    break
+                initial_length += 1
+
+        rest = []
+        if keep < len(times):
+            needed, checkpoints = self._day_targets(times, kept)
+            rest = plan(
+                prices[keep:],
+                needed,
+                self.min_run,
+                self.min_off,
+                self.max_starts,
+                initial_on=initial_on,
+                initial_length=initial_length,
+                checkpoints=checkpoints,
+            )
+
+        return kept + rest
+
+    def _day_targets(self, times, kept):
+        """
+        How many slots the part of the window after `kept` must run, in total and per day.
+
+        Every calendar day gets hours_per_day, counting what already ran that day (history)
+        and the kept slots. A day that is only partly in the window gets its share so far;
+        it is completed when the next plans see the rest of it. If the window starts in the
+        middle of a day without history, the day gets what still fits.
+
+        Returns:
+            tuple: (total slots, checkpoints for scheduler.plan)
+        """
+        keep = len(kept)
+        per_day = self.hours_per_day * self.slots_per_day // 24
+        done = {}
+        for time, on in self.history.items():
+            if on and time < times[0]:
+                done[time.date()] = done.get(time.date(), 0) + 1
+        for time, on in zip(times, kept):
+            if on:
+                done[time.date()] = done.get(time.date(), 0) + 1
+
+        days = {}  # date -> slot indexes in the rest of the window
+        for i, time in enumerate(times[keep:]):
+            days.setdefault(time.date(), []).append(i)
+
+        checkpoints = {}
+        total = 0
+        for day, slots in days.items():
+            day_start = datetime.combine(day, datetime.min.time())
+            seen = int((times[-1] + self.slot - day_start) / self.slot)
+            target = per_day if seen >= self.slots_per_day else round(per_day * seen / self.slots_per_day)
+            if done.get(day, 0) > target:
+                raise ValueError("The kept slots run longer than the day allows")
+            total += min(target - done.get(day, 0), len(slots))
+            checkpoints[slots[-1] + 1] = total
+        return total, checkpoints
+
+
+def load_actual_prices(planner, area, days=(0, 1)):
+    """
+    Fetch the published prices for today and tomorrow from Energi Fyn.
+
+    Tomorrow's prices are only published in the afternoon; before that the day is skipped.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in days:
+        entries = area_prices(area, fetch_prices(today + timedelta(days=offset)))
+        if entries:
+            planner.set_prices({datetime.fromisoformat(entry['hour']): entry['price'] for entry in entries})
+
+
+def load_profile_prices(planner, db, area, horizon_hours=48):
+    """
+    Fill the planning window with the mean price per weekday and hour from the profile rollup.
+
+    This is the fallback before tomorrow's prices are published: stored predictions and
+    actual prices that are loaded afterwards replace it where they exist.
+    """
+    profile = {(row['weekday'], row['hour']): row['mean'] for row in db.read_price_profile(area) if row['mean'] is not None}
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    times = [start + timedelta(hours=i) for i in range(horizon_hours)]
+    planner.set_prices(
+        {time: profile[(time.weekday(), time.hour)] for time in times if (time.weekday(), time.hour) in profile},
+        predicted=True,
+    )
+
+
+def load_predicted_prices(planner, db, area, horizon_hours=48):
+    """
+    Read the stored predictions for the planning window from InfluxDB.
+
+    prediction.py predicts days that have passed, so this only finds something for the
+    window if predictions for the coming hours have been written by other means.
+    """
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    rows = db.read_predicted_vs_actual(start, start + timedelta(hours=horizon_hours), area)
+    # Times are written without timezone (as local time), so drop the UTC marker again
+    planner.set_prices(
+        {row['time'].replace(tzinfo=None): row['predicted'] for row in rows if row['predicted'] is not None},
+        predicted=True,
+    )
+
+
+def daily_hours(planner):
+    """Slots on per calendar day in what has been planned so far (history and the last plan)."""
+    days = {}
+    for time, on in list(planner.history.items()) + [(time, on) for time, _, on in planner.last_plan]:
+        days[time.date()] = days.get(time.date(), 0) + on
+    return days
+
+
+def simulate(days=7, hours_per_day=6, seed=1):
+    """
+    Re-plan every hour for `days` days with noisy predictions that are replaced by the actual
+    prices day by day, and check that every whole day ran exactly hours_per_day.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    planner = HorizonPlanner(hours_per_day=hours_per_day, min_run=2, min_off=1)
+    start = datetime(2024, 1, 1)
+    actual = {start + timedelta(hours=i): round(1.5 + np.sin(i / 24 * 2 * np.pi) + rng.normal(0, 0.4), 2)
+              for i in range((days + 3) * 24)}
+    planner.set_prices({time: price + rng.normal(0, 0.3) for time, price in actual.items()}, predicted=True)
+
+    ran = {}
+    for hour in range(days * 24 + 1):
+        now = start + timedelta(hours=hour)
+        if now.hour == 13:  # Tomorrow's prices are published
+            tomorrow = now.replace(hour=0) + timedelta(days=1)
+            planner.set_prices({time: price for time, price in actual.items() if tomorrow <= time < tomorrow + timedelta(days=1)})
+        if hour == 0:
+            planner.set_prices({time: price for time, price in actual.items() if time < start + timedelta(days=1)})
+        planner.plan(now)
+        if now.hour == 0 and hour:
+            # Yesterday is in the history now
+            yesterday = (now - timedelta(days=1)).date()
+            ran[yesterday] = daily_hours(planner).get(yesterday, 0)
+
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).date()
+        print(f"{day}: {ran.get(day, 0)} hours")
+        if ran.get(day, 0) != hours_per_day:
+            raise ValueError(f"{day} ran {ran.get(day, 0)} hours, not {hours_per_day}")
+
+
+if __name__ == "__main__":
+    if "--simulate" in sys.argv:
+        simulate()
+        sys.exit()
+
+    area = sys.argv[1] if len(sys.argv) > 1 else "west"
+    planner = HorizonPlanner(hours_per_day=6, min_run=2, min_off=1)
+
+    token = os.getenv('influxToken')
+    if token:
+        db = Influx(url="http://localhost:8086", org="ucl", token=token, bucket="elpris")
+        load_profile_prices(planner, db, area)
+        load_predicted_prices(planner, db, area)
+        db.exit()
+    load_actual_prices(planner, area)
+
+    for slot in planner.plan():
+        marker = "*" if slot['predicted'] else " "
+        print(f"{slot['time']:%d-%m %H:%M} {slot['price']:6.2f}{marker} {'ON' if slot['on'] else ''}")
+    print("* = predicted price")
@@ -1,16 +1,53 @@
-import network, time, machine, ucryptolib, ubinascii, os
+import network, time, machine, ucryptolib, ubinascii, os, esp32, gc
 import ujson as json
 import uasyncio as asyncio
 from machine import Pin
+import telemetry
+from telemetry import debug, info, warning, error
+
+BOOT_TICKS = time.ticks_ms()  # For measuring boot-to-connected time
 
 # Pin Configuration
 LED_PIN = 4          # GPIO for the state LED
-BUTTON_PIN = 5       # GPIO for the Reset button
+BUTTON_PIN = 27      # GPIO for the Reset button (an RTC GPIO, so it can wake the device)
+RELAY_PIN = 18       # GPIO for the heat pump output (1 = run)
 CONFIG_FILE = "wifi_config.json"
-
-# Setup LED and Button
+FAST_CONNECT_FILE = "wifi_fast.json"  # BSSID and channel of the last access point we connected to
+FAST_CONNECT_TIMEOUT_MS = 3000        # Fall back to a full scan if the saved access point doesn't answer
+FAST_CONNECT_ATTEMPTS = 3             # Forget the saved access point after this many failed fast connects in a row
+SCHEDULE_FILE = "schedule.json"
+INDEX_FILE = "index.html"  # The Wi-Fi configuration page, served from flash
+
+# Schedule server (Esp/schedule_server.py) and how often to ask it for a new schedule
+SCHEDULE_HOST = "192.168.1.10"
+SCHEDULE_PORT = 8080
+SCHEDULE_PATH = "/schedule?area=west&hours=6&slots=24"
+SCHEDULE_POLL = 15 * 60  # Seconds between polls
+UTC_OFFSET = 3600        # The RTC runs in UTC after NTP sync, the schedule is in Danish time (CET, +1 h in summer)
+
+# Telemetry is sent to the ingest service (Influx/ingest.py) whenever the schedule is polled
+INGEST_HOST = SCHEDULE_HOST
+INGEST_PORT = 8087
+INGEST_PATH = "/telemetry"
+TELEMETRY_RECORDS = 256  # Size of the ring buffer (12 bytes per record)
+
+# Power saving between schedule events: "awake" (no sleep), "light" (lightsleep) or "deep" (deepsleep)
+POWER_MODE = "light"
+MIN_SLEEP = 30           # Don't bother sleeping for less than this many seconds
+AWAKE_GRACE = 2          # Seconds to stay awake after an event, so the tasks can finish
+
+# Button handling
+BUTTON_DEBOUNCE_MS = 50
+LONG_PRESS_MS = 5000     # Hold the button this long to reset the Wi-Fi configuration
+
+# Setup LED, Button and Relay
 led = Pin(LED_PIN, Pin.OUT)
 button = Pin(BUTTON_PIN, Pin.IN, Pin.PULL_UP)
+relay = Pin(RELAY_PIN, Pin.OUT, hold=True)  # hold keeps the output while sleeping
+esp32.gpio_deep_sleep_hold(True)
+
+# Telemetry records, tagged with the chip's unique id
+events = telemetry.Telemetry(ubinascii.hexlify(machine.unique_id()).decode(), TELEMETRY_RECORDS)
 
 # Wi-Fi Interfaces
 sta_if = network.WLAN(network.STA_IF)  # Station Interface (Client Mode)
@@ -23,99 +60,135 @@ STATE_CONNECTED = 3     # Connected state
 STATE_ERROR = 4         # Error state
 current_state = None
 
+def set_state(state):
+    global current_state
+    if state != current_state:
+        current_state = state
+        events.record(telemetry.STATE, state)
+
 # AES Encryption/Decryption key (16 bytes)
 KEY = b"mysecretkey12345"  # Must be 16, 24, or 32 bytes long
 
+# The decrypted Wi-Fi configuration, loaded once per session
+wifi_config_cache = None
+connected_once = False
+
 # Function to check button press
 def is_button_pressed():
-    pressed = button.value() == 0
-    print(f"Button pressed: {pressed}")
-    return pressed
+    return button.value() == 0
+
+# The button interrupt only notes the edge; button_handler does the work outside the interrupt
+button_flag = asyncio.ThreadSafeFlag()
+button_last_edge = 0
+
+def button_irq(pin):
+    global button_last_edge
+    now = time.ticks_ms()
+    if time.ticks_diff(now, button_last_edge) < BUTTON_DEBOUNCE_MS:
+        return  # Contact bounce
+    button_last_edge = now
+    button_flag.set()
+
+async def wait_for_release():
+    while is_button_pressed():
+        try:
+            # Check the level now and then too, in case the release edge was debounced away
+            await asyncio.wait_for_ms(button_flag.wait(), 100)
+        except asyncio.TimeoutError:
+            pass
+
+# Button press detection for resetting Wi-Fi configuration
+async def button_handler():
+    while True:
+        await button_flag.wait()
+        if not is_button_pressed():
+            continue  # Release edge or bounce
+
+        try:
+            # Wait for the release edge; if it doesn't come within LONG_PRESS_MS it is a long press
+            await asyncio.wait_for_ms(wait_for_release(), LONG_PRESS_MS)
+        except asyncio.TimeoutError:
+            info("Resetting Wi-Fi configuration")
+            if CONFIG_FILE in os.listdir():
+                os.remove(CONFIG_FILE)
+            machine.reset()
+
+        info("Button press too short for reset. Rebooting the device.")
+        machine.reset()  # Reboot if pressed for a short time but not long enough for reset
+
+def setup_button():
+    button.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=button_irq)
+    esp32.wake_on_ext0(pin=button, level=esp32.WAKEUP_ALL_LOW)  # The button also wakes the device
+    if is_button_pressed():
+        button_flag.set()  # Held down during boot
 
 # Save Wi-Fi credentials to a file with encryption
 def save_wifi_config(ssid, password):
-    print(f"Entering save_wifi_config with SSID: {ssid} and Password: {password}")
+    debug("Saving Wi-Fi configuration for SSID: %s", ssid)
     try:
         # Ensure the password is not empty
         if not password:
             raise ValueError("Password cannot be empty.")
-        
-        # Print the encryption key for debugging
-        print(f"Using Encryption Key: {KEY}")
 
         encrypted_password = encrypt_password(password)
-        print(f"Saving config: SSID={ssid}, Encrypted Password={encrypted_password}")
-
-        # Debug: Check if the config file exists before writing
-        if CONFIG_FILE in os.listdir():
-            print(f"{CONFIG_FILE} exists. Overwriting...")
-        else:
-            print(f"{CONFIG_FILE} does not exist. Creating new file...")
-
         with open(CONFIG_FILE, "w") as f:
             json.dump({"ssid": ssid, "password": encrypted_password}, f)
-        print("Wi-Fi configuration saved successfully.")
+        info("Wi-Fi configuration saved.")
+
+        # A new network, so the cached configuration and access point are no longer valid
+        global wifi_config_cache
+        wifi_config_cache = None
+        if FAST_CONNECT_FILE in os.listdir():
+            os.remove(FAST_CONNECT_FILE)
     except Exception as e:
-        print(f"Error saving Wi-Fi config: {e}")
+        error("Error saving Wi-Fi config: %s", e)
 
 # Load Wi-Fi credentials from a file and decrypt the password
 def load_wifi_config():
-    print("Attempting to load Wi-Fi configuration...")
+    global wifi_config_cache
+    # Retries use the copy in RAM instead of reading and decrypting the file again
+    if wifi_config_cache is not None:
+        return wifi_config_cache
 
-    # Debug: Check if the config file exists
-    if CONFIG_FILE in os.listdir():
-        print(f"{CONFIG_FILE} found. Proceeding to load...")
-    else:
-        print(f"{CONFIG_FILE} does not exist. Cannot load configuration.")
+    if CONFIG_FILE not in os.listdir():
+        debug("%s does not exist. Cannot load configuration.", CONFIG_FILE)
         return None
 
     try:
         with open(CONFIG_FILE, "r") as f:
             config = json.load(f)
-            print(f"Loaded config: {config}")
             config['password'] = decrypt_password(config['password'])  # Decrypt the password
-            print(f"Decrypted Password: {config['password']}")
+            debug("Loaded Wi-Fi configuration for SSID: %s", config['ssid'])
+            wifi_config_cache = config
             return config
     except OSError as e:
-        print(f"Error loading Wi-Fi config: {e}")
+        error("Error loading Wi-Fi config: %s", e)
         return None
     except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {CONFIG_FILE}: {e}")
+        error("Error decoding JSON from %s: %s", CONFIG_FILE, e)
         return None
 
 # Encryption function
 def encrypt_password(password):
-    print(f"Encrypting password: {password}")
-
-    # Debug: Print key information
-    print(f"Using encryption key: {KEY}")
-    print(f"Key Length: {len(KEY)} bytes")
-    print(f"Key Type: {type(KEY)}")
-
     # Pad the password to be a multiple of 16 bytes
     padded_password = password + (16 - len(password) % 16) * ' '
-    print(f"Padded Password: '{padded_password}' (Length: {len(padded_password)})")  # Debug: Show padded password
 
     try:
         # Create AES cipher in ECB mode
         cipher = ucryptolib.aes(KEY, 1)  # 1 is for ECB mode
-        print("Cipher initialized successfully.")
 
         # Encrypt the padded password
         encrypted = cipher.encrypt(padded_password.encode('utf-8'))
-        print(f"Encrypted data (bytes): {encrypted}")  # Debug: Show encrypted bytes
 
         # Encode the encrypted bytes to base64
         encrypted_b64 = ubinascii.b2a_base64(encrypted).decode('utf-8').strip()
-        print(f"Encrypted password (base64): {encrypted_b64}")  # Debug: Show base64 encoded encrypted password
 
         return encrypted_b64
     except Exception as e:
-        print(f"Error during encryption: {e}")
+        error("Error during encryption: %s", e)
         raise  # Re-raise the exception for further handling
 
 def decrypt_password(encrypted_password):
-    print(f"Decrypting password: {encrypted_password}")
     try:
         # Decode the base64 encoded password
         encrypted_bytes = ubinascii.a2b_base64(encrypted_password)
@@ -128,138 +201,283 @@ def decrypt_password(encrypted_password):
 
         # Convert to string and remove padding
         decrypted_str = decrypted.decode('utf-8').rstrip()  # Remove any trailing spaces
-        print(f"Decrypted password: {decrypted_str}")
         return decrypted_str
     except Exception as e:
-        print(f"Error during decryption: {e}")
+        error("Error during decryption: %s", e)
         raise
 
+# Saved access point (BSSID and channel), so a reconnect can skip scanning all channels
+fast_connect_wanted = None  # SSID to look up the access point for, after connecting without it
+
+def load_fast_connect():
+    try:
+        with open(FAST_CONNECT_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_fast_connect(data):
+    with open(FAST_CONNECT_FILE, "w") as f:
+        json.dump(data, f)
+
+def fast_connect_failed(data):
+    # After a power cut the router may boot slower than we do, so keep the access point a few times
+    failures = data.get("failures", 0) + 1
+    if failures >= FAST_CONNECT_ATTEMPTS:
+        info("Saved access point failed %d times, forgetting it.", failures)
+        os.remove(FAST_CONNECT_FILE)
+    else:
+        data["failures"] = failures
+        write_fast_connect(data)
+
+def current_channel():
+    try:
+        return sta_if.config('channel')
+    except Exception:
+        return None
+
+def save_fast_connect(ssid):
+    # Find the access point we are connected to; the scan blocks, so the poller does it after its work
+    try:
+        best = None
+        channel = current_channel()
+        for net in sta_if.scan():
+            if net[0].decode('utf-8') == ssid and net[2] == (channel or net[2]) and (best is None or net[3] > best[3]):
+                best = net
+        if best:
+            write_fast_connect({"bssid": ubinascii.hexlify(best[1]).decode(), "channel": best[2], "failures": 0})
+            debug("Saved access point on channel %d for fast reconnects", best[2])
+    except Exception as e:
+        warning("Could not save access point: %s", e)
+
+def refresh_fast_connect():
+    # Only scan when there is no saved access point or it has moved to another channel;
+    # a fast connect that failed because the router was still booting keeps its entry
+    global fast_connect_wanted
+    if fast_connect_wanted and sta_if.isconnected():
+        saved = load_fast_connect()
+        if saved is None or saved.get("channel") != current_channel():
+            save_fast_connect(fast_connect_wanted)
+        fast_connect_wanted = None
+
+async def wait_for_connection(timeout_ms):
+    start = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), start) < timeout_ms:
+        if sta_if.isconnected():
+            return True
+        await asyncio.sleep_ms(20)  # Non-blocking sleep
+    return False
+
+def log_connected(start, fast):
+    global connected_once
+    now = time.ticks_ms()
+    events.record(telemetry.CONNECT, time.ticks_diff(now, start), 1 if fast else 0)
+    info("Connected to Wi-Fi in %d ms", time.ticks_diff(now, start))
+    if not connected_once:
+        info("Boot to connected: %d ms", time.ticks_diff(now, BOOT_TICKS))
+        connected_once = True
+
 # Connect to Wi-Fi as a client (STA mode)
 async def connect_to_wifi():
     wifi_config = load_wifi_config()
-    if wifi_config:
-        print(f"Attempting to connect to Wi-Fi SSID: {wifi_config['ssid']}")
+    if not wifi_config:
+        warning("No Wi-Fi configuration found.")
+        return False
+
+    start = time.ticks_ms()
+    debug("Attempting to connect to Wi-Fi SSID: %s", wifi_config['ssid'])
+    sta_if.active(True)
+    if sta_if.isconnected():
+        return True
+
+    global fast_connect_wanted
+    fast = load_fast_connect()
+    if fast:
         try:
-            sta_if.active(True)
-            sta_if.connect(wifi_config['ssid'], wifi_config['password'])
-        except Exception as e:
-            print(f"An error occurred: {e}")
-        
-        # Wait for the connection to be established with a timeout
-        timeout = time.time() + 20  # 20 seconds from now
-        while time.time() < timeout:  # Loop until timeout
-            print(f"Checking connection... (Time left: {int(timeout - time.time())} seconds)")
-            if sta_if.isconnected():
-                print("Connected to Wi-Fi")
+            sta_if.config(channel=fast["channel"])  # Only listen on the saved channel
+            sta_if.connect(wifi_config['ssid'], wifi_config['password'], bssid=ubinascii.unhexlify(fast["bssid"]))
+            if await wait_for_connection(FAST_CONNECT_TIMEOUT_MS):
+                if fast.get("failures"):
+                    fast["failures"] = 0
+                    write_fast_connect(fast)
+                log_connected(start, True)
                 return True
-            
-            # Check for button press to allow reset
-            if is_button_pressed():
-                print("Button pressed! Resetting ESP32...")
-                machine.reset()  # Reset the ESP32 if the button is pressed
-            
-            await asyncio.sleep(0.5)  # Non-blocking sleep
+        except Exception as e:
+            warning("Fast reconnect failed: %s", e)
 
-        print("Failed to connect to Wi-Fi after 20 seconds.")
-    else:
-        print("No Wi-Fi configuration found.")
-    
+        # The router may still be booting, or the access point moved to another channel
+        info("Fast reconnect failed, connecting normally.")
+        sta_if.disconnect()
+        fast_connect_failed(fast)
+
+    try:
+        sta_if.connect(wifi_config['ssid'], wifi_config['password'])
+    except Exception as e:
+        warning("Could not connect: %s", e)
+
+    # Wait for the connection to be established with a timeout
+    if await wait_for_connection(20000):
+        log_connected(start, False)
+        fast_connect_wanted = wifi_config['ssid']  # Looked up by the poller, off the connect path
+        return True
+
+    events.record(telemetry.FAILURE, telemetry.FAIL_CONNECT)
+    warning("Failed to connect to Wi-Fi after 20 seconds.")
     return False
 
 
 # Setup Access Point (AP Mode)
 def start_ap_mode():
-    print("Starting Access Point Mode...")
     ap_if.active(True)
     ap_if.config(essid='ESP32_Setup', authmode=network.AUTH_OPEN)
-    print("Access Point Mode - Connect to 'ESP32_Setup'")
+    info("Access Point Mode - Connect to 'ESP32_Setup'")
 
-# LED State Indicators
-def set_led_blinking():
-    print("LED blinking to indicate AP mode.")
-    for _ in range(5):
+# LED State Indicators (run as tasks, so the blinking doesn't stop the event loop)
+async def blink_led(times, interval):
+    for _ in range(times):
         led.value(1)
-        time.sleep(0.5)
+        await asyncio.sleep(interval)
         led.value(0)
-        time.sleep(0.5)
+        await asyncio.sleep(interval)
+
+def set_led_blinking():
+    return asyncio.create_task(blink_led(5, 0.5))
     
 def set_led_blinking_error():
-    print("LED blinking to indicate error state.")
-    for _ in range(10):  # Fast blinking for error state
-        led.value(1)
-        time.sleep(0.2)
-        led.value(0)
-        time.sleep(0.2)
+    return asyncio.create_task(blink_led(10, 0.2))  # Fast blinking for error state
 
 def set_led_on():
     led.value(1)
-    print("LED is ON, indicating connected state.")
 
 def set_led_off():
     led.value(0)
-    print("LED is OFF.")
 
 # Wi-Fi Scanning for AP Mode
+SCAN_TTL = 30            # Seconds before a /scan request triggers a new scan
+scan_results = "[]"      # JSON of [ssid, rssi, authmode] sorted by signal, ready to send
+scan_time = 0
+scan_wanted = asyncio.Event()
+
 def scan_wifi_networks():
-    print("Scanning for Wi-Fi networks...")
     sta_if.active(True)  # Activate the station interface for scanning
-    networks = sta_if.scan()  # Scan for networks
-    network_list = []
+    networks = sta_if.scan()  # Scan for networks (this blocks while the radio scans)
 
+    # Keep the strongest access point per SSID
+    best = {}
     for net in networks:
         ssid = net[0].decode('utf-8')
-        rssi = net[3]  # Signal strength
-        network_list.append(f"{ssid} (Signal: {rssi} dBm)")
+        if ssid and (ssid not in best or net[3] > best[ssid][1]):
+            best[ssid] = (ssid, net[3], net[4])
+
+    return sorted(best.values(), key=lambda n: n[1], reverse=True)
+
+async def scan_refresher():
+    """Scan in the background when the results are older than SCAN_TTL and someone asked for them."""
+    global scan_results, scan_time
+    while True:
+        try:
+            scan_results = json.dumps(scan_wifi_networks())
+            scan_time = time.time()
+            debug("Scan complete.")
+        except Exception as e:
+            error("Error scanning for networks: %s", e)
+
+        scan_wanted.clear()
+        await scan_wanted.wait()
+
+        # Let the handler send the cached answer before the radio is busy again
+        await asyncio.sleep_ms(100)
 
-    print("Scan complete. Networks found:")
-    for network in network_list:
-        print(network)
+# Buffers for the web server, allocated once so requests don't fragment the heap
+CHUNK_SIZE = 512
+chunk_buf = bytearray(CHUNK_SIZE)
+decode_buf = bytearray(128)
 
-    return network_list
+def hex_value(c):
+    if 48 <= c <= 57:    # 0-9
+        return c - 48
+    if 65 <= c <= 70:    # A-F
+        return c - 55
+    if 97 <= c <= 102:   # a-f
+        return c - 87
+    return -1
 
-# Function to decode URL-encoded characters
+# Function to decode URL-encoded characters in one pass into decode_buf
 def url_decode(query):
-    # Replace known URL-encoded characters with their actual values
-    decoded_query = query.replace('%20', ' ').replace('%21', '!').replace('%22', '"') \
-                         .replace('%23', '#').replace('%24', '$').replace('%25', '%') \
-                         .replace('%26', '&').replace('%27', "'").replace('%28', '(') \
-                         .replace('%29', ')').replace('%2A', '*').replace('%2B', '+') \
-                         .replace('%2C', ',').replace('%2F', '/').replace('%3A', ':') \
-                         .replace('%3B', ';').replace('%3D', '=').replace('%3F', '?') \
-                         .replace('%40', '@').replace('%5B', '[').replace('%5D', ']')
-    return decoded_query
+    n = 0
+    i = 0
+    length = len(query)
+    while i < length and n < len(decode_buf):
+        c = query[i]
+        high = low = -1
+        if c == 37 and i + 2 < length:  # '%XX'
+            high = hex_value(query[i + 1])
+            low = hex_value(query[i + 2])
+        if high >= 0 and low >= 0:
+            decode_buf[n] = high * 16 + low
+            i += 3
+        else:
+            decode_buf[n] = 32 if c == 43 else c  # '+' is a space in form data
+            i += 1
+        n += 1
+    return bytes(decode_buf[:n]).decode('utf-8')
+
+def query_param(query, name):
+    # query is the bytes after '?', name is bytes like b"ssid"
+    for part in query.split(b"&"):
+        key, _, value = part.partition(b"=")
+        if key == name:
+            return url_decode(value)
+    return None
+
+async def read_request(reader):
+    """Read the request line and skip the headers. Returns (method, path, query) as bytes."""
+    request_line = await reader.readline()
+    parts = request_line.split(b" ")
+    if len(parts) < 2:
+        return None, None, None
+
+    # The headers aren't used, read them line by line without keeping them
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+
+    path, _, query = parts[1].partition(b"?")
+    return parts[0], path, query
+
+async def send_file(writer, filename, content_type):
+    # Send the file in fixed-size chunks through the same buffer
+    await writer.awrite("HTTP/1.1 200 OK\r\nContent-Type: %s\r\n\r\n" % content_type)
+    view = memoryview(chunk_buf)
+    with open(filename, "rb") as f:
+        while True:
+            n = f.readinto(chunk_buf)
+            if not n:
+                break
+            writer.write(view[:n])
+            await writer.drain()
 
 # Serve a basic web page to configure Wi-Fi
 async def web_page_handler(reader, writer):
-    print("Web page handler activated.")
+    free_before = gc.mem_free()
+    alloc_before = gc.mem_alloc()
+    path = None
     try:
-        # Read the request from the client
-        request = await reader.read(1024)
-        request = request.decode('utf-8')  # Decode the request from bytes to string
-        print(f"Received request: {request[:100]}...")  # Print the first 100 characters for debugging
-
-        if '/scan' in request:
-            # Scan for Wi-Fi networks and return the result as JSON
-            networks = scan_wifi_networks()
-            response = json.dumps(networks)
+        method, path, query = await read_request(reader)
+
+        if path == b"/scan":
+            # Answer right away from the last scan, and ask for a new one if it is too old
+            if time.time() - scan_time > SCAN_TTL:
+                scan_wanted.set()
             await writer.awrite("HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n")
-            await writer.awrite(response)
+            await writer.awrite(scan_results)
         
-        elif '/submit' in request:
+        elif path == b"/submit":
             # Extract SSID and password from the request and save it
             try:
-                print("Processing form submission...")
-                
-                # Extract query parameters after the '?' in the URL
-                query_string = request.split('?', 1)[1].split(' ')[0]
-                
-                # Split and decode the parameters manually
-                params = query_string.split('&')
-                ssid = url_decode(params[0].split('=')[1])
-                password = url_decode(params[1].split('=')[1])
-
-                # Print SSID and password for debugging purposes
-                print(f"Extracted SSID: {ssid}, Password: {password}")
+                ssid = query_param(query, b"ssid")
+                password = query_param(query, b"password")
                 
                 if ssid and password:
                     save_wifi_config(ssid, password)  # Save the Wi-Fi configuration
@@ -269,55 +487,38 @@ async def web_page_handler(reader, writer):
                     # Wait for the client to process the response before restarting
                     await asyncio.sleep(1)  # Small delay to let the client handle the response
 
-                    print("Restarting ESP32 to apply the new Wi-Fi configuration...")
+                    info("Restarting ESP32 to apply the new Wi-Fi configuration...")
                     machine.reset()  # Restart the ESP32 to apply the new configuration
                 else:
                     raise ValueError("SSID or password missing in form submission.")
             
             except Exception as e:
-                print(f"Error processing form submission: {e}")
+                warning("Error processing form submission: %s", e)
                 await writer.awrite("HTTP/1.1 400 Bad Request\r\n\r\n")
         
-        else:
+        elif path == b"/":
             # Serve the main Wi-Fi configuration page
-            html = """<!DOCTYPE html>
-            <html>
-            <head><title>ESP32 Wi-Fi Config</title></head>
-            <body>
-            <h1>ESP32 Wi-Fi Configuration</h1>
-            <form action="/submit" method="get">
-                SSID: <input type="text" name="ssid"><br>
-                Password: <input type="password" name="password"><br>
-                <input type="submit" value="Submit">
-            </form>
-            <button onclick="scanNetworks()">Scan Networks</button>
-            <pre id="results"></pre>
-            <script>
-            function scanNetworks() {
-                fetch('/scan')
-                .then(response => response.json())
-                .then(data => {
-                    document.getElementById('results').innerText = JSON.stringify(data, null, 2);
-                });
-            }
-            </script>
-            </body>
-            </html>"""
-            await writer.awrite("HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n")
-            await writer.awrite(html)
+            await send_file(writer, INDEX_FILE, "text/html")
+
+        else:
+            await writer.awrite("HTTP/1.1 404 Not Found\r\n\r\n")
 
     except Exception as e:
-        print(f"Error in web_page_handler: {e}")
+        error("Error in web_page_handler: %s", e)
     
     finally:
         # Close the writer connection to the client after the response is sent
         await writer.aclose()
 
+        # Memory used by this request, before the garbage collector frees it again
+        debug("%s: free %d -> %d bytes, allocated %d bytes", path, free_before, gc.mem_free(), gc.mem_alloc() - alloc_before)
+        gc.collect()
+
 
 
 # Start Web Server in AP Mode
 async def start_web_server():
-    print("Starting Web Server...")
+    debug("Starting Web Server...")
     # Create a server that listens on port 80
     server = await asyncio.start_server(web_page_handler, "0.0.0.0", 80)
 
@@ -326,94 +527,322 @@ async def start_web_server():
 
 
 
+# Time helpers for the schedule
+def sync_time():
+    try:
+        import ntptime
+        ntptime.settime()  # Sets the RTC to UTC
+        info("Time synchronised: %s", time.localtime())
+    except Exception as e:
+        warning("Could not synchronise time: %s", e)
+
+def time_is_set():
+    # The RTC starts in year 2000 until it has been set
+    return time.localtime()[0] >= 2024
+
+def last_sunday(year, month):
+    # Day of the month of the last Sunday in March or October (both have 31 days)
+    weekday = time.localtime(time.mktime((year, month, 31, 12, 0, 0, 0, 0)))[6]  # Monday is 0
+    return 31 - (weekday + 1) % 7
+
+def utc_offset(now=None):
+    # Summer time (CEST) runs from 01:00 UTC on the last Sunday in March to 01:00 UTC on the last Sunday in October
+    now = time.time() if now is None else now
+    year = time.localtime(now)[0]
+    summer_start = time.mktime((year, 3, last_sunday(year, 3), 1, 0, 0, 0, 0))
+    summer_end = time.mktime((year, 10, last_sunday(year, 10), 1, 0, 0, 0, 0))
+    return UTC_OFFSET + (3600 if summer_start <= now < summer_end else 0)
+
+def local_time():
+    now = time.time()
+    return time.localtime(now + utc_offset(now))
+
+def today():
+    t = local_time()
+    return "%04d-%02d-%02d" % (t[0], t[1], t[2])
+
+# Heat pump schedule, kept in flash so it survives reconnects and reboots
+schedule = None                   # {"day", "etag", "slots", "bits" (hex bitmask)}
+schedule_changed = asyncio.Event()
+schedule_poller_task = None
+next_slot_time = 0
+
+# Time spent awake and asleep, printed every hour
+awake_since = time.ticks_ms()
+awake_ms = 0
+sleep_ms = 0
+stats_hour = None
+
+def load_schedule():
+    global schedule
+    try:
+        with open(SCHEDULE_FILE, "r") as f:
+            schedule = json.load(f)
+        info("Loaded schedule for %s", schedule['day'])
+    except (OSError, ValueError):
+        schedule = None
+
+def save_schedule(new_schedule):
+    # Write a temporary file first, so a power cut never leaves half a schedule
+    with open(SCHEDULE_FILE + ".tmp", "w") as f:
+        json.dump(new_schedule, f)
+    os.rename(SCHEDULE_FILE + ".tmp", SCHEDULE_FILE)
+
+def slot_is_on(sched, index):
+    bits = ubinascii.unhexlify(sched["bits"])
+    if index >= sched["slots"]:
+        return False
+    return (bits[index // 8] >> (7 - index % 8)) & 1 == 1
+
+async def fetch_schedule():
+    """Ask the schedule server for today's schedule. Returns True if a new one was saved."""
+    global schedule
+    etag = schedule["etag"] if schedule and schedule["day"] == today() else None
+
+    reader, writer = await asyncio.open_connection(SCHEDULE_HOST, SCHEDULE_PORT)
+    try:
+        request = "GET %s HTTP/1.0\r\nHost: %s\r\n" % (SCHEDULE_PATH, SCHEDULE_HOST)
+        if etag:
+            request += "If-None-Match: %s\r\n" % etag  # The server answers 304 if nothing changed
+        await writer.awrite(request + "\r\n")
+
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if status == 304:
+            return False
+        if status != 200:
+            warning("Schedule server answered %d", status)
+            return False
+
+        # Body: version (4 bytes), number of slots (1 byte), bitmask
+        body = await reader.readexactly(int(headers["content-length"]))
+        new_schedule = {
+            "day": today(),
+            "etag": headers.get("etag"),
+            "slots": body[4],
+            "bits": ubinascii.hexlify(body[5:]).decode(),
+        }
+        save_schedule(new_schedule)
+        schedule = new_schedule
+        schedule_changed.set()  # Wake the executor so it applies the new schedule now
+        info("New schedule: %s", new_schedule['bits'])
+        return True
+    finally:
+        await writer.aclose()
+
+def next_poll_time():
+    # Kept in RTC memory, so it survives deep sleep
+    data = machine.RTC().memory()
+    return int(data) if data else 0
+
+def set_next_poll_time(value):
+    machine.RTC().memory(str(value).encode())
+
+async def schedule_poller():
+    while True:
+        if time_is_set() and time.time() >= next_poll_time():
+            try:
+                if not sta_if.isconnected():
+                    await connect_to_wifi()  # Wi-Fi is switched off while sleeping
+                await fetch_schedule()
+            except Exception as e:
+                events.record(telemetry.FAILURE, telemetry.FAIL_SCHEDULE)
+                warning("Could not fetch schedule: %s", e)
+
+            # Wi-Fi is on anyway, send the telemetry collected since the last poll
+            try:
+                if sta_if.isconnected():
+                    # MicroPython can't tell the largest free block of its heap, so that stays 0
+                    events.record(telemetry.HEAP, gc.mem_free(), 0)
+                    await events.upload(INGEST_HOST, INGEST_PORT, INGEST_PATH)
+            except Exception as e:
+                events.record(telemetry.FAILURE, telemetry.FAIL_UPLOAD)
+                warning("Could not upload telemetry: %s", e)
+
+            # Connected without the saved access point: look it up now that the rest is done
+            refresh_fast_connect()
+
+            # Poll again after SCHEDULE_POLL seconds, or just after midnight for the new day
+            t = local_time()
+            seconds_to_midnight = 86400 - (t[3] * 3600 + t[4] * 60 + t[5])
+            set_next_poll_time(time.time() + min(SCHEDULE_POLL, seconds_to_midnight + 5))
+
+        await asyncio.sleep(max(next_poll_time() - time.time(), 1))
+
+def set_relay(on):
+    if relay.value() != on:
+        relay.init(hold=False)  # A held pin can't change
+        relay.value(1 if on else 0)
+        relay.init(hold=True)
+        events.record(telemetry.RELAY, 1 if on else 0)
+        info("Heat pump %s", "ON" if on else "OFF")
+
+def apply_schedule():
+    """Set the heat pump output for the current slot. Returns the seconds until the next slot."""
+    t = local_time()
+    seconds = t[3] * 3600 + t[4] * 60 + t[5]
+    if schedule and schedule["day"] == today():
+        slot_seconds = 86400 // schedule["slots"]
+        set_relay(slot_is_on(schedule, seconds // slot_seconds))
+        return slot_seconds - seconds % slot_seconds
+
+    # No schedule for today: let the heat pump run normally until one arrives
+    set_relay(True)
+    return 86400 - seconds
+
+async def schedule_executor():
+    """Drive the heat pump output, waking exactly at the slot boundaries."""
+    global next_slot_time
+    while True:
+        if not time_is_set():
+            await asyncio.sleep(1)
+            continue
+
+        wait = apply_schedule()
+        next_slot_time = time.time() + wait
+
+        # Sleep until the next slot, or until a new schedule arrives
+        schedule_changed.clear()
+        try:
+            await asyncio.wait_for(schedule_changed.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+
+def log_power_stats():
+    global awake_ms, sleep_ms, stats_hour
+    hour = local_time()[3]
+    if stats_hour is not None and hour != stats_hour:
+        info("Last hour: awake %d ms, asleep %d ms", awake_ms, sleep_ms)
+        awake_ms = sleep_ms = 0
+    stats_hour = hour
+
+async def idle_until_next_event():
+    """In operational mode: sleep until the next slot boundary or schedule poll."""
+    global awake_since, awake_ms, sleep_ms
+
+    # Let the executor, the poller and the LED finish what they are doing first
+    await asyncio.sleep(AWAKE_GRACE)
+
+    wait = min(next_slot_time, next_poll_time()) - time.time()
+    if POWER_MODE == "awake" or not time_is_set() or wait < MIN_SLEEP or is_button_pressed():
+        await asyncio.sleep(1)
+        return
+
+    awake_ms += time.ticks_diff(time.ticks_ms(), awake_since)
+    log_power_stats()
+    debug("Sleeping for %d seconds", wait)
+
+    # Wi-Fi is only needed for the next poll, the poller connects again
+    sta_if.disconnect()
+    sta_if.active(False)
+
+    if POWER_MODE == "deep":
+        # Starts main.py from the top when it wakes; the schedule and poll time are saved
+        machine.deepsleep(wait * 1000)
+
+    machine.lightsleep(wait * 1000)
+    sleep_ms += wait * 1000
+    events.record(telemetry.WAKE, wait)
+    awake_since = time.ticks_ms()
+
+    if is_button_pressed():
+        button_flag.set()  # Woken by the button, the edge happened while asleep
+
 # Main State Machine
 async def run_state_machine():
-    global current_state
-
-    reset_wifi_config()  # Check if reset button is pressed on boot
+    global schedule_poller_task
 
     if load_wifi_config() is not None:
-        print("Wi-Fi configuration found. Attempting to connect...")
+        info("Wi-Fi configuration found. Attempting to connect...")
 
         retry_count = 0
         while retry_count < 10:  # Try connecting up to 10 times with backoff
             if await connect_to_wifi():
-                current_state = STATE_CONNECTED
+                set_state(STATE_CONNECTED)
                 set_led_on()  # Indicate successful connection
-                print("Connected successfully. Operational mode (Client Mode)")
+                info("Connected successfully. Operational mode (Client Mode)")
                 break
             else:
-                print(f"Retry {retry_count + 1}: Failed to connect. Retrying...")
+                warning("Retry %d: Failed to connect. Retrying...", retry_count + 1)
                 retry_count += 1
                 await asyncio.sleep(5)  # Wait 5 seconds before trying again
 
         if retry_count >= 10:
-            print("Reached maximum retries. Entering error state.")
-            current_state = STATE_ERROR
+            error("Reached maximum retries. Entering error state.")
+            set_state(STATE_ERROR)
 
     else:
-        print("No previous Wi-Fi configuration found. Starting in AP mode.")
-        current_state = STATE_AP_MODE
+        info("No previous Wi-Fi configuration found. Starting in AP mode.")
+        set_state(STATE_AP_MODE)
         set_led_blinking()
 
     while True:  # Loop to maintain state
-        reset_wifi_config()  # Continuously check the button state
-
         if current_state == STATE_AP_MODE:
             start_ap_mode()
+            asyncio.create_task(scan_refresher())
             await start_web_server()
             break  # Exit the while loop to prevent continuous AP mode
 
         elif current_state == STATE_CONNECTED:
-            print("Device is in operational mode.")
-            await asyncio.sleep(1)  # Placeholder for operational tasks
+            if schedule_poller_task is None:
+                info("Device is in operational mode.")
+                sync_time()
+                schedule_poller_task = asyncio.create_task(schedule_poller())
+            await idle_until_next_event()
 
         elif current_state == STATE_ERROR:
-            print("Handling error state. Retrying connection...")
+            warning("Handling error state. Retrying connection...")
             set_led_blinking_error()  # Blink the LED in error state pattern
             retry_count = 0  # Reset the retry count for error handling
 
             while retry_count < 10:
                 if await connect_to_wifi():
-                    current_state = STATE_CONNECTED
+                    set_state(STATE_CONNECTED)
                     set_led_on()  # Indicate successful connection
-                    print("Reconnected successfully.")
+                    info("Reconnected successfully.")
                     break
                 else:
-                    print(f"Error retry {retry_count + 1}: Still unable to connect.")
+                    warning("Error retry %d: Still unable to connect.", retry_count + 1)
                     retry_count += 1
                     await asyncio.sleep(5)  # Wait 5 seconds before retrying
 
             if retry_count >= 10:
-                print("Max retries reached during error state. Continuing retries...")
+                error("Max retries reached during error state. Continuing retries...")
                 # Continue in error state, retry indefinitely until reset
 
         await asyncio.sleep(1)
 
-# Button press detection for resetting Wi-Fi configuration
-def reset_wifi_config():
-    if is_button_pressed():
-        press_start = time.time()  # Record the time when the button is first pressed
-        while is_button_pressed():  # Wait for the button release
-            if time.time() - press_start >= 5:  # If pressed for more than 5 seconds
-                print("Resetting Wi-Fi configuration")
-                if CONFIG_FILE in os.listdir():
-                    os.remove(CONFIG_FILE)
-                machine.reset()
-        print("Button press too short for reset. Rebooting the device.")
-        machine.reset()  # Reboot if pressed for a short time but not long enough for reset
-
 # Main Function to Run the Program
 async def main():
-    global current_state
-    current_state = STATE_CLIENT_MODE  # Initialize state
+    set_state(STATE_CLIENT_MODE)  # Initialize state
+    events.record(telemetry.BOOT, machine.reset_cause())
+
+    setup_button()
+    asyncio.create_task(button_handler())
+
+    # Follow the saved schedule right away, also before Wi-Fi is connected
+    load_schedule()
+    if POWER_MODE == "deep" and machine.reset_cause() == machine.DEEPSLEEP_RESET and time.time() < next_poll_time() - MIN_SLEEP:
+        # Only woken to switch the heat pump: no Wi-Fi needed, go straight back to sleep
+        wait = apply_schedule()
+        machine.deepsleep(min(wait, next_poll_time() - time.time()) * 1000)
+    asyncio.create_task(schedule_executor())
+
     await run_state_machine()
 
-# Start the main function
-try:
-    asyncio.run(main())
-except KeyboardInterrupt:
-    print("Program terminated.")
-finally:
-    # Clean-up operations can be added here
-    set_led_off()
+# Start the main function (main.py runs as __main__ on the ESP32; the simulator in sim/ imports it)
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        info("Program terminated.")
+    finally:
+        # Clean-up operations can be added here
+        set_led_off()
@@ -0,0 +1,242 @@
+import sys
+import time
+import struct
+import threading
+import zlib
+import requests
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from scheduler import plan, pack_plan
+from data_til_esp import fetch_prices, area_prices
+
+# Local schedule service for the ESP32 devices.
+#
+#   GET /schedule?area=west&hours=6&slots=24[&min_run=2&min_off=1]
+#
+# The body is binary: version (uint32, big endian), number of slots (uint8) and the plan
+# as a bitmask, one bit per slot starting with the highest bit of the first byte. For 24
+# slots that is 8 bytes, for 96 slots 17 bytes. The ETag is the version, so a device that
+# sends If-None-Match with its current version gets an empty 304 while the plan is unchanged.
+#
+# The slots follow the local wall clock, like the devices do, so a day always has 24 or 96
+# slots. On the day summer time starts the skipped hour is always off; on the day it ends
+# the repeated hour gets the mean of its two prices (and runs twice if it is on).
+
+PORT = 8080
+PRICE_TTL = 15 * 60  # Seconds before prices are fetched again from Energi Fyn
+SLOT_COUNTS = (24, 96)
+AREAS = ("west", "east")
+MAX_RUN = 24         # min_run/min_off are in hours, more than a day means nothing
+HEADER = struct.Struct(">IB")
+
+
+def wall_clock_prices(entries):
+    """
+    Turn Energi Fyn price entries into one price per local wall-clock hour.
+
+    Returns:
+        list: 24 prices, None for an hour that doesn't exist that day.
+    """
+    hourly = [[] for _ in range(24)]
+    for entry in entries:
+        hourly[datetime.fromisoformat(entry["hour"]).hour].append(entry["price"])
+    return [sum(prices) / len(prices) if prices else None for prices in hourly]
+
+
+class ScheduleCache:
+    """
+    Plans per (area, hours, slots, constraints), computed once and shared by every device.
+
+    Prices are fetched at most once per PRICE_TTL. When they change, the cached plans for
+    that day are dropped, and a plan only gets a new version if its bits actually change.
+    Fetching happens outside the cache lock, with one lock per day, so a slow Energi Fyn
+    only holds up the requests that need that day's prices. Days before yesterday are dropped.
+    """
+
+    def __init__(self, price_ttl=PRICE_TTL):
+        self.price_ttl = price_ttl
+        self.lock = threading.Lock()
+        self.prices = {}       # (date, area) -> (fetched at, 24 prices by wall-clock hour)
+        self.plans = {}        # (date, area, hours, slots, min_run, min_off) -> (etag, body)
+        self.fetch_locks = {}  # date -> lock held while that day is fetched
+
+    def _cached_prices(self, day, area):
+        """The cached prices, or None if there are none or they are older than price_ttl."""
+        cached = self.prices.get((day, area))
+        if cached and time.time() - cached[0] < self.price_ttl:
+            return cached[1]
+        return None
+
+    def _hourly_prices(self, day, area):
+        with self.lock:
+            prices = self._cached_prices(day, area)
+            if prices is not None:
+                return prices
+            fetch_lock = self.fetch_locks.setdefault(day, threading.Lock())
+
+        with fetch_lock:
+            # Another request may have fetched the day while this one waited
+            with self.lock:
+                prices = self._cached_prices(day, area)
+            if prices is not None:
+                return prices
+
+            try:
+                response = fetch_prices(datetime.strptime(day, "%Y-%m-%d"))
+            except requests.RequestException:
+                with self.lock:
+                    stale = self.prices.get((day, area))
+                if stale is None:
+                    raise
+                print(f"Could not fetch prices for {day}, using the ones from {datetime.fromtimestamp(stale[0]):%H:%M}")
+                return stale[1]
+
+            self.set_prices(day, response)
+            with self.lock:
+                cached = self.prices.get((day, area))
+            if cached is None:
+                raise LookupError(f"No prices for {area} on {day}")
+            return cached[1]
+
+    def _set_prices(self, day, area, prices):
+        key = (day, area)
+        cached = self.prices.get(key)
+        if cached is None or cached[1] != prices:
+            # New prices, the plans based on the old ones are no longer valid
+            self.plans = {k: v for k, v in self.plans.items() if k[:2] != key}
+        self.prices[key] = (time.time(), prices)
+        self._evict()
+
+    def _evict(self):
+        """Drop the prices and plans for the days before yesterday."""
+        oldest = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        self.prices = {k: v for k, v in self.prices.items() if k[0] >= oldest}
+        self.plans = {k: v for k, v in self.plans.items() if k[0] >= oldest}
+        self.fetch_locks = {k: v for k, v in self.fetch_locks.items() if k >= oldest}
+
+    def set_prices(self, day, response):
+        """Use the prices in an Energi Fyn response that was fetched elsewhere, for both areas."""
+        with self.lock:
+            for area in AREAS:
+                entries = area_prices(area, response)
+                if entries:
+                    self._set_prices(day, area, wall_clock_prices(entries))
+
+    def get(self, area, hours, slots=24, min_run=1, min_off=1, day=None):
+        """
+        Get the encoded plan for a device.
+
+        Returns:
+            tuple: (etag, body)
+        """
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        hourly = self._hourly_prices(day, area)
+        with self.lock:
+            key = (day, area, hours, slots, min_run, min_off)
+            cached = self.plans.get(key)
+            if cached:
+                return cached
+
+            # Quarter-hour slots get the price of their hour; hours and runs are in slots too
+            per_hour = slots // 24
+            prices = [0.0 if price is None else price for price in hourly for _ in range(per_hour)]
+            skipped = [i for i in range(len(prices)) if hourly[i // per_hour] is None]
+            bits = pack_plan(plan(prices, hours * per_hour, min_run * per_hour, min_off * per_hour, forbidden=skipped))
+
+            version = zlib.crc32(day.encode() + bits)
+            body = HEADER.pack(version, len(prices)) + bits
+            self.plans[key] = (f'"{version:08x}"', body)
+            return self.plans[key]
+
+    def warm(self, hours_range=range(1, 13), areas=AREAS, slot_counts=SLOT_COUNTS, day=None):
+        """
+        Precompute the common plans, e.g. right after the day's prices are published.
+
+        Returns:
+            dict: (area, hours, slots) -> etag of the plan.
+        """
+        etags = {}
+        for area in areas:
+            for slots in slot_counts:
+                for hours in hours_range:
+                    etags[(area, hours, slots)] = self.get(area, hours, slots, day=day)[0]
+        return etags
+
+
+cache = ScheduleCache()
+
+
+class ScheduleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so a device can poll without reconnecting
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/schedule":
+            self._reply(404)
+            return
+
+        try:
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            area = query.get("area", "west").lower()
+            hours = int(query["hours"])
+            slots = int(query.get("slots", 24))
+            # Longer runs than a day don't change the plan, and would only fill the cache
+            min_run = max(1, min(int(query.get("min_run", 1)), MAX_RUN))
+            min_off = max(1, min(int(query.get("min_off", 1)), MAX_RUN))
+            if area not in AREAS or slots not in SLOT_COUNTS or not 0 <= hours <= 24:
+                raise ValueError("Invalid parameters")
+        except (KeyError, ValueError):
+            self._reply(400)
+            return
+
+        try:
+            etag, body = cache.get(area, hours, slots, min_run, min_off)
+        except requests.RequestException as e:
+            print(f"Could not fetch prices: {e}")
+            self._reply(502)
+            return
+        except (LookupError, ValueError) as e:
+            print(f"Could not make a schedule: {e}")
+            self._reply(503)
+            return
+
+        if self.headers.get("If-None-Match") == etag:
+            self._reply(304, etag=etag)
+        else:
+            self._reply(200, body, etag)
+
+    def _reply(self, status, body=b"", etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if status == 200:
+            self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Thousands of polling devices would flood the console
+        pass
+
+
+def serve(port=PORT):
+    server = ThreadingHTTPServer(("0.0.0.0", port), ScheduleHandler)
+    print(f"Serving schedules on port {port}")
+    return server
+
+
+def run(port=PORT):
+    try:
+        cache.warm()
+    except Exception as e:
+        print(f"Could not precompute schedules: {e}")
+
+    serve(port).serve_forever()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else PORT)
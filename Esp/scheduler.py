@@ -0,0 +1,207 @@
+import numpy as np
+
+
+def cheapest_slots(prices, hours, must_run=(), forbidden=()):
+    """
+    Pick the cheapest slots when there are no run-length constraints.
+
+    Args:
+        prices (list): Price per slot.
+        hours (int): Number of slots the heat pump must run.
+        must_run (iterable): Slot indexes that have to be on.
+        forbidden (iterable): Slot indexes that have to be off.
+
+    Returns:
+        list: True/False per slot.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    must_run, forbidden = set(must_run), set(forbidden)
+    if must_run & forbidden or len(must_run) > hours or hours > n - len(forbidden):
+        raise ValueError("No schedule satisfies the constraints")
+
+    plan = np.zeros(n, dtype=bool)
+    plan[list(must_run)] = True
+
+    free = np.ones(n, dtype=bool)
+    free[list(must_run | forbidden)] = False
+    candidates = np.flatnonzero(free)
+    remaining = hours - len(must_run)
+    if remaining:
+        # argpartition finds the cheapest slots in O(n) without sorting all of them
+        chosen = np.argpartition(prices[candidates], remaining - 1)[:remaining] if remaining < len(candidates) else np.arange(len(candidates))
+        plan[candidates[chosen]] = True
+    return plan.tolist()
+
+
+def plan(prices, hours, min_run=1, min_off=1, max_starts=None, must_run=(), forbidden=(), initial_on=False, initial_length=None,
+         checkpoints=None):
+    """
+    Find the cheapest on/off plan for a heat pump with compressor constraints.
+
+    The plan is found with dynamic programming over the slots. The state is the number of
+    slots used, the number of starts and how long the pump has been on or off (capped at
+    min_run/min_off), and each step is a handful of NumPy operations on the whole state table.
+
+    Args:
+        prices (list): Price per slot (24 hourly or 96 quarter-hourly slots, or any length).
+        hours (int): Number of slots the heat pump must run.
+        min_run (int): Minimum number of slots in a row once the pump is started.
+        min_off (int): Minimum number of slots in a row the pump is off between runs.
+        max_starts (int): Maximum number of starts, None for no limit.
+        must_run (iterable): Slot indexes that have to be on.
+        forbidden (iterable): Slot indexes that have to be off.
+        initial_on (bool): Whether the pump is running just before the first slot.
+        initial_length (int): For how many slots it has been on/off before the first slot
+                              (default: long enough to be free to switch).
+        checkpoints (dict): Slot index -> number of slots that must be on before it, e.g. to
+                            give every day of a longer plan its own hours. `hours` is the total.
+
+    Returns:
+        list: True/False per slot.
+    """
+    if initial_on and initial_length is not None and initial_length < min_run:
+        # The pump has to finish its current run first
+        must_run = set(must_run) | set(range(min(min_run - initial_length, len(prices))))
+    elif not initial_on and initial_length is not None and initial_length < min_off:
+        forbidden = set(forbidden) | set(range(min(min_off - initial_length, len(prices))))
+
+    checkpoints = {i: used for i, used in (checkpoints or {}).items() if 0 < i < len(prices)}
+    if min_run <= 1 and min_off <= 1 and max_starts is None:
+        if not checkpoints:
+            return cheapest_slots(prices, hours, must_run, forbidden)
+        # Without run lengths the segments between checkpoints are independent
+        result = []
+        bounds = sorted(checkpoints.items()) + [(len(prices), hours)]
+        start, used = 0, 0
+        for stop, total in bounds:
+            result += cheapest_slots(
+                prices[start:stop],
+                total - used,
+                [i - start for i in must_run if start <= i < stop],
+                [i - start for i in forbidden if start <= i < stop],
+            )
+            start, used = stop, total
+        return result
+
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    R, F = max(min_run, 1), max(min_off, 1)
+    K = max_starts + 1 if max_starts is not None else 1
+    H = hours + 1
+    if hours > n:
+        raise ValueError("No schedule satisfies the constraints")
+
+    must = np.zeros(n, dtype=bool)
+    must[list(must_run)] = True
+    off_only = np.zeros(n, dtype=bool)
+    off_only[list(forbidden)] = True
+
+    inf = np.inf
+    # on[c]: on for c+1 slots (the last one means "at least R"), off[c] likewise with F
+    # Each table is indexed [starts, slots used]
+    on = np.full((R, K, H), inf)
+    off = np.full((F, K, H), inf)
+    if initial_on:
+        on[R - 1, 0, 0] = 0.0  # Continuing a run doesn't use a start
+    else:
+        off[F - 1, 0, 0] = 0.0  # Before the first slot the pump has been off long enough
+
+    # Remember which predecessor won where there was a choice, for the backtracking
+    kept_running = np.zeros((n, K, H), dtype=bool)
+    stayed_off = np.zeros((n, K, H), dtype=bool)
+
+    for i in range(n):
+        price = prices[i]
+
+        # Starting a run uses one of the starts
+        started = off[F - 1]
+        if max_starts is not None:
+            started = np.concatenate([np.full((1, H), inf), started[:-1]])
+
+        # Running this slot uses one more slot and costs the price
+        new_on = np.full_like(on, inf)
+        new_on[0, :, 1:] = started[:, :-1]
+        new_on[1:, :, 1:] = on[:-1, :, :-1]
+        running = on[R - 1, :, :-1]
+        kept_running[i, :, :-1] = running < new_on[R - 1, :, 1:]
+        new_on[R - 1, :, 1:] = np.minimum(new_on[R - 1, :, 1:], running)
+        new_on[:, :, 1:] += price
+
+        # Stopping is only allowed after at least min_run slots
+        new_off = np.empty_like(off)
+        new_off[0] = on[R - 1]
+        new_off[1:] = off[:-1]
+        stayed_off[i] = off[F - 1] < new_off[F - 1]
+        new_off[F - 1] = np.minimum(new_off[F - 1], off[F - 1])
+
+        if must[i]:
+            new_off[:] = inf
+        if off_only[i]:
+            new_on[:] = inf
+        if i + 1 in checkpoints:
+            # Only the states that have used exactly the slots required by now go on
+            wrong = np.arange(H) != checkpoints[i + 1]
+            new_on[:, :, wrong] = inf
+            new_off[:, :, wrong] = inf
+        on, off = new_on, new_off
+
+    # The last run has to be at least min_run long as well
+    end_on = on[R - 1, :, hours]
+    end_off = off[:, :, hours]
+    best_on = np.argmin(end_on)
+    best_off = np.unravel_index(np.argmin(end_off), end_off.shape)
+    if min(end_on[best_on], end_off[best_off]) == inf:
+        raise ValueError("No schedule satisfies the constraints")
+
+    if end_on[best_on] <= end_off[best_off]:
+        mode, c, k = 'on', R - 1, best_on
+    else:
+        mode, (c, k) = 'off', best_off
+    h = hours
+
+    # Walk back through the slots to recover the plan
+    result = [False] * n
+    for i in range(n - 1, -1, -1):
+        if mode == 'on':
+            result[i] = True
+            h -= 1
+            if c == R - 1 and kept_running[i, k, h]:
+                continue
+            if c > 0:
+                c -= 1
+            else:
+                mode, c = 'off', F - 1
+                if max_starts is not None:
+                    k -= 1
+        else:
+            if c == F - 1 and stayed_off[i, k, h]:
+                continue
+            if c > 0:
+                c -= 1
+            else:
+                mode, c = 'on', R - 1
+    return result
+
+
+def plan_cost(prices, schedule):
+    """Returns the total price of the slots that are on in a plan."""
+    return float(np.dot(np.asarray(prices, dtype=float), np.asarray(schedule, dtype=bool)))
+
+
+def pack_plan(schedule):
+    """
+    Pack a plan into bytes, one bit per slot with slot 0 as the highest bit of the first byte.
+
+    Args:
+        schedule (list): True/False per slot.
+
+    Returns:
+        bytes: ceil(slots / 8) bytes.
+    """
+    return np.packbits(np.asarray(schedule, dtype=bool)).tobytes()
+
+
+def unpack_plan(data, slots):
+    """Unpack bytes from pack_plan back into a list of True/False per slot."""
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))[:slots].astype(bool).tolist()
@@ -0,0 +1,228 @@
+"""
+Run Esp/main.py under CPython.
+
+The stand-ins for the MicroPython modules (machine, network, uasyncio, ...) live in
+sim/modules. Time is virtual: the event loop jumps straight to the next timer instead of
+waiting, so an hour of schedule polling or 20 seconds of Wi-Fi retries take milliseconds.
+
+    from sim import Device
+
+    device = Device()
+    device.add_access_point("Home", "secret")
+    device.save_wifi_config("Home", "secret")
+    device.boot()
+    device.run(3600)              # One virtual hour of the state machine
+    device.request("GET /scan")   # Call the web handler directly
+
+Only one Device can be used at a time, since the stand-ins share module state (the clock,
+the pins and the WLAN), and the device's flash is the working directory while it runs.
+"""
+import asyncio
+import importlib.util
+import os
+import selectors
+import shutil
+import sys
+import tempfile
+
+ESP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modules")
+MAIN_FILE = os.path.join(ESP_DIR, "main.py")
+FLASH_FILES = ("index.html",)  # Files copied to the simulated flash
+
+sys.path.insert(0, MODULES_DIR)
+import machine, network, uasyncio, sim_time, sim_gc  # noqa: E402
+from vclock import clock  # noqa: E402
+
+
+class VirtualSelector:
+    """Wraps a selector so that waiting for a timer moves the virtual clock instead."""
+
+    def __init__(self, selector):
+        self.selector = selector
+
+    def select(self, timeout=None):
+        events = self.selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            return self.selector.select(None)  # Nothing scheduled at all
+        clock.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self.selector, name)
+
+
+class VirtualLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        super().__init__(VirtualSelector(selectors.DefaultSelector()))
+
+    def time(self):
+        return clock.monotonic
+
+
+def load_main(path=MAIN_FILE):
+    """Import main.py (and telemetry.py) with the virtual time and gc modules."""
+    saved = {name: sys.modules.get(name) for name in ("time", "gc")}
+    sys.modules["time"] = sim_time
+    sys.modules["gc"] = sim_gc
+    sys.modules.pop("telemetry", None)
+    if ESP_DIR not in sys.path:
+        sys.path.insert(1, ESP_DIR)
+    try:
+        spec = importlib.util.spec_from_file_location("esp_main", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        for name, module_before in saved.items():
+            sys.modules[name] = module_before
+
+
+class Device:
+    def __init__(self, flash_dir=None, now=None, log_level=None):
+        """
+        Args:
+            flash_dir (str): Directory used as the device's flash, default a new temporary one.
+            now (int): Wall time (seconds since 1970) the device gets from NTP, default the real time.
+            log_level (int): telemetry.LOG_LEVEL for the device, default the one in telemetry.py.
+        """
+        self.flash_dir = flash_dir or tempfile.mkdtemp(prefix="esp32-flash-")
+        for name in FLASH_FILES:
+            shutil.copy(os.path.join(ESP_DIR, name), self.flash_dir)
+
+        clock.reset()
+        network.reset()
+        machine.Pin.pins.clear()
+        machine.reset_reason = machine.PWRON_RESET
+        machine.rtc_memory = b""
+        machine.held_levels = {}
+        machine.slept_ms = 0
+        uasyncio.servers.clear()
+        uasyncio.hosts.clear()
+
+        import ntptime
+        ntptime.start = now
+
+        self.log_level = log_level
+        self.loop = None
+        self.main = None
+        self.boots = 0
+        self.exit = None  # Why the last run() ended: None, "reset" or "deepsleep"
+
+    def add_access_point(self, ssid, password, **kwargs):
+        return network.add_access_point(ssid, password, **kwargs)
+
+    def serve(self, host, port, handler):
+        """Answer the device's connections to (host, port), e.g. a schedule server."""
+        uasyncio.serve(host, port, handler)
+
+    def boot(self, reset_cause=machine.PWRON_RESET):
+        """Start the device from the top of main.py, like after power-on or a reset."""
+        os.chdir(self.flash_dir)
+        if self.loop:
+            self.loop.close()
+        self.loop = VirtualLoop()
+        self.loop.set_exception_handler(self._exception_handler)
+        asyncio.set_event_loop(self.loop)
+        machine.reset_reason = reset_cause
+        machine.held_levels = {n: pin.level for n, pin in machine.Pin.pins.items() if pin.hold}
+        machine.Pin.pins.clear()
+        network.interfaces.clear()  # The radio is off after a reset
+        uasyncio.servers.clear()
+        self.main = self.loop.run_until_complete(self._load())
+        if self.log_level is not None:
+            self.main.telemetry.LOG_LEVEL = self.log_level
+        self.boots += 1
+        self.exit = None
+        return self.main
+
+    @staticmethod
+    def _exception_handler(loop, context):
+        # The task that reset the device ends with Reset; run() has already handled it
+        if not isinstance(context.get("exception"), (machine.Reset, machine.DeepSleep)):
+            loop.default_exception_handler(context)
+
+    async def _load(self):
+        # Loaded inside the loop, so the Events main.py creates belong to it
+        return load_main()
+
+    def call(self, coroutine):
+        """Run a coroutine from main.py, e.g. device.call(device.main.connect_to_wifi())."""
+        os.chdir(self.flash_dir)
+        return self.loop.run_until_complete(coroutine)
+
+    def run(self, seconds):
+        """
+        Run main() for `seconds` of virtual time, or until the device resets or goes to deep
+        sleep. After a deep sleep the next run() boots the device again, like the chip would.
+
+        Returns:
+            str: None if the time ran out, "reset" or "deepsleep".
+        """
+        if self.exit == "deepsleep":
+            self.boot(machine.DEEPSLEEP_RESET)
+        elif self.exit == "reset" or self.main is None:
+            self.boot(machine.HARD_RESET if self.main else machine.PWRON_RESET)
+
+        os.chdir(self.flash_dir)
+        if getattr(self, "_main_task", None) is None or self._main_task.done():
+            self._main_task = self.loop.create_task(self.main.main())
+
+        stop = self.loop.create_future()
+        self.loop.call_at(clock.monotonic + seconds, lambda: stop.done() or stop.set_result(None))
+        try:
+            self.loop.run_until_complete(stop)
+        except machine.DeepSleep as e:
+            clock.advance(e.ms / 1000)
+            self.exit = "deepsleep"
+        except machine.Reset:
+            self.exit = "reset"
+
+        if self.exit:
+            # Everything stops with the chip; let the tasks see their cancellation
+            self._main_task = None
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        return self.exit
+
+    def press_button(self, seconds):
+        """Hold the button for `seconds` (virtual) and let go."""
+        button = machine.Pin.pins[self.main.BUTTON_PIN]
+        button.drive(0)
+        try:
+            self.run(seconds)
+        finally:
+            button.drive(1)
+        return self.run(0.5)
+
+    def relay(self):
+        return machine.Pin.pins[self.main.RELAY_PIN].value()
+
+    def save_wifi_config(self, ssid, password):
+        """Write the Wi-Fi configuration to flash like the /submit form does."""
+        if self.main is None:
+            self.boot()
+        os.chdir(self.flash_dir)
+        self.main.save_wifi_config(ssid, password)
+
+    def request(self, raw):
+        """
+        Send an HTTP request to the device's web handler and return the raw response.
+
+        `raw` may be a full request or just a request line like "GET /scan".
+        """
+        if isinstance(raw, str):
+            raw = raw.encode()
+        if b"\r\n" not in raw:
+            raw += b" HTTP/1.1\r\nHost: 192.168.4.1\r\n\r\n"
+        return self.call(self._request(raw))
+
+    async def _request(self, raw):
+        client, server = uasyncio.pipe()
+        client.write(raw)
+        await self.main.web_page_handler(server, server)
+        return await client.read()
@@ -0,0 +1,145 @@
+import os
+import statistics
+import struct
+import sys
+import time
+import tracemalloc
+
+# Benchmarks of main.py in the simulator: run with `python sim/bench.py` from the Esp folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sim import Device
+import machine, network
+from vclock import clock
+
+REQUESTS = 300
+RECONNECTS = 200
+NOW = 1767225600  # 2026-01-01, the wall time the simulated NTP server hands out
+QUIET = 40  # telemetry.ERROR, the device's log output would drown the results
+PATHS = ("/", "/scan", "/submit?ssid=Home", "/missing")
+
+
+def request_benchmark(device):
+    """Real time and memory per call of the web handler (CPython numbers, not ESP32 numbers)."""
+    print(f"Web handler, {REQUESTS} requests per path")
+    for path in PATHS:
+        raw = f"GET {path} HTTP/1.1\r\nHost: 192.168.4.1\r\nAccept: */*\r\n\r\n".encode()
+
+        timings = []
+        for _ in range(REQUESTS):
+            start = time.perf_counter()
+            device.request(raw)
+            timings.append(time.perf_counter() - start)
+
+        # Peak memory above the level before the call, and what is still held afterwards
+        tracemalloc.start()
+        peaks, kept = [], []
+        for _ in range(REQUESTS // 10):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            device.request(raw)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            kept.append(current - before)
+        tracemalloc.stop()
+
+        print(f"  {path:20} median {statistics.median(timings) * 1e6:7.0f} us, p99 {sorted(timings)[int(len(timings) * 0.99)] * 1e6:7.0f} us, "
+              f"peak {statistics.median(peaks):6.0f} B, kept {statistics.median(kept):5.0f} B")
+
+
+def connect_until_done(device):
+    """Connect like the state machine: retry every 5 seconds. Returns virtual seconds taken."""
+    start = clock.monotonic
+    while not device.call(device.main.connect_to_wifi()):
+        device.call(device.main.asyncio.sleep(5))
+    elapsed = clock.monotonic - start
+    device.main.refresh_fast_connect()  # The poller does this after its work, not part of connecting
+    return elapsed
+
+
+def reconnect_benchmark(device):
+    """Virtual time to get on the network, for the fast path, a full scan and a flaky AP."""
+    sta = network.WLAN(network.STA_IF)
+    print(f"Reconnect time (virtual), {RECONNECTS} attempts")
+
+    def measure(name, prepare):
+        times = []
+        for _ in range(RECONNECTS):
+            sta.disconnect()
+            prepare()
+            times.append(connect_until_done(device))
+        print(f"  {name:30} mean {statistics.mean(times) * 1000:7.0f} ms, max {max(times) * 1000:7.0f} ms")
+
+    measure("saved access point", lambda: None)
+    measure("no saved access point", lambda: os.path.exists("wifi_fast.json") and os.remove("wifi_fast.json"))
+
+    def move_channel():
+        network.access_points[0]["channel"] = 1 if network.access_points[0]["channel"] != 1 else 11
+    measure("access point changed channel", move_channel)
+
+    network.failure_rate = 0.3
+    measure("30 % of attempts fail", lambda: None)
+    network.failure_rate = 0.0
+
+
+async def schedule_server(reader, writer):
+    # Heat pump on from 01 to 07, like schedule_server.py would send for 6 cheap night hours
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    bits = int("0" + "1" * 6 + "0" * 17, 2).to_bytes(3, "big")
+    body = struct.pack(">IB", 1, 24) + bits
+    writer.write(b'HTTP/1.0 200 OK\r\nETag: "00000001"\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+    writer.close()
+
+
+uploaded = []
+
+
+async def ingest_server(reader, writer):
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    uploaded.extend((await reader.readexactly(length)).splitlines())
+    writer.write(b"HTTP/1.0 204 No Content\r\n\r\n")
+    writer.close()
+
+
+def day_benchmark():
+    """A whole virtual day in operational mode with light sleep between events."""
+    device = Device(now=NOW, log_level=QUIET)
+    device.add_access_point("Home", "secret")
+    device.serve("192.168.1.10", 8080, schedule_server)
+    device.serve("192.168.1.10", 8087, ingest_server)
+    device.save_wifi_config("Home", "secret")
+    device.boot()
+
+    start = time.perf_counter()
+    device.run(86400)
+    elapsed = time.perf_counter() - start
+
+    relay = machine.Pin.pins[device.main.RELAY_PIN]
+    awake = 86400 - machine.slept_ms / 1000
+    print("One day in operational mode")
+    print(f"  simulated in {elapsed * 1000:.0f} ms, {network.WLAN(network.STA_IF).connects} connects, "
+          f"{relay.changes} relay switches, awake {awake:.0f} s ({awake / 864:.1f} %)")
+    print(f"  {len(uploaded)} telemetry records uploaded")
+
+
+def main():
+    device = Device(now=NOW, log_level=QUIET)
+    device.add_access_point("Home", "secret", channel=11)
+    device.boot()
+    device.main.scan_results = '[["Home", -60, 3]]'
+    request_benchmark(device)
+
+    device.save_wifi_config("Home", "secret")
+    reconnect_benchmark(device)
+
+    day_benchmark()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# Stand-in for MicroPython's esp32 module.
+WAKEUP_ALL_LOW = False
+WAKEUP_ANY_HIGH = True
+
+# Only these GPIOs are connected to the RTC and can wake the chip from sleep
+RTC_GPIOS = (0, 2, 4, 12, 13, 14, 15, 25, 26, 27, 32, 33, 34, 35, 36, 37, 38, 39)
+
+deep_sleep_hold = False
+wake_pin = None
+
+
+def gpio_deep_sleep_hold(enable):
+    global deep_sleep_hold
+    deep_sleep_hold = enable
+
+
+def wake_on_ext0(pin, level):
+    global wake_pin
+    if pin.number not in RTC_GPIOS:
+        raise ValueError("invalid pin")  # Like the firmware, which raises at boot
+    wake_pin = (pin, level)
+
+
+def raw_temperature():
+    return 120
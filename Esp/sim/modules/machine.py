@@ -0,0 +1,139 @@
+# Stand-in for MicroPython's machine module: virtual pins, sleep on the virtual clock,
+# and reset/deepsleep as exceptions the simulator catches.
+import sim_time
+from vclock import clock
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+reset_reason = PWRON_RESET
+rtc_memory = b""  # Survives reset and deep sleep, like the RTC slow memory
+held_levels = {}  # Pin number -> level of pins held through a reset or deep sleep
+slept_ms = 0
+
+
+class Reset(SystemExit):
+    """machine.reset() was called. SystemExit so no `except Exception` in main.py stops it."""
+
+
+class DeepSleep(SystemExit):
+    """machine.deepsleep() was called; the device boots again after `ms`."""
+
+    def __init__(self, ms):
+        super().__init__(ms)
+        self.ms = ms
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    pins = {}  # Pin number -> Pin, so a test can find the pin main.py created
+
+    def __init__(self, number, mode=-1, pull=-1, value=None, hold=False):
+        self.number = number
+        self.handler = None
+        self.trigger = 0
+        self.level = 1 if pull == Pin.PULL_UP else 0
+        self.hold = hold
+        self.changes = 0  # How often an output changed level
+        Pin.pins[number] = self
+        if value is not None:
+            self.level = value
+        if hold and number in held_levels:
+            self.level = held_levels[number]
+
+    def init(self, mode=-1, pull=-1, value=None, hold=None):
+        if hold is not None:
+            self.hold = hold
+        if value is not None:
+            self.value(value)
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        level = 1 if level else 0
+        if self.hold:
+            return  # A held pin keeps its level, like on the chip
+        if level != self.level:
+            self.changes += 1
+            self._edge(level)
+        self.level = level
+
+    def __call__(self, level=None):
+        return self.value(level)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, trigger=IRQ_FALLING | IRQ_RISING, handler=None):
+        self.trigger = trigger
+        self.handler = handler
+
+    def _edge(self, level):
+        edge = Pin.IRQ_RISING if level else Pin.IRQ_FALLING
+        if self.handler and self.trigger & edge:
+            self.handler(self)
+
+    def drive(self, level):
+        """Set the level from outside, e.g. a button being pressed. Fires the interrupt."""
+        level = 1 if level else 0
+        if level != self.level:
+            self.level = level
+            self._edge(level)
+
+
+class RTC:
+    def memory(self, data=None):
+        global rtc_memory
+        if data is None:
+            return rtc_memory
+        rtc_memory = bytes(data)
+
+    def datetime(self, value=None):
+        t = sim_time.localtime()
+        return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+
+
+def unique_id():
+    return b"\x24\x0a\xc4\x5e\x1a\x01"
+
+
+def reset_cause():
+    return reset_reason
+
+
+def reset():
+    raise Reset()
+
+
+def soft_reset():
+    raise Reset()
+
+
+def lightsleep(ms=0):
+    global slept_ms
+    clock.advance(ms / 1000)
+    slept_ms += ms
+
+
+def deepsleep(ms=0):
+    raise DeepSleep(ms)
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def idle():
+    pass
@@ -0,0 +1,118 @@
+# Stand-in for MicroPython's network module: a simulated WLAN on the virtual clock.
+#
+# Access points are added with add_access_point(). A connect succeeds after
+# `connect_delay` seconds (or `fast_connect_delay` when the BSSID is given), unless the
+# SSID or password is wrong, or a random draw falls under `failure_rate`.
+import random
+from vclock import clock
+
+STA_IF = 0
+AP_IF = 1
+AUTH_OPEN = 0
+AUTH_WEP = 1
+AUTH_WPA_PSK = 2
+AUTH_WPA2_PSK = 3
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_WRONG_PASSWORD = 202
+STAT_NO_AP_FOUND = 201
+STAT_CONNECT_FAIL = 203
+
+connect_delay = 2.0       # Seconds for a connect that has to scan all channels
+fast_connect_delay = 0.4  # Seconds when the BSSID and channel are known
+scan_time = 2.2           # Seconds a scan blocks
+failure_rate = 0.0        # Chance that a connect attempt never completes
+rng = random.Random(0)
+
+access_points = []
+interfaces = {}
+
+
+def add_access_point(ssid, password, channel=6, rssi=-60, bssid=None, authmode=AUTH_WPA2_PSK):
+    bssid = bssid or bytes([0x02, 0, 0, 0, len(access_points) >> 8, len(access_points) & 0xFF])
+    access_points.append({"ssid": ssid, "password": password, "channel": channel,
+                          "rssi": rssi, "bssid": bssid, "authmode": authmode})
+    return bssid
+
+
+def reset():
+    """Forget the access points and interfaces, e.g. between simulated devices."""
+    global connect_delay, fast_connect_delay, scan_time, failure_rate
+    access_points.clear()
+    interfaces.clear()
+    connect_delay, fast_connect_delay, scan_time, failure_rate = 2.0, 0.4, 2.2, 0.0
+    rng.seed(0)
+
+
+class WLAN:
+    def __new__(cls, interface=STA_IF):
+        # MicroPython hands out one object per interface
+        if interface not in interfaces:
+            wlan = super().__new__(cls)
+            wlan.interface = interface
+            wlan._active = False
+            wlan._config = {"channel": 0, "essid": ""}
+            wlan._connected_at = None
+            wlan._status = STAT_IDLE
+            wlan.connects = 0
+            interfaces[interface] = wlan
+        return interfaces[interface]
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+        if not self._active:
+            self._connected_at = None
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
+
+    def connect(self, ssid=None, key=None, bssid=None):
+        if not self._active:
+            raise OSError("WLAN not active")
+        self.connects += 1
+        self._connected_at = None
+        channel = self._config.get("channel") if bssid else 0
+
+        ap = None
+        for candidate in access_points:
+            if candidate["ssid"] == ssid and (bssid is None or candidate["bssid"] == bytes(bssid)) \
+                    and (not channel or candidate["channel"] == channel):
+                ap = candidate
+        if ap is None:
+            self._status = STAT_NO_AP_FOUND
+        elif ap["authmode"] != AUTH_OPEN and ap["password"] != key:
+            self._status = STAT_WRONG_PASSWORD
+        elif rng.random() < failure_rate:
+            self._status = STAT_CONNECT_FAIL
+        else:
+            self._status = STAT_CONNECTING
+            self._connected_at = clock.monotonic + (fast_connect_delay if bssid else connect_delay)
+            self._config["channel"] = ap["channel"]  # config('channel') is the access point's once connected
+
+    def disconnect(self):
+        self._connected_at = None
+        self._status = STAT_IDLE
+
+    def isconnected(self):
+        return self._connected_at is not None and clock.monotonic >= self._connected_at
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -60
+        return STAT_GOT_IP if self.isconnected() else self._status
+
+    def scan(self):
+        if not self._active:
+            raise OSError("WLAN not active")
+        clock.advance(scan_time)
+        return [(ap["ssid"].encode(), ap["bssid"], ap["channel"], ap["rssi"], ap["authmode"], False)
+                for ap in access_points]
+
+    def ifconfig(self, value=None):
+        return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "8.8.8.8") if self.interface == AP_IF \
+            else ("192.168.1.50", "255.255.255.0", "192.168.1.1", "8.8.8.8")
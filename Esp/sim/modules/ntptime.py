@@ -0,0 +1,18 @@
+# Stand-in for MicroPython's ntptime module. settime() sets the virtual wall clock to
+# `start` (seconds since 1970), or to the real time if it is None.
+import time as _time
+import network
+from vclock import clock
+
+host = "pool.ntp.org"
+start = None
+
+
+def time():
+    return int(start if start is not None else _time.time())
+
+
+def settime():
+    if not network.WLAN(network.STA_IF).isconnected():
+        raise OSError(113, "EHOSTUNREACH")
+    clock.set_wall(time())
@@ -0,0 +1,30 @@
+# Stand-in for MicroPython's gc module. mem_alloc() is what tracemalloc has seen, so the
+# numbers only mean something while tracemalloc is tracing (the benchmarks turn it on).
+import gc as _gc
+import tracemalloc
+
+HEAP_SIZE = 160 * 1024  # Roughly the heap MicroPython has left on an ESP32 without PSRAM
+
+
+def collect():
+    return _gc.collect()
+
+
+def enable():
+    _gc.enable()
+
+
+def disable():
+    _gc.disable()
+
+
+def mem_alloc():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def mem_free():
+    return HEAP_SIZE - mem_alloc()
+
+
+def threshold(amount=None):
+    return -1
@@ -0,0 +1,52 @@
+# Stand-in for MicroPython's time module, on the virtual clock. It is put in sys.modules
+# as "time" only while main.py is loaded, so the rest of CPython keeps the real one.
+import time as _time
+from vclock import clock
+
+
+def time():
+    return int(clock.wall())
+
+
+def time_ns():
+    return int(clock.wall() * 1e9)
+
+
+def gmtime(secs=None):
+    # MicroPython returns (year, month, mday, hour, minute, second, weekday, yearday)
+    return tuple(_time.gmtime(time() if secs is None else secs))[:8]
+
+
+localtime = gmtime  # The ESP32 RTC has no time zone
+
+
+def mktime(t):
+    return int(_time.mktime(tuple(t[:8]) + (0,)) - _time.timezone)
+
+
+def ticks_ms():
+    return int(clock.monotonic * 1000)
+
+
+def ticks_us():
+    return int(clock.monotonic * 1000000)
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def ticks_diff(end, start):
+    return end - start
+
+
+def sleep(seconds):
+    clock.advance(seconds)
+
+
+def sleep_ms(ms):
+    clock.advance(ms / 1000)
+
+
+def sleep_us(us):
+    clock.advance(us / 1000000)
@@ -0,0 +1,118 @@
+# Stand-in for MicroPython's uasyncio module on top of CPython's asyncio.
+#
+# Sockets are replaced by in-memory streams: start_server() only registers the handler
+# under its port, and open_connection() connects to a handler registered with serve().
+# Streams have the MicroPython extras awrite() and aclose().
+import asyncio as _asyncio
+from asyncio import (CancelledError, Event, Lock, TimeoutError, create_task, current_task,
+                     gather, get_event_loop, run, sleep, wait_for)
+
+servers = {}  # port -> handler started by the device with start_server()
+hosts = {}    # (host, port) -> handler the device can open_connection() to
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(awaitable, timeout):
+    return await _asyncio.wait_for(awaitable, timeout / 1000)
+
+
+class ThreadSafeFlag:
+    # Interrupt handlers run on the loop's thread in the simulator, so an Event is enough
+    def __init__(self):
+        self._event = Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+class Stream:
+    """One end of an in-memory connection; it reads what the other end writes."""
+
+    def __init__(self):
+        self.reader = _asyncio.StreamReader()
+        self.peer = None
+        self.written = 0
+
+    async def readline(self):
+        return await self.reader.readline()
+
+    async def read(self, n=-1):
+        return await self.reader.read(n)
+
+    async def readexactly(self, n):
+        return await self.reader.readexactly(n)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.written += len(data)
+        if not self.peer.reader.at_eof():
+            self.peer.reader.feed_data(bytes(data))
+
+    async def drain(self):
+        await _asyncio.sleep(0)
+
+    async def awrite(self, data):
+        self.write(data)
+        await self.drain()
+
+    def close(self):
+        if not self.peer.reader.at_eof():
+            self.peer.reader.feed_eof()
+
+    async def aclose(self):
+        self.close()
+
+    async def wait_closed(self):
+        pass
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 0) if name == "peername" else None
+
+
+def pipe():
+    a, b = Stream(), Stream()
+    a.peer, b.peer = b, a
+    return a, b
+
+
+class Server:
+    def __init__(self, port):
+        self.port = port
+        self.closed = Event()
+
+    def close(self):
+        servers.pop(self.port, None)
+        self.closed.set()
+
+    async def wait_closed(self):
+        await self.closed.wait()
+
+
+async def start_server(callback, host, port, backlog=5):
+    servers[port] = callback
+    return Server(port)
+
+
+def serve(host, port, handler):
+    """Let the device connect to (host, port); handler(reader, writer) answers like a server."""
+    hosts[(host, port)] = handler
+
+
+async def open_connection(host, port):
+    handler = hosts.get((host, port))
+    if handler is None:
+        raise OSError(113, "EHOSTUNREACH")
+    client, server = pipe()
+    create_task(handler(server, server))
+    return client, client
@@ -0,0 +1,2 @@
+# Stand-in for MicroPython's ubinascii module.
+from binascii import hexlify, unhexlify, a2b_base64, b2a_base64, crc32
@@ -0,0 +1,25 @@
+# Stand-in for MicroPython's ucryptolib module.
+#
+# This is NOT AES: the data is XORed with the key. Blocks keep their size and decrypt()
+# undoes encrypt(), which is all main.py relies on, but a config file written by the
+# simulator can't be read on a real device (or the other way round).
+MODE_ECB = 1
+MODE_CBC = 2
+
+
+class aes:
+    def __init__(self, key, mode, iv=None):
+        if len(key) not in (16, 24, 32):
+            raise ValueError("Key must be 16, 24 or 32 bytes")
+        self.key = bytes(key)
+
+    def _xor(self, data):
+        if len(data) % 16:
+            raise ValueError("Data must be a multiple of 16 bytes")
+        return bytes(b ^ self.key[i % len(self.key)] for i, b in enumerate(data))
+
+    def encrypt(self, data):
+        return self._xor(data)
+
+    def decrypt(self, data):
+        return self._xor(data)
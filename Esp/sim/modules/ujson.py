@@ -0,0 +1,2 @@
+# Stand-in for MicroPython's ujson module.
+from json import dump, dumps, load, loads, JSONDecodeError
@@ -0,0 +1,29 @@
+# Virtual clock shared by the stand-in modules.
+#
+# `monotonic` is the time since boot in seconds. Nothing waits for real: sleeps and the
+# event loop just move the clock forward. Until ntptime.settime() is called the wall clock
+# starts at 2000-01-01 like the RTC of a real ESP32.
+
+RTC_START = 946684800  # 2000-01-01 00:00:00 UTC
+
+
+class Clock:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.monotonic = 0.0
+        self.wall_base = RTC_START
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.monotonic += seconds
+
+    def wall(self):
+        return self.wall_base + self.monotonic
+
+    def set_wall(self, seconds):
+        self.wall_base = seconds - self.monotonic
+
+
+clock = Clock()
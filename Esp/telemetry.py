@@ -0,0 +1,129 @@
+# Logging and telemetry for the ESP32 (MicroPython)
+#
+# log() only prints messages at or above LOG_LEVEL, and only formats them then, so the
+# debug messages cost nothing in normal operation.
+#
+# Telemetry records are kept in a fixed-size ring buffer in RAM, 12 bytes each:
+#   time (uint32, seconds), kind (uint8), extra (int16), value (int32)
+# When the buffer is full the oldest record is overwritten. upload() sends the records
+# in batches as InfluxDB line protocol to Influx/ingest.py, which writes them to the bucket.
+import time, struct
+import uasyncio as asyncio
+
+# Log levels
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LOG_LEVEL = INFO
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+def log(level, message, *args):
+    if level >= LOG_LEVEL:
+        print(LEVEL_NAMES[level], message % args if args else message)
+
+def debug(message, *args):
+    log(DEBUG, message, *args)
+
+def info(message, *args):
+    log(INFO, message, *args)
+
+def warning(message, *args):
+    log(WARNING, message, *args)
+
+def error(message, *args):
+    log(ERROR, message, *args)
+
+# Record kinds and the value they carry
+BOOT = 0         # value: reset cause
+STATE = 1        # value: new state of the state machine
+CONNECT = 2      # value: connect time in ms, extra: 1 if the saved access point was used
+RELAY = 3        # value: 1 on, 0 off
+HEAP = 4         # value: free heap in bytes, extra: largest free block in kB (0 if unknown)
+WAKE = 5         # value: seconds slept
+FAILURE = 6      # value: failure code (see below)
+DROPPED = 7      # value: records overwritten before they could be uploaded
+KIND_NAMES = ("boot", "state", "connect", "relay", "heap", "wake", "failure", "dropped")
+
+# Failure codes
+FAIL_CONNECT = 1
+FAIL_SCHEDULE = 2
+FAIL_UPLOAD = 3
+
+RECORD_FORMAT = "<IBxhi"
+RECORD_SIZE = 12
+MEASUREMENT = "device_telemetry"
+
+# time.time() counts from 2000 on some MicroPython ports, InfluxDB wants seconds since 1970
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+CLOCK_SET = 1704067200  # 2024-01-01; records from before the clock was set get no timestamp
+
+
+class Telemetry:
+    def __init__(self, device, capacity=256):
+        self.device = device
+        self.capacity = capacity
+        self.buf = bytearray(capacity * RECORD_SIZE)  # Allocated once, never grows
+        self.head = 0      # Number of records written so far
+        self.tail = 0      # Number of records uploaded (or overwritten) so far
+        self.dropped = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def record(self, kind, value=0, extra=0):
+        if self.head - self.tail >= self.capacity:
+            self.tail += 1  # Overwrite the oldest record
+            self.dropped += 1
+        offset = (self.head % self.capacity) * RECORD_SIZE
+        struct.pack_into(RECORD_FORMAT, self.buf, offset, int(time.time()), kind, extra, value)
+        self.head += 1
+
+    def _timestamp(self, seconds):
+        seconds += EPOCH_OFFSET
+        return seconds if seconds >= CLOCK_SET else None
+
+    async def upload(self, host, port, path, batch=64):
+        """
+        Send the buffered records in batches of `batch` lines.
+
+        Returns the number of records sent. Records are only removed from the buffer once
+        the server has answered 204, so a failed upload is retried with the next call.
+        """
+        if self.dropped:
+            self.record(DROPPED, self.dropped)
+            self.dropped = 0
+
+        sent = 0
+        while len(self):
+            first = self.tail
+            count = min(len(self), batch)
+            lines = []
+            for index in range(first, first + count):
+                seconds, kind, extra, value = struct.unpack_from(
+                    RECORD_FORMAT, self.buf, (index % self.capacity) * RECORD_SIZE)
+                timestamp = self._timestamp(seconds)
+                lines.append("%s,device=%s,kind=%s value=%di,extra=%di%s\n" % (
+                    MEASUREMENT, self.device, KIND_NAMES[kind], value, extra,
+                    " %d" % timestamp if timestamp else ""))
+
+            reader, writer = await asyncio.open_connection(host, port)
+            try:
+                await writer.awrite(
+                    "POST %s HTTP/1.0\r\nHost: %s\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n"
+                    % (path, host, sum(len(line) for line in lines)))
+                for line in lines:
+                    writer.write(line)
+                await writer.drain()
+                status = int((await reader.readline()).split()[1])
+            finally:
+                await writer.aclose()
+
+            if status != 204:
+                warning("Telemetry upload answered %d", status)
+                break
+
+            # New records may have overwritten some of these during the upload
+            self.tail = max(self.tail, first + count)
+            sent += count
+        return sent
@@ -0,0 +1,95 @@
+import itertools
+import random
+import pytest
+from scheduler import plan, plan_cost
+
+# Compares scheduler.plan with trying every on/off plan, on inputs small enough for that.
+# Run from this folder: pytest test_scheduler.py
+
+
+def runs(schedule):
+    """Split a plan into [(on, length)] runs."""
+    return [(on, len(list(group))) for on, group in itertools.groupby(schedule)]
+
+
+def allowed(schedule, hours, min_run=1, min_off=1, max_starts=None, must_run=(), forbidden=(), initial_on=False,
+            initial_length=None, checkpoints=None):
+    """Whether a plan keeps every constraint of scheduler.plan."""
+    if sum(schedule) != hours:
+        return False
+    if any(not schedule[i] for i in must_run) or any(schedule[i] for i in forbidden):
+        return False
+    for i, used in (checkpoints or {}).items():
+        if 0 < i < len(schedule) and sum(schedule[:i]) != used:
+            return False
+
+    # The state before the first slot counts as a run of its own
+    before = float('inf') if initial_length is None else initial_length
+    groups = [(initial_on, before)] + runs(schedule)
+    if len(groups) > 1 and groups[1][0] == initial_on:
+        groups[:2] = [(initial_on, before + groups[1][1])]
+
+    starts = 0
+    for index, (on, length) in enumerate(groups):
+        last = index == len(groups) - 1
+        if on and length < min_run and not (index == 0 and last):
+            # Every run is at least min_run, the last one too. Only a run that started before
+            # the window and lasts all of it may be shorter; it goes on in the next window.
+            return False
+        if not on and not last and length < min_off:
+            return False  # The pump can't start again before min_off
+        if on and index > 0:
+            starts += 1
+    return max_starts is None or starts <= max_starts
+
+
+def brute_force(prices, hours, **constraints):
+    """The cost of the cheapest plan that keeps the constraints, None if there is none."""
+    costs = [
+        plan_cost(prices, schedule)
+        for schedule in itertools.product((False, True), repeat=len(prices))
+        if allowed(list(schedule), hours, **constraints)
+    ]
+    return min(costs) if costs else None
+
+
+def random_case(rng):
+    n = rng.randint(1, 9)
+    prices = [rng.randint(-3, 9) for _ in range(n)]
+    slots = rng.sample(range(n), rng.randint(0, min(n, 3)))
+    split = rng.randint(0, len(slots))
+    constraints = {
+        'min_run': rng.randint(1, 3),
+        'min_off': rng.randint(1, 3),
+        'max_starts': rng.choice([None, 0, 1, 2]),
+        'must_run': slots[:split],
+        'forbidden': slots[split:],
+        'initial_on': rng.random() < 0.5,
+        'initial_length': rng.choice([None, 0, 1, 2, 3]),
+    }
+    if n > 2 and rng.random() < 0.4:
+        point = rng.randint(1, n - 1)
+        constraints['checkpoints'] = {point: rng.randint(0, point)}
+    return prices, rng.randint(0, n), constraints
+
+
+@pytest.mark.parametrize("seed", range(400))
+def test_plan_matches_brute_force(seed):
+    prices, hours, constraints = random_case(random.Random(seed))
+    best = brute_force(prices, hours, **constraints)
+    if best is None:
+        with pytest.raises(ValueError):
+            plan(prices, hours, **constraints)
+        return
+
+    schedule = plan(prices, hours, **constraints)
+    assert len(schedule) == len(prices)
+    assert allowed(schedule, hours, **constraints)
+    assert plan_cost(prices, schedule) == best
+
+
+def test_unknown_initial_length_is_free_to_switch():
+    prices = [9, 9, 1, 1, 1, 1]
+    assert plan(prices, 2, min_run=2, initial_on=True) == [False, False, False, False, True, True]
+    # A run that has only just started has to go on
+    assert plan(prices, 2, min_run=2, initial_on=True, initial_length=1) == [True, True, False, False, False, False]
@@ -0,0 +1,99 @@
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from influxdb_client import Point, WritePrecision
+from influx import Influx, flux_time, ACTUAL_PRICES, LEGACY_PRICES
+
+# Benchmark of schema v1 against v2 on the same prices, in a scratch bucket that is removed
+# afterwards. v1 is written like Influx/main.py used to (a date tag per point, west only),
+# v2 like it does now (an area tag); each gets the same hours for the west area.
+#
+#   python bench_schema.py [days]
+
+load_dotenv()
+
+BUCKET = "schema_bench"
+DAYS = 365
+REPEATS = 5
+
+
+def synthetic_prices(days, stop):
+    """(hour, price, tarif_price) for `days` days before `stop`, a daily curve with a trend."""
+    start = stop - timedelta(days=days)
+    for hour in range(days * 24):
+        timestamp = start + timedelta(hours=hour)
+        price = 1.5 + 0.8 * (7 <= timestamp.hour <= 20) + 0.001 * hour / 24
+        yield timestamp, round(price, 4), round(price * 0.3, 4)
+
+
+def v1_points(prices):
+    return [Point(LEGACY_PRICES).tag("date", timestamp.strftime("%d-%m-%Y")).field("price", price)
+            .field("tarif_price", tarif).time(timestamp, WritePrecision.S) for timestamp, price, tarif in prices]
+
+
+def v2_points(prices):
+    return [Point(ACTUAL_PRICES).tag("area", "west").field("price", price)
+            .field("tarif_price", tarif).time(timestamp, WritePrecision.S) for timestamp, price, tarif in prices]
+
+
+def series(db, measurement):
+    query = f"""import "influxdata/influxdb"
+        influxdb.cardinality(bucket: "{db.bucket}", start: 0, predicate: (r) => r._measurement == "{measurement}")"""
+    for table in db.client.query_api().query(query, org=db.org):
+        for record in table.records:
+            return record.get_value()
+    return None
+
+
+def timed(db, query):
+    """Median seconds to run a query and read all of its rows."""
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        rows = sum(len(table.records) for table in db.client.query_api().query(query, org=db.org))
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), rows
+
+
+def queries(db, measurement, day, start, stop):
+    """The reads the other scripts do: one day for the ESP32, and daily means for a year."""
+    area = ' and r.area == "west"' if measurement == ACTUAL_PRICES else ""
+    prices = f"""from(bucket: "{db.bucket}")
+            |> range(start: {{start}}, stop: {{stop}})
+            |> filter(fn: (r) => r._measurement == "{measurement}" and r._field == "price"{area})"""
+    return {
+        "one day": prices.format(start=flux_time(day), stop=flux_time(day + timedelta(days=1))),
+        "daily means": prices.format(start=flux_time(start), stop=flux_time(stop)) + """
+            |> group()
+            |> aggregateWindow(every: 1d, fn: mean, createEmpty: false)""",
+    }
+
+
+def main(days=DAYS):
+    db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket=BUCKET)
+    buckets = db.client.buckets_api()
+    bucket = buckets.find_bucket_by_name(BUCKET) or buckets.create_bucket(bucket_name=BUCKET, org=db.org)
+    try:
+        stop = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        prices = list(synthetic_prices(days, stop))
+        for points in (v1_points(prices), v2_points(prices)):
+            for i in range(0, len(points), 5000):
+                db.write_points(points[i:i + 5000])
+
+        print(f"{days} days of hourly prices")
+        day = stop - timedelta(days=days // 2)
+        for measurement, name in ((LEGACY_PRICES, "v1"), (ACTUAL_PRICES, "v2")):
+            print(f"{name} ({measurement}): {series(db, measurement)} series")
+            for label, query in queries(db, measurement, day, stop - timedelta(days=days), stop).items():
+                seconds, rows = timed(db, query)
+                print(f"  {label}: {seconds * 1000:.1f} ms ({rows} rows)")
+    finally:
+        buckets.delete_bucket(bucket)
+        db.exit()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DAYS)
@@ -1,5 +1,76 @@
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
+from datetime import datetime, timedelta, timezone
+
+# Schema v2: a measurement per kind of data, tagged only with things that have a few values
+# (area, site, model version), so the number of series stays fixed as data is added.
+PREDICTED_PRICES = "predicted_prices"
+ACTUAL_PRICES = "prices"  # Fields price and tarif_price, tag area
+WEATHER = "weather"  # Hourly weather per site, written by Prediction/ml_data.py
+AREAS = {"west": "westPrices", "east": "eastPrices"}  # Area tag -> key in the Energi Fyn response
+
+# Schema v1: west prices only, tagged with their date (a new series every day). migrate.py
+# copies them to ACTUAL_PRICES.
+LEGACY_PRICES = "customer_prices"
+WEATHER_FIELDS = ("cloud_cover", "temperature", "wind_speed")
+
+# Rollups of the actual prices, maintained by rollups.py
+DAILY_PRICES = "price_daily"      # min/mean/max/count per area and day
+PRICE_PROFILE = "price_profile"   # mean per area, weekday and hour over all history
+ROLLUP_STATE = "rollup_state"     # How far each rollup has got (its watermark)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)  # Flux windows are aligned to this
+
+def flux_time(value):
+    """Format a datetime for a Flux range (naive datetimes are taken as UTC, like when writing).
+    Strings such as "-7d" are passed through unchanged."""
+    if not hasattr(value, "strftime"):
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def as_utc(value):
+    """Naive datetimes are taken as UTC, like everywhere else in this class."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def merge_summaries(rows):
+    """
+    Combine summary rows with the same time and area (e.g. a window that is partly in a
+    rollup and partly raw data) into one. The mean is weighted by the count.
+    """
+    merged = {}
+    for row in rows:
+        key = (row["time"], row["area"])
+        if key not in merged:
+            merged[key] = dict(row)
+            continue
+        other = merged[key]
+        count = other["count"] + row["count"]
+        other["mean"] = (other["mean"] * other["count"] + row["mean"] * row["count"]) / count
+        other["min"] = min(other["min"], row["min"])
+        other["max"] = max(other["max"], row["max"])
+        other["count"] = count
+    return sorted(merged.values(), key=lambda row: (row["time"], row["area"]))
+
+def price_points(response):
+    """
+    Turn an Energi Fyn consumptionprice response into schema v2 points, for both areas.
+
+    Returns:
+        list: One Point per area and hour.
+    """
+    points = []
+    for area, key in AREAS.items():
+        for day_data in (response or {}).get(key, {}).values():
+            for price_entry in day_data.get("prices", []):
+                points.append(
+                    Point(ACTUAL_PRICES)
+                    .tag("area", area)
+                    .field("price", float(price_entry["price"]))
+                    .field("tarif_price", float(price_entry["tarifPrice"]))
+                    .time(datetime.fromisoformat(price_entry["hour"]), WritePrecision.S)
+                )
+    return points
 
 class Influx:
     def __init__(self, url, bucket, org, token):
@@ -23,12 +94,259 @@ class Influx:
             print("Could not write data")
 
 
+    def write_points(self, points):
+        """Write a list of points in a single request."""
+        try:
+            self.write_api.write(bucket=self.bucket, org=self.org, record=points)
+            print(f"{len(points)} points written to InfluxDB successfully.")
+            return True
+        except Exception as e:
+            print(f"Could not write data: {e}")
+            return False
+
+    def write_prices(self, response):
+        """Write the prices in an Energi Fyn response (both areas) in one request."""
+        points = price_points(response)
+        return self.write_points(points) if points else False
+
+    def write_lines(self, lines, precision=WritePrecision.S):
+        """Write points that are already in line protocol, e.g. telemetry from the ESP32s."""
+        try:
+            self.write_api.write(bucket=self.bucket, org=self.org, record=lines, write_precision=precision)
+            return True
+        except Exception as e:
+            print(f"Could not write data: {e}")
+            return False
+
+    def write_weather(self, rows, site="odense"):
+        """
+        Write hourly weather rows in the training dataset format in one request.
+
+        rows: dicts with 'timestamp' (ISO string or datetime) and the WEATHER_FIELDS
+        """
+        points = []
+        for row in rows:
+            fields = {name: float(row[name]) for name in WEATHER_FIELDS if row.get(name) is not None}
+            if not fields:
+                continue
+            timestamp = row["timestamp"]
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            point = Point(WEATHER).tag("site", site).time(timestamp, WritePrecision.S)
+            for name, value in fields.items():
+                point = point.field(name, value)
+            points.append(point)
+        return self.write_points(points) if points else True
+
+    def stream_training_rows(self, start, stop, site="odense"):
+        """
+        Prices and weather per hour in [start, stop), as rows in the training dataset format.
+
+        The rows are joined and sorted in InfluxDB and streamed from the response, so memory
+        doesn't grow with the length of the range. Timestamps are naive, as they were written.
+
+        Yields dicts with timestamp (ISO string), cloud_cover, temperature, wind_speed,
+        west_price and east_price (None where missing).
+        """
+        start, stop = flux_time(start), flux_time(stop)
+        query = f"""prices = from(bucket: "{self.bucket}")
+            |> range(start: {start}, stop: {stop})
+            |> filter(fn: (r) => r._measurement == "{ACTUAL_PRICES}" and r._field == "price")
+            |> map(fn: (r) => ({{_time: r._time, _value: float(v: r._value), _field: r.area + "_price"}}))
+
+        weather = from(bucket: "{self.bucket}")
+            |> range(start: {start}, stop: {stop})
+            |> filter(fn: (r) => r._measurement == "{WEATHER}" and r.site == "{site}")
+            |> map(fn: (r) => ({{_time: r._time, _value: float(v: r._value), _field: r._field}}))
+
+        union(tables: [prices, weather])
+            |> group()
+            |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+            |> sort(columns: ["_time"])"""
+
+        for record in self.client.query_api().query_stream(query, org=self.org):
+            row = {"timestamp": record.get_time().replace(tzinfo=None).isoformat()}
+            for name in WEATHER_FIELDS + ("west_price", "east_price"):
+                row[name] = record.values.get(name)
+            yield row
+
+    def write_predictions(self, timestamps, predicted_prices, model_version, areas=("west", "east")):
+        """
+        Write predicted prices, batched so each day is written in one request.
+
+        timestamps:       one datetime per predicted hour
+        predicted_prices: one row per hour with a column per area (as returned by model.predict)
+        model_version:    the version of the model that made the prediction
+        """
+        days = {}
+        for timestamp, row in zip(timestamps, predicted_prices):
+            for column, area in enumerate(areas):
+                point = (
+                    Point(PREDICTED_PRICES)
+                    .tag("area", area)
+                    .tag("model_version", model_version)
+                    .field("price", float(row[column]))
+                    .time(timestamp, WritePrecision.NS)
+                )
+                days.setdefault(timestamp.date(), []).append(point)
+
+        return all(self.write_points(points) for points in days.values())
+
+    def read_predicted_vs_actual(self, start, stop, area=None):
+        """
+        Get predicted and actual prices side by side with a single query.
+
+        start/stop: datetimes or Flux durations like "-7d"
+        area:       "west" or "east", or None for both
+
+        Returns a list of dicts with time, area, predicted and actual (None where missing).
+        """
+        start, stop = flux_time(start), flux_time(stop)
+        area_filter = f' and r.area == "{area}"' if area else ""
+
+        query = f"""from(bucket: "{self.bucket}")
+            |> range(start: {start}, stop: {stop})
+            |> filter(fn: (r) => (r._measurement == "{PREDICTED_PRICES}" or r._measurement == "{ACTUAL_PRICES}") and r._field == "price"{area_filter})
+            |> map(fn: (r) => ({{
+                _time: r._time,
+                _value: r._value,
+                area: r.area,
+                kind: if r._measurement == "{PREDICTED_PRICES}" then "predicted" else "actual"
+            }}))
+            |> group()
+            |> pivot(rowKey: ["_time", "area"], columnKey: ["kind"], valueColumn: "_value")
+            |> sort(columns: ["_time", "area"])"""
+
+        rows = []
+        for table in self.client.query_api().query(query, org=self.org):
+            for record in table.records:
+                rows.append({
+                    "time": record.get_time(),
+                    "area": record.values.get("area"),
+                    "predicted": record.values.get("predicted"),
+                    "actual": record.values.get("actual"),
+                })
+        return rows
+
+    def read_watermark(self, rollup):
+        """The time up to which a rollup is complete, None if it hasn't run yet."""
+        query = f"""from(bucket: "{self.bucket}")
+            |> range(start: 0)
+            |> filter(fn: (r) => r._measurement == "{ROLLUP_STATE}" and r.rollup == "{rollup}" and r._field == "watermark")
+            |> last()"""
+        for table in self.client.query_api().query(query, org=self.org):
+            for record in table.records:
+                return EPOCH + timedelta(seconds=record.get_value())
+        return None
+
+    def watermark_point(self, rollup, time):
+        """The point write_watermark writes, for writing it in the same request as the data."""
+        return (
+            Point(ROLLUP_STATE)
+            .tag("rollup", rollup)
+            .field("watermark", int((as_utc(time) - EPOCH).total_seconds()))
+            .time(datetime.now(timezone.utc), WritePrecision.S)
+        )
+
+    def write_watermark(self, rollup, time):
+        return self.write_points([self.watermark_point(rollup, time)])
+
+    def read_price_summary(self, start, stop, every=timedelta(days=1), area=None):
+        """
+        Min, mean, max and count of the actual prices per `every` (aligned to 1970-01-01 UTC).
+
+        Windows of whole days are read from the daily rollup up to its watermark, and only
+        the rest from the raw prices; shorter windows always come from the raw prices.
+
+        Returns a list of dicts with time (window start), area, min, mean, max and count.
+        """
+        start, stop = as_utc(start), as_utc(stop)
+        rows = []
+        if every % timedelta(days=1) == timedelta(0):
+            watermark = self.read_watermark("daily")
+            if watermark is not None and start < watermark:
+                rollup_stop = min(stop, watermark)
+                rows += self._rollup_summary(start, rollup_stop, every, area)
+                start = rollup_stop
+        if start < stop:
+            rows += self._raw_summary(start, stop, every, area)
+        return merge_summaries(rows)
+
+    def _raw_summary(self, start, stop, every, area):
+        area_filter = f' and r.area == "{area}"' if area else ""
+        query = f"""data = from(bucket: "{self.bucket}")
+            |> range(start: {flux_time(start)}, stop: {flux_time(stop)})
+            |> filter(fn: (r) => r._measurement == "{ACTUAL_PRICES}" and r._field == "price"{area_filter})
+            |> group(columns: ["area"])
+
+        window = (fn, name) => data
+            |> aggregateWindow(every: {int(every.total_seconds())}s, fn: fn, timeSrc: "_start", createEmpty: false)
+            |> toFloat()
+            |> set(key: "_field", value: name)
+
+        union(tables: [window(fn: min, name: "min"), window(fn: mean, name: "mean"), window(fn: max, name: "max"), window(fn: count, name: "count")])
+            |> pivot(rowKey: ["_time", "area"], columnKey: ["_field"], valueColumn: "_value")"""
+        return self._summary_rows(query)
+
+    def _rollup_summary(self, start, stop, every, area):
+        area_filter = f'|> filter(fn: (r) => r.area == "{area}")' if area else ""
+        query = f"""from(bucket: "{self.bucket}")
+            |> range(start: {flux_time(start)}, stop: {flux_time(stop)})
+            |> filter(fn: (r) => r._measurement == "{DAILY_PRICES}")
+            {area_filter}
+            |> toFloat()
+            |> pivot(rowKey: ["_time", "area"], columnKey: ["_field"], valueColumn: "_value")"""
+        rows = self._summary_rows(query)
+
+        # Days are combined into the requested windows here; there is one row per day, so it is cheap
+        for row in rows:
+            row["time"] = EPOCH + (row["time"] - EPOCH) // every * every
+        return rows
+
+    def _summary_rows(self, query):
+        rows = []
+        for table in self.client.query_api().query(query, org=self.org):
+            for record in table.records:
+                rows.append({
+                    "time": record.get_time(),
+                    "area": record.values.get("area"),
+                    "min": record.values.get("min"),
+                    "mean": record.values.get("mean"),
+                    "max": record.values.get("max"),
+                    "count": int(record.values.get("count") or 0),
+                })
+        return rows
+
+    def read_price_profile(self, area=None):
+        """
+        The average price per weekday (0 = Monday) and hour over all history, from the profile rollup.
+
+        Returns a list of dicts with area, weekday, hour, mean and count.
+        """
+        area_filter = f'|> filter(fn: (r) => r.area == "{area}")' if area else ""
+        query = f"""from(bucket: "{self.bucket}")
+            |> range(start: 0)
+            |> filter(fn: (r) => r._measurement == "{PRICE_PROFILE}")
+            {area_filter}
+            |> pivot(rowKey: ["_time", "area", "weekday", "hour"], columnKey: ["_field"], valueColumn: "_value")"""
+        rows = []
+        for table in self.client.query_api().query(query, org=self.org):
+            for record in table.records:
+                rows.append({
+                    "area": record.values.get("area"),
+                    "weekday": int(record.values.get("weekday")),
+                    "hour": int(record.values.get("hour")),
+                    "mean": record.values.get("mean"),
+                    "count": int(record.values.get("count") or 0),
+                })
+        return sorted(rows, key=lambda row: (row["area"], row["weekday"], row["hour"]))
+
     def read(self, query):
         query_api = self.client.query_api().query
 
         query = """from(bucket: "elpris")
             |> range(start: -180m)
-            |> filter(fn: (r) => r._measurement == "customer_prices")"""
+            |> filter(fn: (r) => r._measurement == "prices")"""
         tables = query_api.query(query, org="ucl")
         for tabel in tables:
             for record in tabel.records:
@@ -22,30 +22,31 @@ response = requests.get(api_url)#, #headers=headers)
 if response.status_code == 200:
     data = response.json()
 
-    # Parse and write the data to InfluxDB
-    customer_prices = data.get("westPrices", {})
-
-    for date_str, day_data in customer_prices.items():
-        prices = day_data.get("prices", [])
-        for price_entry in prices:
-            hour_str = price_entry["hour"]
-            price = price_entry["price"]
-            tarif_price = price_entry["tarifPrice"]
-
-            # Convert hour to a datetime object
-            hour_datetime = datetime.fromisoformat(hour_str)
-
-            # Create InfluxDB point
-            point = (
-                Point("customer_prices")
-                .tag("date", date_str)
-                .field("price", price)
-                .field("tarif_price", tarif_price)
-                .time(hour_datetime, WritePrecision.NS)
-            )
-
-            # Write point to InfluxDB
-            write_api.write(bucket=bucket, org=org, record=point)
+    # Parse and write the data to InfluxDB (schema v2: both areas, tagged with the area)
+    points = []
+    for area, key in (("west", "westPrices"), ("east", "eastPrices")):
+        for date_str, day_data in data.get(key, {}).items():
+            prices = day_data.get("prices", [])
+            for price_entry in prices:
+                hour_str = price_entry["hour"]
+                price = price_entry["price"]
+                tarif_price = price_entry["tarifPrice"]
+
+                # Convert hour to a datetime object
+                hour_datetime = datetime.fromisoformat(hour_str)
+
+                # Create InfluxDB point
+                point = (
+                    Point("prices")
+                    .tag("area", area)
+                    .field("price", float(price))
+                    .field("tarif_price", float(tarif_price))
+                    .time(hour_datetime, WritePrecision.S)
+                )
+                points.append(point)
+
+    # Write all points to InfluxDB in one request
+    write_api.write(bucket=bucket, org=org, record=points)
 
     print("Data written to InfluxDB successfully.")
 
@@ -0,0 +1,75 @@
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from influx import Influx
+
+# Ingest service for telemetry from the ESP32 devices (Esp/telemetry.py).
+#
+#   POST /telemetry
+#
+# The body is InfluxDB line protocol with timestamps in seconds, one record per line:
+#   device_telemetry,device=<id>,kind=relay value=1i,extra=0i 1700000000
+# Lines without a timestamp get the time they arrive. The server answers 204 once the
+# batch is written, so the device only drops records that are stored.
+
+load_dotenv()
+
+PORT = 8087
+MEASUREMENT = "device_telemetry"
+MAX_BODY = 64 * 1024  # A batch of 64 records is about 5 kB
+
+db = None
+
+
+def valid_lines(body):
+    """Split the body into lines, and raise ValueError for anything but telemetry points."""
+    lines = [line for line in body.decode("utf-8").split("\n") if line]
+    for line in lines:
+        if not line.startswith(MEASUREMENT + ","):
+            raise ValueError(f"Unexpected measurement in line: {line[:40]}")
+    return lines
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != "/telemetry":
+            self._reply(404)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if not 0 < length <= MAX_BODY:
+                raise ValueError("Invalid body length")
+            lines = valid_lines(self.rfile.read(length))
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"Rejected telemetry from {self.client_address[0]}: {e}")
+            self._reply(400)
+            return
+
+        # 503 tells the device to keep the records and try again at the next poll
+        self._reply(204 if db.write_lines(lines) else 503)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # Every device posts regularly, don't flood the console
+        pass
+
+
+def run(port=PORT):
+    global db
+    db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket="elpris")
+    server = ThreadingHTTPServer(("0.0.0.0", port), IngestHandler)
+    print(f"Receiving telemetry on port {port}")
+    try:
+        server.serve_forever()
+    finally:
+        db.exit()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else PORT)
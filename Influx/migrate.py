@@ -0,0 +1,118 @@
+import os
+import sys
+from datetime import timedelta
+from dotenv import load_dotenv
+from influxdb_client import Point, WritePrecision
+from influx import Influx, flux_time, as_utc, ACTUAL_PRICES, LEGACY_PRICES
+from rollups import RollupJob
+
+# Copies the schema v1 prices (customer_prices, a date tag on every point) to schema v2
+# (prices, tagged with area) in batches of BATCH_DAYS, oldest first.
+#
+# How far it got is kept as a watermark in the bucket, like the rollups, so it can be stopped
+# and started again. Writing a batch twice is harmless: the points overwrite themselves.
+# With --delete each batch is removed from customer_prices once it has been written, which
+# is what gets rid of the series; run it without first to compare (bench_schema.py).
+# The rollups are reset for the migrated days (RollupJob.reset), so their next run adds them.
+#
+#   python migrate.py [--delete]
+
+load_dotenv()
+
+BATCH_DAYS = 30
+WATERMARK = "migrate_v2"
+
+
+class Migration:
+    def __init__(self, db, batch=timedelta(days=BATCH_DAYS)):
+        self.db = db
+        self.batch = batch
+
+    def _query(self, query):
+        return self.db.client.query_api().query(query, org=self.db.org)
+
+    def legacy_range(self):
+        """First and last time in the v1 measurement, or None if it is empty."""
+        times = []
+        for fn in ("first", "last"):
+            query = f"""from(bucket: "{self.db.bucket}")
+                |> range(start: 0)
+                |> filter(fn: (r) => r._measurement == "{LEGACY_PRICES}" and r._field == "price")
+                |> group()
+                |> {fn}()"""
+            for table in self._query(query):
+                for record in table.records:
+                    times.append(record.get_time())
+        return (times[0], times[1]) if len(times) == 2 else None
+
+    def read_batch(self, start, stop):
+        """The v1 points in [start, stop) as v2 points."""
+        query = f"""from(bucket: "{self.db.bucket}")
+            |> range(start: {flux_time(start)}, stop: {flux_time(stop)})
+            |> filter(fn: (r) => r._measurement == "{LEGACY_PRICES}")
+            |> map(fn: (r) => ({{_time: r._time, _field: r._field, _value: float(v: r._value), area: if exists r.area then r.area else "west"}}))
+            |> group()
+            |> pivot(rowKey: ["_time", "area"], columnKey: ["_field"], valueColumn: "_value")"""
+        points = []
+        for table in self._query(query):
+            for record in table.records:
+                point = Point(ACTUAL_PRICES).tag("area", record.values["area"]).time(record.get_time(), WritePrecision.S)
+                for field in ("price", "tarif_price"):
+                    if record.values.get(field) is not None:
+                        point = point.field(field, record.values[field])
+                points.append(point)
+        return points
+
+    def delete_batch(self, start, stop):
+        # The delete API includes its stop time, which belongs to the next batch
+        stop = as_utc(stop) - timedelta(microseconds=1)
+        self.db.client.delete_api().delete(as_utc(start), stop, f'_measurement="{LEGACY_PRICES}"',
+                                           bucket=self.db.bucket, org=self.db.org)
+
+    def run(self, delete=False):
+        """
+        Copy everything from the watermark up to the newest v1 point.
+
+        Args:
+            delete (bool): Remove each batch from the v1 measurement after writing it.
+
+        Returns:
+            int: The number of points written.
+        """
+        span = self.legacy_range()
+        if span is None:
+            print(f"Nothing in {LEGACY_PRICES} to migrate")
+            return 0
+        start = max(self.db.read_watermark(WATERMARK) or span[0], span[0])
+        stop = span[1] + timedelta(seconds=1)
+
+        first = start
+        total = 0
+        while start < stop:
+            batch_stop = min(start + self.batch, stop)
+            points = self.read_batch(start, batch_stop)
+            if points and not self.db.write_points(points):
+                print(f"Stopped at {start:%Y-%m-%d}, run again to continue")
+                break
+            if delete:
+                self.delete_batch(start, batch_stop)
+            self.db.write_watermark(WATERMARK, batch_stop)
+            total += len(points)
+            print(f"{start:%Y-%m-%d} - {batch_stop:%Y-%m-%d}: {len(points)} points")
+            start = batch_stop
+
+        if total:
+            # The rollups may already be past the migrated days
+            reset = RollupJob(self.db).reset(first)
+            if reset:
+                print(f"Reset the {' and '.join(reset)} rollup, run rollups.py to add the migrated days")
+        return total
+
+
+if __name__ == "__main__":
+    db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket="elpris")
+    try:
+        total = Migration(db).run(delete="--delete" in sys.argv)
+        print(f"{total} points migrated to {ACTUAL_PRICES}")
+    finally:
+        db.exit()
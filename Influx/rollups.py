@@ -0,0 +1,183 @@
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from influxdb_client import Point, WritePrecision
+from influx import Influx, flux_time, as_utc, ACTUAL_PRICES, DAILY_PRICES, PRICE_PROFILE, ROLLUP_STATE, EPOCH
+
+# Incremental rollups of the actual prices, run after each import (e.g. from cron):
+#
+#   price_daily    min/mean/max/count per area and day. Computed in InfluxDB and written
+#                  back with to(); each run recomputes the days from the watermark on, so a
+#                  day that was only partly there last time is completed.
+#   price_profile  mean price per area, weekday and hour over all history. Kept as a sum and
+#                  a count per weekday and hour, and the days since the watermark are added.
+#                  Only finished days are added, so nothing is counted twice, and the
+#                  watermark stops after the last day with prices, so late prices still count.
+#
+# Prices written before a watermark (migrate.py) are picked up with RollupJob.reset: the daily
+# watermark moves back and the profile is rebuilt from scratch, since its sums can't be undone.
+#
+# The watermarks are stored in the bucket (rollup_state), where Influx.read_price_summary
+# finds them when it decides whether the rollup can answer a query.
+
+load_dotenv()
+
+EARLIEST = datetime(2020, 1, 1, tzinfo=timezone.utc)  # Where the first run starts
+PROFILE_WEEK = datetime(1970, 1, 5, tzinfo=timezone.utc)  # A Monday; profile points are stored in this week
+
+
+def start_of_day(value):
+    return as_utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupJob:
+    def __init__(self, db):
+        self.db = db
+
+    def _query(self, query):
+        return self.db.client.query_api().query(query, org=self.db.org)
+
+    def _prices(self, start, stop):
+        """Flux for the raw prices in [start, stop)."""
+        return f"""from(bucket: "{self.db.bucket}")
+            |> range(start: {flux_time(start)}, stop: {flux_time(stop)})
+            |> filter(fn: (r) => r._measurement == "{ACTUAL_PRICES}" and r._field == "price")
+            |> keep(columns: ["_time", "_value", "area"])"""
+
+    def last_price_time(self, start):
+        query = self._prices(start, "2100-01-01T00:00:00Z") + """
+            |> group()
+            |> last()"""
+        for table in self._query(query):
+            for record in table.records:
+                return record.get_time()
+        return None
+
+    def update_daily(self):
+        """
+        Recompute the daily rollup from the watermark day up to the newest price.
+
+        Returns:
+            datetime: The new watermark, or None if there were no prices.
+        """
+        start = self.db.read_watermark("daily") or EARLIEST
+        last = self.last_price_time(start)
+        if last is None:
+            return None
+        stop = start_of_day(last) + timedelta(days=1)
+
+        query = f"""data = {self._prices(start, stop)}
+            |> group(columns: ["area"])
+
+        day = (fn, name) => data
+            |> aggregateWindow(every: 1d, fn: fn, timeSrc: "_start", createEmpty: false)
+            |> toFloat()
+            |> set(key: "_field", value: name)
+
+        union(tables: [day(fn: min, name: "min"), day(fn: mean, name: "mean"), day(fn: max, name: "max"), day(fn: count, name: "count")])
+            |> set(key: "_measurement", value: "{DAILY_PRICES}")
+            |> to(bucket: "{self.db.bucket}", org: "{self.db.org}", tagColumns: ["area"])"""
+        self._query(query)
+
+        # The newest day may still get prices, so it is recomputed next time
+        watermark = start_of_day(last)
+        self.db.write_watermark("daily", watermark)
+        return watermark
+
+    def update_profile(self, today=None):
+        """
+        Add the finished days since the watermark to the weekday x hour profile.
+
+        Returns:
+            datetime: The new watermark, or None if there was nothing to add.
+        """
+        start = self.db.read_watermark("profile") or EARLIEST
+        stop = start_of_day(today or datetime.now())
+        last = self.last_price_time(start) if start < stop else None
+        if last is None:
+            return None
+        # Days after the last price aren't added yet, their prices may still come
+        stop = min(stop, start_of_day(last) + timedelta(days=1))
+
+        query = f"""import "date"
+        {self._prices(start, stop)}
+            |> map(fn: (r) => ({{r with weekday: string(v: date.weekDay(t: r._time)), hour: string(v: date.hour(t: r._time))}}))
+            |> group(columns: ["area", "weekday", "hour"])
+            |> reduce(identity: {{sum: 0.0, count: 0}}, fn: (r, accumulator) => ({{sum: accumulator.sum + r._value, count: accumulator.count + 1}}))"""
+        new = {}
+        for table in self._query(query):
+            for record in table.records:
+                # Flux counts weekdays from Sunday = 0, Python from Monday = 0
+                key = (record.values["area"], (int(record.values["weekday"]) - 1) % 7, int(record.values["hour"]))
+                new[key] = (record.values["sum"], record.values["count"])
+
+        # The watermark goes in the same request as the sums, so they are never written
+        # without it and the same days can't be added twice
+        points = [self.db.watermark_point("profile", stop)]
+        if new:
+            existing = self.read_profile_sums()
+            for (area, weekday, hour), (total, count) in new.items():
+                old_total, old_count = existing.get((area, weekday, hour), (0.0, 0))
+                total, count = old_total + total, old_count + count
+                points.append(
+                    Point(PRICE_PROFILE)
+                    .tag("area", area)
+                    .tag("weekday", str(weekday))
+                    .tag("hour", str(hour))
+                    .field("sum", float(total))
+                    .field("count", int(count))
+                    .field("mean", total / count)
+                    .time(PROFILE_WEEK + timedelta(days=weekday, hours=hour), WritePrecision.S)
+                )
+
+        if not self.db.write_points(points):
+            return None  # Keep the old watermark, the days are added next time
+        return stop
+
+    def reset(self, since):
+        """
+        Make the rollups include prices from `since` on that were written after they ran.
+
+        Returns:
+            list: The rollups that were reset.
+        """
+        since = start_of_day(since)
+        reset = []
+        daily = self.db.read_watermark("daily")
+        if daily is not None and since < daily:
+            self.db.write_watermark("daily", since)
+            reset.append("daily")
+
+        profile = self.db.read_watermark("profile")
+        if profile is not None and since < profile:
+            delete = self.db.client.delete_api().delete
+            stop = datetime.now(timezone.utc) + timedelta(days=1)
+            delete(EPOCH, stop, f'_measurement="{PRICE_PROFILE}"', bucket=self.db.bucket, org=self.db.org)
+            delete(EPOCH, stop, f'_measurement="{ROLLUP_STATE}" AND rollup="profile"', bucket=self.db.bucket, org=self.db.org)
+            reset.append("profile")
+        return reset
+
+    def read_profile_sums(self):
+        query = f"""from(bucket: "{self.db.bucket}")
+            |> range(start: 0)
+            |> filter(fn: (r) => r._measurement == "{PRICE_PROFILE}" and (r._field == "sum" or r._field == "count"))
+            |> pivot(rowKey: ["_time", "area", "weekday", "hour"], columnKey: ["_field"], valueColumn: "_value")"""
+        sums = {}
+        for table in self._query(query):
+            for record in table.records:
+                key = (record.values["area"], int(record.values["weekday"]), int(record.values["hour"]))
+                sums[key] = (record.values["sum"], record.values["count"])
+        return sums
+
+    def run(self):
+        daily = self.update_daily()
+        profile = self.update_profile()
+        print(f"Daily rollup up to {daily}, profile up to {profile}")
+
+
+if __name__ == "__main__":
+    db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket="elpris")
+    try:
+        RollupJob(db).run()
+    finally:
+        db.exit()
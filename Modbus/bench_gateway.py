@@ -0,0 +1,79 @@
+import asyncio
+import statistics
+import time
+from datetime import datetime
+from modbus import TcpClient
+from simulator import Bus
+from gateway import Gateway, Unit, MODE_REGISTER, MODE_AUTO, READ_START, READ_COUNT
+
+# Benchmark of the Modbus gateway against simulated RS-485 buses behind TCP gateways
+BUSES = 4
+UNITS_PER_BUS = 8
+BAUDRATE = 19200
+CYCLES = 6
+BASE_PORT = 5100
+
+
+def flip_schedule(unit, now):
+    # Every cycle switches every unit, the worst case for the buses
+    return [now.minute % 2 == 0] * 24
+
+
+async def batching(client, unit_id=1, repeats=5):
+    """One read of the whole block against one read per register."""
+    block, single = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await client.read_registers(unit_id, READ_START, READ_COUNT)
+        block.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for address in range(READ_START, READ_START + READ_COUNT):
+            await client.read_registers(unit_id, address, 1)
+        single.append(time.perf_counter() - start)
+    print(f"Reading {READ_COUNT} registers at {BAUDRATE} baud: one request {statistics.median(block) * 1000:.0f} ms, "
+          f"one per register {statistics.median(single) * 1000:.0f} ms")
+
+
+async def main():
+    buses = [Bus(range(1, UNITS_PER_BUS + 1), BAUDRATE) for _ in range(BUSES)]
+    servers = [await bus.start(port=BASE_PORT + i) for i, bus in enumerate(buses)]
+
+    clients = [TcpClient("127.0.0.1", BASE_PORT + i) for i in range(BUSES)]
+    units = [Unit(f"bus{b}-unit{u}", clients[b], u) for b in range(BUSES) for u in range(1, UNITS_PER_BUS + 1)]
+    gateway = Gateway(units, schedule=flip_schedule)
+
+    await batching(clients[0])
+
+    # Alternate the minute, so the schedule flips and every unit is switched each cycle
+    base = datetime.now().replace(second=0, microsecond=0)
+    gateway.reset_stats()
+    for cycle in range(CYCLES):
+        await gateway.cycle(base.replace(minute=cycle % 2))
+
+    stats = gateway.stats()
+    print(f"{len(units)} units on {BUSES} buses, {CYCLES} cycles that switch every unit")
+    print(f"Cycle: median {stats['cycle_p50'] * 1000:.0f} ms, max {stats['cycle_max'] * 1000:.0f} ms")
+    print(f"Switch latency: median {stats['switch_latency_p50'] * 1000:.0f} ms, p99 {stats['switch_latency_p99'] * 1000:.0f} ms")
+    print(f"Requests: {stats['requests']}, errors {stats['errors']}, p99 {stats['request_p99'] * 1000:.1f} ms")
+    print(f"Busiest bus in use {stats['bus_utilisation'] * 100:.0f} % of the time (back to back cycles)")
+
+    # One cycle with nothing to change: reads only
+    start = time.perf_counter()
+    await gateway.cycle(base.replace(minute=(CYCLES - 1) % 2))
+    print(f"Cycle without switches: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    wrong = sum(bus.registers[u][MODE_REGISTER] != (MODE_AUTO if (CYCLES - 1) % 2 == 0 else 0)
+                for bus in buses for u in bus.registers)
+    print(f"Units in the wrong mode afterwards: {wrong}")
+
+    for client in clients:
+        await client.close()
+    await asyncio.sleep(0.1)  # Let the simulator see the connections close
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
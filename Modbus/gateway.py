@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from modbus import ModbusError, TcpClient, RtuClient
+
+# The schedules come from the same cache as the ESP32s get theirs from
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Esp'))
+from schedule_server import ScheduleCache
+from scheduler import unpack_plan
+
+# Gateway between the price schedules and heat pumps on Modbus.
+#
+# Every poll cycle reads one block of registers per unit (the mode register and the ones
+# around it), works out which registers have to change for the current slot, and writes
+# only those, consecutive registers in one request. Units on different buses are polled
+# at the same time; units on the same bus take turns. A cycle also starts at every slot
+# boundary, so a unit switches within one cycle of the time in its schedule. The switching
+# latency is measured from the start of the cycle to the confirmed write.
+
+MODE_REGISTER = 367  # "368" in the heat pump's manual, the addresses here count from 0
+MODE_OFF = 0
+MODE_AUTO = 3
+READ_START = 360     # The block read every cycle; it must include MODE_REGISTER
+READ_COUNT = 16
+POLL_INTERVAL = 60   # Seconds between cycles when no slot boundary comes first
+MAX_UTILISATION = 0.5  # Warn when a bus is busier than this; a cycle could then overrun a slot
+UNITS_FILE = "units.json"
+
+
+class Unit:
+    def __init__(self, name, client, unit_id=1, area="west", hours=6, slots=24, min_run=1, min_off=1):
+        self.name = name
+        self.client = client
+        self.unit_id = unit_id
+        self.area = area
+        self.hours = hours
+        self.slots = slots
+        self.min_run = min_run
+        self.min_off = min_off
+        self.registers = {}  # Address -> value from the last read
+        self.errors = 0
+
+
+def load_units(path=UNITS_FILE):
+    """
+    Read the units from a JSON list. Units with the same host/port or serial port share a bus.
+
+    Example entry:
+        {"name": "hus-1", "host": "192.168.1.20", "port": 502, "unit": 1, "area": "west", "hours": 6}
+        {"name": "hus-2", "serial": "/dev/ttyUSB0", "baudrate": 9600, "unit": 2, "hours": 8}
+    """
+    with open(path, "r") as f:
+        entries = json.load(f)
+
+    clients = {}
+    units = []
+    for entry in entries:
+        if "serial" in entry:
+            key = ("rtu", entry["serial"])
+            if key not in clients:
+                clients[key] = RtuClient(entry["serial"], entry.get("baudrate", 9600))
+        else:
+            key = ("tcp", entry["host"], entry.get("port", 502))
+            if key not in clients:
+                clients[key] = TcpClient(entry["host"], entry.get("port", 502))
+        units.append(Unit(
+            entry["name"], clients[key], entry.get("unit", 1), entry.get("area", "west"),
+            entry.get("hours", 6), entry.get("slots", 24), entry.get("min_run", 1), entry.get("min_off", 1),
+        ))
+    return units
+
+
+class ScheduleSource:
+    """Plans from the schedule server's cache, decoded to a list of True/False per slot."""
+
+    def __init__(self, cache=None):
+        self.cache = cache or ScheduleCache()
+        self.decoded = {}  # etag -> plan
+
+    def __call__(self, unit, now):
+        etag, body = self.cache.get(unit.area, unit.hours, unit.slots, unit.min_run, unit.min_off,
+                                    now.strftime("%Y-%m-%d"))
+        if etag not in self.decoded:
+            slots = body[4]
+            self.decoded[etag] = unpack_plan(body[5:], slots)
+        return self.decoded[etag]
+
+
+class Gateway:
+    def __init__(self, units, schedule=None, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            units (list): Unit objects.
+            schedule (callable): schedule(unit, now) -> list of True/False per slot of the day.
+            poll_interval (int): Seconds between cycles.
+        """
+        self.units = units
+        self.schedule = schedule or ScheduleSource()
+        self.poll_interval = poll_interval
+        self.buses = list({id(unit.client): unit.client for unit in units}.values())
+
+        self.cycles = deque(maxlen=1000)            # Seconds per cycle
+        self.switch_latencies = deque(maxlen=1000)  # Seconds from cycle start to confirmed switch
+        self.switches = 0
+        self.started = time.perf_counter()
+
+    def wanted_registers(self, unit, now):
+        """The register values the unit should have right now: {address: value}."""
+        plan = self.schedule(unit, now)
+        slot = (now.hour * 60 + now.minute) * unit.slots // (24 * 60)
+        return {MODE_REGISTER: MODE_AUTO if plan[slot] else MODE_OFF}
+
+    def all_wanted_registers(self, now):
+        """wanted_registers for every unit, None for units without a schedule."""
+        wanted = []
+        for unit in self.units:
+            try:
+                wanted.append(self.wanted_registers(unit, now))
+            except (LookupError, ValueError) as e:
+                # No prices or no possible plan: leave the unit as it is
+                print(f"{unit.name}: no schedule ({e})")
+                wanted.append(None)
+        return wanted
+
+    async def poll_unit(self, unit, wanted, started):
+        values = await unit.client.read_registers(unit.unit_id, READ_START, READ_COUNT)
+        unit.registers = dict(zip(range(READ_START, READ_START + READ_COUNT), values))
+        if wanted is None:
+            return 0
+
+        changes = {address: value for address, value in wanted.items() if unit.registers.get(address) != value}
+        if not changes:
+            return 0
+
+        await unit.client.write_registers(unit.unit_id, changes)
+        unit.registers.update(changes)
+        if MODE_REGISTER in changes:
+            self.switches += 1
+            self.switch_latencies.append(time.perf_counter() - started)
+        return len(changes)
+
+    async def poll_bus(self, units, started):
+        # The bus client serialises the requests anyway; one unit at a time keeps the order fair
+        results = []
+        for unit, wanted in units:
+            try:
+                results.append(await self.poll_unit(unit, wanted, started))
+            except ModbusError as e:
+                unit.errors += 1
+                print(f"{unit.name}: {e}")
+                results.append(None)
+        return results
+
+    async def cycle(self, now=None):
+        """
+        Poll every unit once, the buses at the same time.
+
+        Returns:
+            int: The number of registers written.
+        """
+        now = now or datetime.now()
+        start = time.perf_counter()
+
+        # The schedules may have to be fetched, which blocks, so that happens in a thread
+        wanted = await asyncio.to_thread(self.all_wanted_registers, now)
+
+        by_bus = {}
+        for unit, registers in zip(self.units, wanted):
+            by_bus.setdefault(id(unit.client), []).append((unit, registers))
+        results = await asyncio.gather(*(self.poll_bus(units, start) for units in by_bus.values()))
+        self.cycles.append(time.perf_counter() - start)
+        return sum(written or 0 for bus in results for written in bus)
+
+    def next_wakeup(self, now):
+        """Seconds until the next cycle: the poll interval or the next slot boundary."""
+        wakeup = now + timedelta(seconds=self.poll_interval)
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for slots in {unit.slots for unit in self.units}:
+            minutes = 24 * 60 // slots
+            slot = (now.hour * 60 + now.minute) // minutes
+            wakeup = min(wakeup, midnight + timedelta(minutes=(slot + 1) * minutes))
+        return max((wakeup - now).total_seconds(), 0.1)
+
+    def reset_stats(self):
+        self.cycles.clear()
+        self.switch_latencies.clear()
+        self.switches = 0
+        self.started = time.perf_counter()
+        for bus in self.buses:
+            bus.busy = 0.0
+            bus.requests = bus.errors = 0
+            bus.latencies.clear()
+
+    def stats(self):
+        """Cycle time, switching latency and bus utilisation since the gateway started."""
+        elapsed = time.perf_counter() - self.started
+
+        def percentile(values, p):
+            values = sorted(values)
+            return values[min(int(len(values) * p), len(values) - 1)] if values else None
+
+        return {
+            "cycle_p50": percentile(self.cycles, 0.5),
+            "cycle_max": max(self.cycles, default=None),
+            "switches": self.switches,
+            "switch_latency_p50": percentile(self.switch_latencies, 0.5),
+            "switch_latency_p99": percentile(self.switch_latencies, 0.99),
+            "requests": sum(bus.requests for bus in self.buses),
+            "errors": sum(bus.errors for bus in self.buses),
+            "request_p99": percentile([t for bus in self.buses for t in bus.latencies], 0.99),
+            "bus_utilisation": max((bus.busy / elapsed for bus in self.buses), default=0),
+        }
+
+    async def run(self):
+        while True:
+            written = await self.cycle()
+            stats = self.stats()
+            print(f"Cycle: {len(self.units)} units in {self.cycles[-1] * 1000:.0f} ms, {written} registers written, "
+                  f"busiest bus {stats['bus_utilisation'] * 100:.1f} % in use")
+            if stats['bus_utilisation'] > MAX_UTILISATION:
+                print("Warning: a bus is too busy, move some units to another bus or poll less often")
+            await asyncio.sleep(self.next_wakeup(datetime.now()))
+
+
+if __name__ == "__main__":
+    gateway = Gateway(load_units(sys.argv[1] if len(sys.argv) > 1 else UNITS_FILE))
+    try:
+        asyncio.run(gateway.run())
+    except KeyboardInterrupt:
+        print(gateway.stats())
@@ -0,0 +1,258 @@
+import asyncio
+import struct
+import time
+from collections import deque
+
+try:
+    import serial  # pyserial, only needed for Modbus RTU
+except ImportError:
+    serial = None
+
+# Modbus function codes used by the gateway
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+MAX_READ = 125   # Registers per read request (protocol limit)
+MAX_WRITE = 123  # Registers per write request (protocol limit)
+
+EXCEPTIONS = {
+    1: "Illegal Function",
+    2: "Illegal Data Address",
+    3: "Illegal Data Value",
+    4: "Slave Device Failure",
+    6: "Slave Device Busy",
+    10: "Gateway Path Unavailable",
+    11: "Gateway Target Device Failed To Respond",
+}
+
+
+class ModbusError(Exception):
+    """A request failed: an exception response from the unit, a timeout or a broken frame."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+def crc16(data):
+    """Modbus RTU CRC, sent low byte first."""
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def rtu_frame(unit, pdu):
+    frame = bytes([unit]) + pdu
+    return frame + struct.pack("<H", crc16(frame))
+
+
+def read_request(address, count, function=READ_HOLDING_REGISTERS):
+    if not 1 <= count <= MAX_READ:
+        raise ValueError(f"Can read 1-{MAX_READ} registers at a time, not {count}")
+    return struct.pack(">BHH", function, address, count)
+
+
+def write_request(address, values):
+    """Write one register with function 6, or several in a row with function 16."""
+    if len(values) == 1:
+        return struct.pack(">BHH", WRITE_SINGLE_REGISTER, address, values[0])
+    if not 1 <= len(values) <= MAX_WRITE:
+        raise ValueError(f"Can write 1-{MAX_WRITE} registers at a time, not {len(values)}")
+    return struct.pack(f">BHHB{len(values)}H", WRITE_MULTIPLE_REGISTERS, address, len(values), 2 * len(values), *values)
+
+
+def parse_response(request, response):
+    """
+    Check a response PDU against its request.
+
+    Returns:
+        list: The register values for a read, None for a write.
+    """
+    function = request[0]
+    if not response:
+        raise ModbusError("Empty response")
+    if response[0] == function | 0x80:
+        code = response[1] if len(response) > 1 else None
+        raise ModbusError(f"Modbus exception {code}: {EXCEPTIONS.get(code, 'Unknown')}", code)
+    if response[0] != function:
+        raise ModbusError(f"Response to function {response[0]} for a request with function {function}")
+
+    if function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+        count = struct.unpack(">H", request[3:5])[0]
+        if len(response) != 2 + 2 * count or response[1] != 2 * count:
+            raise ModbusError("Wrong number of registers in response")
+        return list(struct.unpack(f">{count}H", response[2:]))
+
+    if response[:5] != request[:5]:
+        raise ModbusError("Write response doesn't match the request")
+    return None
+
+
+def runs(registers):
+    """Group {address: value} into runs of consecutive addresses: [(start, [values])]."""
+    groups = []
+    for address in sorted(registers):
+        if groups and address == groups[-1][0] + len(groups[-1][1]) and len(groups[-1][1]) < MAX_WRITE:
+            groups[-1][1].append(registers[address])
+        else:
+            groups.append((address, [registers[address]]))
+    return groups
+
+
+class ModbusClient:
+    """
+    Common part of the TCP and RTU clients.
+
+    A client is one bus: requests are sent one at a time, so units behind the same TCP
+    gateway or on the same RS-485 line never talk over each other. Time spent on requests
+    is counted, so the bus utilisation can be worked out.
+    """
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self.lock = asyncio.Lock()
+        self.busy = 0.0                     # Seconds spent on requests
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1000)  # Seconds per request, the newest ones
+
+    async def request(self, unit, pdu):
+        async with self.lock:
+            start = time.perf_counter()
+            try:
+                response = await self._exchange(unit, pdu)
+                return parse_response(pdu, response)
+            except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError) as e:
+                self.errors += 1
+                await self.close()  # The next request starts from a clean connection
+                raise ModbusError(f"Unit {unit}: {type(e).__name__} {e}") from e
+            except ModbusError:
+                self.errors += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self.busy += elapsed
+                self.requests += 1
+                self.latencies.append(elapsed)
+
+    async def _exchange(self, unit, pdu):
+        """Send one request and return its answer, or raise asyncio.TimeoutError after self.timeout."""
+        return await asyncio.wait_for(self._transfer(unit, pdu), self.timeout)
+
+    async def read_registers(self, unit, address, count, function=READ_HOLDING_REGISTERS):
+        """Read `count` registers from `address`, split in requests of at most MAX_READ."""
+        values = []
+        for start in range(address, address + count, MAX_READ):
+            values += await self.request(unit, read_request(start, min(MAX_READ, address + count - start), function))
+        return values
+
+    async def write_registers(self, unit, registers):
+        """
+        Write {address: value}, one request per run of consecutive addresses.
+
+        Returns:
+            int: The number of requests sent.
+        """
+        groups = runs(registers)
+        for address, values in groups:
+            await self.request(unit, write_request(address, values))
+        return len(groups)
+
+    async def close(self):
+        pass
+
+
+class TcpClient(ModbusClient):
+    """Modbus TCP, e.g. a heat pump with a network port or an RTU-to-TCP gateway."""
+
+    def __init__(self, host, port=502, timeout=1.0):
+        super().__init__(timeout)
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.transaction = 0
+
+    async def _transfer(self, unit, pdu):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        self.transaction = (self.transaction + 1) & 0xFFFF
+        self.writer.write(struct.pack(">HHHB", self.transaction, 0, len(pdu) + 1, unit) + pdu)
+        await self.writer.drain()
+
+        while True:
+            transaction, protocol, length, _ = struct.unpack(">HHHB", await self.reader.readexactly(7))
+            response = await self.reader.readexactly(length - 1)
+            if transaction == self.transaction:
+                return response
+            # A late answer to a request that timed out before, skip it
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class RtuClient(ModbusClient):
+    """Modbus RTU over a serial RS-485 adapter (needs pyserial)."""
+
+    def __init__(self, port, baudrate=9600, timeout=1.0):
+        if serial is None:
+            raise ImportError("Modbus RTU needs pyserial: pip install pyserial")
+        super().__init__(timeout)
+        self.serial = serial.Serial(port, baudrate, bytesize=8, parity="N", stopbits=1, timeout=timeout)
+        # At least 3.5 characters of silence between frames, 11 bits per character
+        self.gap = max(3.5 * 11 / baudrate, 0.00175)
+
+    async def _exchange(self, unit, pdu):
+        # No wait_for here: cancelling it would leave the thread reading the port while the
+        # next request writes to it. The serial timeouts end the transfer instead.
+        return await asyncio.to_thread(self._transfer_blocking, unit, pdu)
+
+    def _transfer_blocking(self, unit, pdu):
+        deadline = time.monotonic() + self.timeout
+        self.serial.timeout = self.timeout
+        self.serial.reset_input_buffer()
+        self.serial.write(rtu_frame(unit, pdu))
+        self.serial.flush()
+
+        # The length of the answer follows from its first bytes
+        head = self.serial.read(3)
+        if len(head) < 3:
+            raise asyncio.TimeoutError("No answer")
+        if head[1] & 0x80:
+            rest = 2
+        elif head[1] in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            rest = head[2] + 2
+        else:
+            rest = 5
+        # Both reads together stay within the request timeout
+        self.serial.timeout = max(deadline - time.monotonic(), 0)
+        frame = head + self.serial.read(rest)
+        time.sleep(self.gap)
+
+        if len(frame) < 3 + rest or crc16(frame[:-2]) != struct.unpack("<H", frame[-2:])[0]:
+            raise ModbusError("Broken frame (CRC)")
+        if frame[0] != unit:
+            raise ModbusError(f"Answer from unit {frame[0]}, expected {unit}")
+        return frame[1:-2]
+
+    async def close(self):
+        self.serial.reset_input_buffer()
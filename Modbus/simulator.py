@@ -0,0 +1,112 @@
+import asyncio
+import struct
+import sys
+from modbus import (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS, WRITE_SINGLE_REGISTER,
+                    WRITE_MULTIPLE_REGISTERS, MAX_READ, MAX_WRITE, rtu_frame)
+
+# Local Modbus TCP slave for testing the gateway without heat pumps.
+#
+# One simulator is one bus: it answers for several unit ids, one request at a time. With
+# a baudrate it also waits as long as the request and answer would take on an RS-485 line,
+# like a TCP-to-RTU gateway in front of the heat pumps.
+
+PORT = 5020
+REGISTERS = 1000  # Registers per unit, from address 0
+
+
+class Bus:
+    def __init__(self, units, baudrate=None, registers=REGISTERS):
+        """
+        Args:
+            units (iterable): Unit ids that answer.
+            baudrate (int): Emulated RS-485 speed, None to answer right away.
+            registers (int): Number of holding registers per unit.
+        """
+        self.registers = {unit: [0] * registers for unit in units}
+        self.baudrate = baudrate
+        self.lock = asyncio.Lock()
+        self.requests = 0
+        self.writes = {}  # (unit, address) -> number of times the register was written
+
+    def handle(self, unit, pdu):
+        """Answer one request PDU, with an exception response when it can't be done."""
+        registers = self.registers.get(unit)
+        function = pdu[0]
+        if registers is None:
+            return bytes([function | 0x80, 11])  # Gateway target device failed to respond
+
+        try:
+            if function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+                address, count = struct.unpack(">HH", pdu[1:5])
+                if not 1 <= count <= MAX_READ:
+                    return bytes([function | 0x80, 3])
+                if address + count > len(registers):
+                    return bytes([function | 0x80, 2])
+                return struct.pack(f">BB{count}H", function, 2 * count, *registers[address:address + count])
+
+            if function == WRITE_SINGLE_REGISTER:
+                address, value = struct.unpack(">HH", pdu[1:5])
+                self._write(unit, registers, address, [value])
+                return pdu[:5]
+
+            if function == WRITE_MULTIPLE_REGISTERS:
+                address, count, size = struct.unpack(">HHB", pdu[1:6])
+                if not 1 <= count <= MAX_WRITE or size != 2 * count:
+                    return bytes([function | 0x80, 3])
+                self._write(unit, registers, address, struct.unpack(f">{count}H", pdu[6:6 + size]))
+                return pdu[:5]
+        except IndexError:
+            return bytes([function | 0x80, 2])
+        except struct.error:
+            return bytes([function | 0x80, 3])
+
+        return bytes([function | 0x80, 1])  # Illegal function
+
+    def _write(self, unit, registers, address, values):
+        if address + len(values) > len(registers):
+            raise IndexError(address)
+        registers[address:address + len(values)] = values
+        for offset in range(len(values)):
+            key = (unit, address + offset)
+            self.writes[key] = self.writes.get(key, 0) + 1
+
+    def line_time(self, unit, request, response):
+        """Seconds the request and answer take on the emulated RS-485 line, with 3.5 character gaps."""
+        if not self.baudrate:
+            return 0
+        characters = len(rtu_frame(unit, request)) + len(rtu_frame(unit, response)) + 7
+        return characters * 11 / self.baudrate
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                transaction, protocol, length, unit = struct.unpack(">HHHB", header)
+                pdu = await reader.readexactly(length - 1)
+
+                async with self.lock:
+                    response = self.handle(unit, pdu)
+                    self.requests += 1
+                    await asyncio.sleep(self.line_time(unit, pdu, response))
+
+                writer.write(struct.pack(">HHHB", transaction, 0, len(response) + 1, unit) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=PORT):
+        return await asyncio.start_server(self.serve_client, host, port)
+
+
+async def main(port=PORT, units=range(1, 11), baudrate=9600):
+    bus = Bus(units, baudrate)
+    server = await bus.start("0.0.0.0", port)
+    print(f"Simulating units {units.start}-{units.stop - 1} at {baudrate} baud on port {port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else PORT))
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from influxdb_client import Point, WritePrecision
+from pipeline import Pipeline, Stage
+
+# The stages use the scripts in the other folders
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ('Influx', 'Prediction', 'Esp'):
+    sys.path.append(os.path.join(ROOT, folder))
+from influx import Influx
+from data_til_esp import fetch_prices, area_prices
+from metrics import metrics
+import schedule_server
+
+# The daily pipeline in one process, instead of running Influx/main.py, Prediction/ml_data.py,
+# Prediction/prediction.py and Esp/data_til_esp.py by hand:
+#
+#   prices ──> ingest ──> rollups
+#          └─> schedules            (served to the ESP32s by the schedule server in this process)
+#   weather ─> predict ──> monitor
+#
+# From PUBLISH_TIME it polls Energi Fyn every POLL_INTERVAL until tomorrow's prices are out,
+# then waits for the next day. Each stage only runs when its inputs changed, so a poll that
+# finds the same prices does nothing else. weather runs once a day for yesterday, whose
+# observations are complete by then.
+#
+# predict doesn't feed the schedules. The model needs observed weather, so it predicts
+# yesterday and is only scored against the actual prices (monitor). The ESP32 plans are
+# made from tomorrow's published prices. Before those are out, Esp/horizon.py falls back to
+# the price profile. With --once, schedules only checks that tomorrow's plans can be made;
+# the warmed cache goes away with the process, and the schedule server plans on demand.
+#
+# --date runs the pipeline as if today was that date (the clock keeps running from there),
+# so a run recorded with Pipeline/replay.py can be replayed on any later day.
+#
+#   python daemon.py [--once] [--date 2024-05-01]
+
+load_dotenv()
+
+PUBLISH_TIME = (12, 45)   # Day-ahead prices are published around 12:45-13:00
+POLL_INTERVAL = 10 * 60   # Seconds between polls while waiting for them
+TIMINGS = "pipeline_stage"  # Measurement for the stage timings
+
+
+def day_string(day):
+    return day.strftime("%Y-%m-%d")
+
+
+def next_wakeup(now, have_tomorrow, publish_time=PUBLISH_TIME, poll_interval=POLL_INTERVAL):
+    """When to run the pipeline again."""
+    publish = now.replace(hour=publish_time[0], minute=publish_time[1], second=0, microsecond=0)
+    if now < publish:
+        return publish
+    if have_tomorrow:
+        return publish + timedelta(days=1)
+    return now + timedelta(seconds=poll_interval)
+
+
+def dataset_day(filename, day):
+    """The 24 rows of a day from the dataset file, or None if the day isn't (completely) in it."""
+    from features import load_dataset
+    if not os.path.exists(filename):
+        return None
+    df = load_dataset(filename)
+    df = df[(df['timestamp'] >= day) & (df['timestamp'] < day + timedelta(days=1))]
+    if len(df) < 24:
+        return None
+    df = df.astype(object).where(df.notna(), None)  # NaN back to None, like the collected rows
+    df['timestamp'] = [time.isoformat() for time in df['timestamp']]
+    return df.to_dict('records')
+
+
+class DailyPipeline:
+    def __init__(self, db=None, cache=schedule_server.cache, today=None):
+        """
+        Args:
+            db (Influx): Where to store prices, weather and timings, None to skip.
+            cache (ScheduleCache): The schedule server's cache, warmed with tomorrow's plans.
+            today (datetime): Run as if today was this day, default the real today.
+        """
+        self.db = db
+        self.cache = cache
+        self.offset = timedelta(0)
+        if today is not None:
+            self.offset = today.replace(hour=0, minute=0, second=0, microsecond=0) - datetime.now().replace(
+                hour=0, minute=0, second=0, microsecond=0)
+        self.pipeline = Pipeline([
+            Stage("prices", self.prices),
+            Stage("ingest", self.ingest, deps=("prices",)),
+            Stage("rollups", self.rollups, deps=("ingest",)),
+            Stage("schedules", self.schedules, deps=("prices",)),
+            Stage("weather", self.weather, key=lambda: day_string(self.now())),
+            Stage("predict", self.predict, deps=("weather",)),
+            Stage("monitor", self.monitor, deps=("predict",)),
+        ])
+
+    def now(self):
+        """The current time, moved to the day given with --date."""
+        return datetime.now() + self.offset
+
+    def prices(self):
+        """Tomorrow's prices, or None until they are published."""
+        tomorrow = self.now() + timedelta(days=1)
+        response = fetch_prices(tomorrow)
+        if not area_prices("west", response) or not area_prices("east", response):
+            return None
+        return {"day": day_string(tomorrow), "response": response}
+
+    def ingest(self, prices):
+        if self.db is None:
+            print("influxToken is not set, prices are not stored.")
+            return None
+        if not self.db.write_prices(prices["response"]):
+            raise RuntimeError("Could not write the prices")
+        return prices["day"]
+
+    def rollups(self, day):
+        from rollups import RollupJob
+        job = RollupJob(self.db)
+        return {"daily": str(job.update_daily()), "profile": str(job.update_profile(self.now()))}
+
+    def schedules(self, prices):
+        """Plan tomorrow for the common settings, so the devices get them from the cache (kept while the daemon runs)."""
+        self.cache.set_prices(prices["day"], prices["response"])
+        etags = self.cache.warm(day=prices["day"])
+        return {f"{area}/{hours}/{slots}": etag for (area, hours, slots), etag in etags.items()}
+
+    def weather(self):
+        """
+        Yesterday's weather and prices, appended to the dataset (and InfluxDB).
+
+        The stage signatures only live in memory, so after a restart (or with --once) the day
+        may already be in the dataset; then its rows are read back instead of fetched again.
+        """
+        import ml_data
+        from features import DATA_FILE, append_rows
+        yesterday = (self.now() - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = dataset_day(DATA_FILE, yesterday)
+        if rows is not None:
+            print(f"{yesterday:%Y-%m-%d} is already in {DATA_FILE}")
+            return rows
+
+        rows = ml_data.collect_day(yesterday)
+        if rows is None:
+            return None
+        append_rows(rows, DATA_FILE)
+        if self.db is not None:
+            self.db.write_weather(rows)
+        return rows
+
+    def predict(self, rows):
+        """Predict the weather stage's day from its rows, without fetching them again."""
+        import prediction
+        predicted = prediction.main(datetime.fromisoformat(rows[0]["timestamp"]), rows, export_metrics=False)
+        return [list(map(float, hour)) for hour in predicted]
+
+    def monitor(self, predicted):
+        if self.db is None:
+            return None
+        import monitor
+        monitor.main()
+        return True
+
+    def have_tomorrow(self):
+        output = self.pipeline.stages["prices"].output
+        return output is not None and output["day"] == day_string(self.now() + timedelta(days=1))
+
+    def report(self, statuses):
+        for row in self.pipeline.timings():
+            print(f"{row['stage']:<10} {statuses[row['stage']]:<8} {row['seconds'] * 1000:8.0f} ms"
+                  f"  (runs {row['runs']}, skips {row['skips']}, failures {row['failures']})")
+        if self.db is not None:
+            now = datetime.now()
+            self.db.write_points([
+                Point(TIMINGS)
+                .tag("stage", row["stage"])
+                .tag("status", statuses[row["stage"]])
+                .field("seconds", float(row["seconds"]))
+                .field("runs", row["runs"])
+                .field("skips", row["skips"])
+                .field("failures", row["failures"])
+                .time(now, WritePrecision.S)
+                for row in self.pipeline.timings()
+            ])
+
+        # The timers and counters of this run (collection, prediction); export starts a new run
+        metrics.export(self.db, os.getenv('PROMETHEUS_FILE'))
+
+    async def run_once(self):
+        print(f"Running the pipeline at {self.now():%Y-%m-%d %H:%M}")
+        statuses = await self.pipeline.run()
+        self.report(statuses)
+        return statuses
+
+    async def run_forever(self):
+        while True:
+            await self.run_once()
+            wakeup = next_wakeup(self.now(), self.have_tomorrow())
+            print(f"Next run at {wakeup:%Y-%m-%d %H:%M}")
+            await asyncio.sleep(max(0.0, (wakeup - self.now()).total_seconds()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the daily price, schedule and prediction pipeline.")
+    parser.add_argument('--once', action='store_true', help="Run the pipeline once and exit")
+    parser.add_argument('--date', type=datetime.fromisoformat, help="Run as if today was this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    # The prediction scripts keep their files (dataset, models, state) next to them
+    os.chdir(os.path.join(ROOT, 'Prediction'))
+    metrics.job = "daemon"
+
+    token = os.getenv('influxToken')
+    db = Influx(url="http://localhost:8086", org="ucl", token=token, bucket="elpris") if token else None
+    daily = DailyPipeline(db, today=args.date)
+    try:
+        if args.once:
+            asyncio.run(daily.run_once())
+        else:
+            server = schedule_server.serve()
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            asyncio.run(daily.run_forever())
+    except KeyboardInterrupt:
+        print("Stopped.")
+    finally:
+        if db is not None:
+            db.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime
+
+# Statuses of a stage after a run
+RAN = "ran"
+SKIPPED = "skipped"  # Same inputs as the last successful run, its output was reused
+WAITING = "waiting"  # An input has no data yet (a stage before it returned None)
+FAILED = "failed"
+BLOCKED = "blocked"  # A stage before it failed
+
+
+def fingerprint(value):
+    """A short hash of a stage output, used to tell whether it changed."""
+    try:
+        text = json.dumps(value, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        text = repr(value)
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), key=None):
+        """
+        Args:
+            name (str): Name of the stage, used in deps and in the timings.
+            fn (callable): Called with the outputs of deps, in order. Plain functions run in
+                a worker thread, coroutine functions on the loop. Returning None means there
+                is nothing new yet, and the stages after it wait.
+            deps (tuple): Names of the stages whose outputs it needs.
+            key (callable): Extra input, e.g. the date for a stage that runs once a day.
+                A stage without deps and key runs every time.
+        """
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.key = key
+
+        self.signature = None  # Inputs of the last successful run
+        self.output = None
+        self.fingerprint = None
+        self.status = None
+        self.seconds = 0.0     # Duration of the last run that wasn't skipped
+        self.runs = 0
+        self.skips = 0
+        self.failures = 0
+        self.finished = None
+
+    def needs_run(self, signature):
+        return signature is None or signature != self.signature
+
+
+class Pipeline:
+    """
+    Stages run as a dependency graph: each starts as soon as the stages it depends on are
+    done, so independent stages run at the same time. A stage is skipped when its inputs
+    (the fingerprints of the outputs it depends on, and its key) are the same as last time.
+    """
+
+    def __init__(self, stages):
+        self.stages = {}
+        for stage in stages:
+            unknown = [dep for dep in stage.deps if dep not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on {unknown}, which must be added before it")
+            self.stages[stage.name] = stage
+
+    async def _run_stage(self, stage, done):
+        results = [await done[dep] for dep in stage.deps]
+        if any(status in (FAILED, BLOCKED) for status in results):
+            stage.status = BLOCKED
+            return BLOCKED
+        if any(self.stages[dep].output is None for dep in stage.deps):
+            stage.status = WAITING
+            return WAITING
+
+        key = stage.key() if stage.key else None
+        if stage.deps or stage.key:
+            signature = tuple(self.stages[dep].fingerprint for dep in stage.deps) + (key,)
+        else:
+            signature = None
+        if not stage.needs_run(signature):
+            stage.status = SKIPPED
+            stage.skips += 1
+            return SKIPPED
+
+        inputs = [self.stages[dep].output for dep in stage.deps]
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(stage.fn):
+                output = await stage.fn(*inputs)
+            else:
+                output = await asyncio.to_thread(stage.fn, *inputs)
+        except Exception as e:
+            print(f"Stage {stage.name} failed: {type(e).__name__}: {e}")
+            stage.status = FAILED
+            stage.failures += 1
+            return FAILED
+        finally:
+            stage.seconds = time.perf_counter() - start
+            stage.finished = datetime.now()
+
+        stage.output = output
+        stage.fingerprint = fingerprint(output)
+        # Nothing yet is tried again next time, even with the same inputs
+        stage.signature = signature if output is not None else None
+        stage.status = RAN
+        stage.runs += 1
+        return RAN
+
+    async def run(self):
+        """
+        Run every stage that has new inputs.
+
+        Returns:
+            dict: Stage name -> status of this run.
+        """
+        done = {}
+        for stage in self.stages.values():
+            # Stages are added after their deps, so the tasks they wait for already exist
+            done[stage.name] = asyncio.ensure_future(self._run_stage(stage, done))
+        statuses = await asyncio.gather(*done.values())
+        return dict(zip(done, statuses))
+
+    def timings(self):
+        """Per-stage status and timings of the last run, for printing or writing to InfluxDB."""
+        return [{
+            "stage": stage.name,
+            "status": stage.status,
+            "seconds": stage.seconds,
+            "runs": stage.runs,
+            "skips": stage.skips,
+            "failures": stage.failures,
+            "finished": stage.finished,
+        } for stage in self.stages.values()]
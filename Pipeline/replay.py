@@ -0,0 +1,233 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import random
+import runpy
+import sys
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Record and replay of the HTTP calls to Energi Fyn and DMI, so the scripts can run without
+# network access and give the same answers every time.
+#
+# Every requests call (requests.get, sessions, and DMIOpenDataClient, which uses requests.get)
+# ends in HTTPAdapter.send, which is replaced while a Transport is installed:
+#
+#   record  sends the request and saves the response in the fixture store
+#   replay  answers from the store, optionally after a delay or with an injected error
+#
+# The store is a folder with one gzipped JSON file per request (method, URL without the API
+# key, body). A request that was made more than once keeps every response in order, so a
+# replayed poll sees the prices appear like it did when it was recorded.
+#
+# The URLs contain the dates asked for, so a recording only replays for the same dates. Give
+# the scripts an explicit date: prediction.py takes the day to predict, and daemon.py --date
+# runs the pipeline as if it was that day. A script that works from "today" (daemon.py
+# without --date, prediction.py without a day) only replays on the day it was recorded and
+# raises NotRecorded on any later day. ml_data.py starts from its last_date.json, which it
+# moves on, so put back the file from the recording before replaying it. Likewise daemon.py
+# reads a day that is already in ml_data.json back from the file instead of fetching it.
+#
+#   python replay.py record ../Prediction/prediction.py 2024-05-01
+#   python replay.py replay --latency 0.05 --error-rate 0.1 ../Prediction/prediction.py 2024-05-01
+#   python replay.py record daemon.py --once --date 2024-05-01
+#   python replay.py replay daemon.py --once --date 2024-05-01
+
+STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SECRET_PARAMS = {"api-key", "apikey", "token"}  # Left out of the stored URLs and the keys
+KEPT_HEADERS = ("Content-Type", "Content-Encoding", "ETag")
+
+
+class NotRecorded(requests.exceptions.ConnectionError):
+    """Replay got a request that isn't in the store."""
+
+
+def clean_url(url):
+    """The URL with the query sorted and without API keys."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def request_key(request):
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode()
+    text = f"{request.method} {clean_url(request.url)} ".encode() + body
+    return hashlib.sha1(text).hexdigest()
+
+
+class Transport:
+    def __init__(self, mode, store=STORE, latency=0.0, error_rate=0.0, seed=0, recorded_latency=False):
+        """
+        Args:
+            mode (str): "record" or "replay".
+            store (str): Folder with the fixtures.
+            latency (float): Seconds added to every replayed request.
+            error_rate (float): Share of replayed requests that fail with a ConnectionError.
+            seed (int): Seed for the injected errors, so a replay fails the same requests each time.
+            recorded_latency (bool): Also wait as long as the request took when it was recorded.
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Mode must be record or replay, not {mode}")
+        self.mode = mode
+        self.store = store
+        self.latency = latency
+        self.error_rate = error_rate
+        self.recorded_latency = recorded_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}   # Key -> number of times it has been requested
+        self.recorded = {}  # Key -> responses recorded in this session
+        self.requests = 0
+        self.errors = 0
+        self._send = None
+
+    def _path(self, key):
+        return os.path.join(self.store, key + ".json.gz")
+
+    def _load(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save(self, key, fixture):
+        os.makedirs(self.store, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(fixture, f)
+        os.replace(tmp, self._path(key))
+
+    def _next(self, key):
+        with self.lock:
+            index = self.calls.get(key, 0)
+            self.calls[key] = index + 1
+            self.requests += 1
+            return index
+
+    def record(self, adapter, request, **kwargs):
+        response = self._send(adapter, request, **kwargs)
+        key = request_key(request)
+        self._next(key)
+        entry = {
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            "body": base64.b64encode(response.content).decode(),
+            "elapsed": response.elapsed.total_seconds(),
+        }
+        with self.lock:
+            # A new recording replaces the old one for this request
+            if key not in self.recorded:
+                self.recorded[key] = {"method": request.method, "url": clean_url(request.url), "responses": []}
+            self.recorded[key]["responses"].append(entry)
+            self._save(key, self.recorded[key])
+        return response
+
+    def replay(self, adapter, request, **kwargs):
+        key = request_key(request)
+        index = self._next(key)
+        fixture = self._load(key)
+        if fixture is None:
+            raise NotRecorded(f"No recording of {request.method} {clean_url(request.url)}", request=request)
+
+        # The last response is repeated when a request is made more often than when recorded
+        entry = fixture["responses"][min(index, len(fixture["responses"]) - 1)]
+        with self.lock:
+            fail = self.random.random() < self.error_rate
+        delay = self.latency + (entry["elapsed"] if self.recorded_latency else 0.0)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self.lock:
+                self.errors += 1
+            raise requests.exceptions.ConnectionError(f"Injected error for {clean_url(request.url)}", request=request)
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = base64.b64decode(entry["body"])
+        response.encoding = get_encoding_from_headers(response.headers) or "utf-8"
+        response.elapsed = timedelta(seconds=delay)
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+    def install(self):
+        if self._send is not None:
+            return self
+        self._send = HTTPAdapter.send
+        handler = self.record if self.mode == "record" else self.replay
+
+        def send(adapter, request, **kwargs):
+            return handler(adapter, request, **kwargs)
+
+        HTTPAdapter.send = send
+        return self
+
+    def uninstall(self):
+        if self._send is not None:
+            HTTPAdapter.send = self._send
+            self._send = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+
+def recording(store=STORE):
+    return Transport("record", store)
+
+
+def replaying(store=STORE, latency=0.0, error_rate=0.0, seed=0, recorded_latency=False):
+    return Transport("replay", store, latency, error_rate, seed, recorded_latency)
+
+
+def run_script(path, args):
+    """Run a script as if it was started with python, from its own folder."""
+    path = os.path.abspath(path)
+    sys.argv = [path] + list(args)
+    sys.path.insert(0, os.path.dirname(path))
+    os.chdir(os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a script with its HTTP calls recorded or replayed.")
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    parser.add_argument("--store", default=STORE, help="Fixture folder")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each replayed request")
+    parser.add_argument("--recorded-latency", action="store_true", help="Replay with the recorded response times")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of replayed requests that fail")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the injected errors")
+    args = parser.parse_args()
+
+    transport = Transport(args.mode, os.path.abspath(args.store), args.latency, args.error_rate, args.seed, args.recorded_latency)
+    start = time.perf_counter()
+    with transport:
+        try:
+            run_script(args.script, args.args)
+        finally:
+            print(f"{args.mode}: {transport.requests} requests, {transport.errors} injected errors, "
+                  f"{time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import pandas as pd
+from model_registry import ModelRegistry
+from features import DATA_FILE, build_features, load_dataset
+
+AREAS = ['west', 'east']
+
+
+def error_metrics(results, keys):
+    """
+    Summarise the prediction errors per group.
+
+    Args:
+        results (DataFrame): Rows with an 'error' column (predicted - actual).
+        keys (list): The columns to group by.
+
+    Returns:
+        DataFrame: rmse, mae, bias and count per group.
+    """
+    errors = pd.DataFrame({
+        'squared': results['error'] ** 2,
+        'absolute': results['error'].abs(),
+        'error': results['error'],
+    })
+    grouped = errors.groupby([results[key] for key in keys])
+    means = grouped.mean()
+    return pd.DataFrame({
+        'rmse': means['squared'] ** 0.5,
+        'mae': means['absolute'],
+        'bias': means['error'],
+        'count': grouped.size(),
+    })
+
+
+def backtest(df, bundle, start=None, end=None):
+    """
+    Predict every hour in a date range with a single predict call and compare with actual prices.
+
+    Args:
+        df (DataFrame): The dataset from load_dataset.
+        bundle (ModelBundle): The model to test.
+        start (str): First day to include (inclusive), e.g. '2024-01-01'.
+        end (str): Last day to include (inclusive).
+
+    Returns:
+        DataFrame: One row per hour and area with the predicted and actual price and the error.
+    """
+    # The rows before the range are only used as history for the lagged features
+    history = None
+    if start is not None:
+        history = df[df['timestamp'] < pd.Timestamp(start)]
+        df = df[df['timestamp'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['timestamp'] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+
+    features = build_features(df, bundle.feature_schema, history)
+
+    # Rows without features or prices can't be predicted or scored
+    complete = features.notna().all(axis=1) & df[['west_price', 'east_price']].notna().all(axis=1)
+    df, features = df[complete], features[complete]
+    if df.empty:
+        raise ValueError("No complete rows in the selected date range")
+
+    predicted = bundle.predict(features)
+
+    results = []
+    for column, area in enumerate(AREAS):
+        results.append(pd.DataFrame({
+            'timestamp': df['timestamp'].to_numpy(),
+            'area': area,
+            'predicted': predicted[:, column],
+            'actual': df[f'{area}_price'].to_numpy(),
+        }))
+    results = pd.concat(results, ignore_index=True)
+    results['error'] = results['predicted'] - results['actual']
+    results['day'] = results['timestamp'].dt.date
+    results['hour'] = results['timestamp'].dt.hour
+    return results
+
+
+def report(results):
+    """
+    Calculate error metrics per area, per day and per hour of the day.
+
+    Returns:
+        dict: DataFrames keyed by 'area', 'day' and 'hour'.
+    """
+    return {
+        'area': error_metrics(results, ['area']),
+        'day': error_metrics(results, ['day', 'area']).unstack('area'),
+        'hour': error_metrics(results, ['hour', 'area']).unstack('area'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the price model on the local dataset.")
+    parser.add_argument('start', nargs='?', help="First day, YYYY-MM-DD (default: start of dataset)")
+    parser.add_argument('end', nargs='?', help="Last day, YYYY-MM-DD (default: end of dataset)")
+    parser.add_argument('--data', default=DATA_FILE, help="Dataset file (default: ml_data.json)")
+    parser.add_argument('--version', help="Model version from the registry (default: current)")
+    parser.add_argument('--csv', help="Write the per-hour results to this CSV file")
+    args = parser.parse_args()
+
+    bundle = ModelRegistry().load(args.version)
+    print("Backtesting model version:", bundle.version)
+
+    results = backtest(load_dataset(args.data), bundle, args.start, args.end)
+    tables = report(results)
+
+    print(f"\nPer area ({results['day'].nunique()} days):")
+    print(tables['area'].round(3).to_string())
+    print("\nPer hour of day:")
+    print(tables['hour'].round(3).to_string())
+    print("\nPer day:")
+    print(tables['day'].round(3).to_string())
+
+    if args.csv:
+        results.to_csv(args.csv, index=False)
+        print("Results written to", args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from features import append_rows
+
+# The Influx class lives in the Influx folder next to this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Influx'))
+from influx import Influx, WEATHER_FIELDS
+
+load_dotenv()
+
+# Export of the prices and weather in InfluxDB to the training dataset format, so the
+# model is trained on the same data as production uses instead of a separate copy.
+EXPORT_FILE = 'influx_data.json'
+STATE_FILE = 'export_state.json'
+EARLIEST = datetime(2020, 1, 1)
+CHUNK_DAYS = 7
+SETTLE_DAYS = 3  # Hours older than this are exported even if a field is missing, it won't come any more
+FIELDS = WEATHER_FIELDS + ('west_price', 'east_price')
+HOUR = timedelta(hours=1)
+
+
+def load_watermark(state_file=STATE_FILE):
+    """Returns the time the last export got to, or None if nothing has been exported."""
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, 'r') as f:
+        return datetime.fromisoformat(json.load(f)['watermark'])
+
+
+def save_watermark(watermark, state_file=STATE_FILE):
+    # Write a temporary file first, so an interrupted export never leaves a broken state file
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump({'watermark': watermark.isoformat()}, f)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def first_gap(rows, start):
+    """
+    The first hour from `start` on that has no complete row: a row missing a field, or no row.
+
+    Args:
+        rows (list): Hourly rows from Influx.stream_training_rows, sorted by time.
+        start (datetime): The hour the rows start at.
+
+    Returns:
+        datetime: The first incomplete hour, or the hour after the last row if all are complete.
+    """
+    expected = start
+    for row in rows:
+        time = datetime.fromisoformat(row['timestamp'])
+        if time > expected or any(row[name] is None for name in FIELDS):
+            return expected
+        expected = time + HOUR
+    return expected
+
+
+def export(db, filename=EXPORT_FILE, state_file=STATE_FILE, stop=None, chunk_days=CHUNK_DAYS, site="odense",
+           settle_days=SETTLE_DAYS):
+    """
+    Append the hours since the watermark to the dataset file, one chunk at a time.
+
+    Each chunk is streamed from InfluxDB and appended before the watermark moves, so only
+    one chunk is in memory and an interrupted export continues from the last whole chunk.
+    If it stops between the append and saving the watermark, that chunk is appended again
+    next time; load_dataset drops the duplicate timestamps.
+
+    ml_data.py writes prices and weather at different times, so in the last settle_days the
+    watermark only moves up to the first hour that doesn't have every field yet; that hour
+    and the ones after it are exported by a later run. Older hours are exported as they are.
+
+    Args:
+        db (Influx): The database to read from.
+        filename (str): The dataset file to append to.
+        state_file (str): Where the watermark is kept.
+        stop (datetime): Export up to here, default the start of the current hour.
+        chunk_days (int): Days per query.
+        site (str): The weather site.
+        settle_days (int): How long to wait for missing fields.
+
+    Returns:
+        int: The number of rows appended.
+    """
+    start = load_watermark(state_file) or EARLIEST
+    stop = stop or datetime.now().replace(minute=0, second=0, microsecond=0)
+    settled = stop - timedelta(days=settle_days)
+    chunk = timedelta(days=chunk_days)
+
+    total = 0
+    while start < stop:
+        chunk_stop = min(start + chunk, stop)
+        rows = list(db.stream_training_rows(start, chunk_stop, site))
+        watermark = chunk_stop
+        if chunk_stop > settled:
+            # Stop at the first incomplete hour, unless it is old enough to be final
+            watermark = min(max(first_gap(rows, start), settled), chunk_stop)
+            rows = [row for row in rows if datetime.fromisoformat(row['timestamp']) < watermark]
+
+        total += append_rows(rows, filename)
+        save_watermark(watermark, state_file)
+        print(f"Exported {start:%Y-%m-%d %H:%M} - {watermark:%Y-%m-%d %H:%M}: {len(rows)} rows")
+        if watermark < chunk_stop:
+            break  # The rest is exported once it is complete
+        start = chunk_stop
+    return total
+
+
+def export_from_env(filename=EXPORT_FILE, state_file=STATE_FILE):
+    """Export with the connection settings the other scripts use."""
+    db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket="elpris")
+    try:
+        return export(db, filename, state_file)
+    finally:
+        db.exit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export prices and weather from InfluxDB to the training dataset format.")
+    parser.add_argument('--file', default=EXPORT_FILE, help="Dataset file to append to")
+    parser.add_argument('--state', default=STATE_FILE, help="File with the export watermark")
+    args = parser.parse_args()
+
+    total = export_from_env(args.file, args.state)
+    print(f"{total} rows appended to {args.file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import os
+import json
+import pandas as pd
+
+# Local dataset collected by ml_data.py
+DATA_FILE = 'ml_data.json'
+
+# Features read straight from the dataset or the timestamp
+BASE_FEATURES = ['cloud_cover', 'temperature', 'wind_speed', 'hour', 'day_of_week', 'month']
+
+# The feature schema is saved with the model in the registry, so inference builds exactly
+# the same columns as training did.
+#   lags:    column -> list of lags in hours
+#   rolling: column -> list of [window in hours, lag in hours]
+# Prices are only known up to the day before, so price features are lagged at least 24 hours.
+DEFAULT_SCHEMA = {
+    'base': BASE_FEATURES,
+    'lags': {
+        'west_price': [24, 168],
+        'east_price': [24, 168],
+    },
+    'rolling': {
+        'west_price': [[24, 24]],
+        'east_price': [[24, 24]],
+        'temperature': [[24, 0]],
+    },
+}
+
+
+def load_dataset(filename=DATA_FILE):
+    """
+    Load the collected dataset, using a cached DataFrame when the JSON file hasn't changed.
+
+    Args:
+        filename (str): The JSON file written by ml_data.py.
+
+    Returns:
+        DataFrame: The dataset sorted by timestamp, with parsed timestamps.
+    """
+    cache_file = os.path.splitext(filename)[0] + '.cache.pkl'
+    if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(filename):
+        return pd.read_pickle(cache_file)
+
+    df = pd.read_json(filename, convert_dates=False)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.drop_duplicates('timestamp').sort_values('timestamp').reset_index(drop=True)
+    df.to_pickle(cache_file)
+    return df
+
+
+def append_rows(rows, filename=DATA_FILE):
+    """
+    Append rows to the JSON list in a dataset file without reading the file.
+
+    The closing bracket is overwritten with the new rows, so the cost only depends on the
+    number of new rows. The file is created if it doesn't exist.
+
+    Args:
+        rows (list): Dicts in the dataset format (as written by ml_data.py).
+        filename (str): The dataset file.
+
+    Returns:
+        int: The number of rows appended.
+    """
+    if not rows:
+        return 0
+    text = ",\n".join(json.dumps(row) for row in rows)
+
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        with open(filename, 'w') as f:
+            f.write("[\n" + text + "\n]")
+        return len(rows)
+
+    with open(filename, 'r+b') as f:
+        # Find the closing bracket near the end, and whether the list before it is empty
+        f.seek(max(os.path.getsize(filename) - 4096, 0))
+        offset = f.tell()
+        tail = f.read()
+        end = tail.rfind(b']')
+        if end < 0:
+            raise ValueError(f"{filename} is not a JSON list")
+        empty = tail[:end].rstrip().endswith(b'[')
+
+        f.seek(offset + end)
+        f.write(((("\n" if empty else ",\n") + text + "\n]").encode()))
+        f.truncate()
+    return len(rows)
+
+
+def feature_columns(schema=DEFAULT_SCHEMA):
+    """
+    Get the names of all feature columns in a schema, in the order the model expects them.
+
+    Args:
+        schema (dict): A feature schema like DEFAULT_SCHEMA.
+
+    Returns:
+        list: The feature column names.
+    """
+    columns = list(schema.get('base', BASE_FEATURES))
+    for column, lags in schema.get('lags', {}).items():
+        columns.extend(f'{column}_lag{lag}' for lag in lags)
+    for column, windows in schema.get('rolling', {}).items():
+        for window, lag in windows:
+            columns.append(f'{column}_mean{window}' + (f'_lag{lag}' if lag else ''))
+    return columns
+
+
+def history_span(schema=DEFAULT_SCHEMA):
+    """Returns how many hours of history the lagged and rolling features need."""
+    spans = [0]
+    for lags in schema.get('lags', {}).values():
+        spans.extend(lags)
+    for windows in schema.get('rolling', {}).values():
+        spans.extend(window + lag for window, lag in windows)
+    return max(spans)
+
+
+def add_time_features(df):
+    """
+    Add hour, day_of_week and month columns derived from the 'timestamp' column.
+
+    Args:
+        df (DataFrame): Rows with a 'timestamp' column.
+
+    Returns:
+        DataFrame: A copy of df with the time features added.
+    """
+    df = df.copy()
+    timestamps = pd.to_datetime(df['timestamp'])
+    df['timestamp'] = timestamps
+    df['hour'] = timestamps.dt.hour
+    df['day_of_week'] = timestamps.dt.dayofweek
+    df['month'] = timestamps.dt.month
+    return df
+
+
+def _time_features(df, schema):
+    """Calculate the lagged and rolling columns of a schema for a DataFrame sorted by timestamp."""
+    indexed = df.set_index('timestamp')
+    features = {}
+
+    # Shift on the time index rather than by rows, so gaps in the data don't misalign the lags
+    for column, lags in schema.get('lags', {}).items():
+        series = indexed[column]
+        for lag in lags:
+            shifted = series.shift(freq=pd.Timedelta(hours=lag))
+            features[f'{column}_lag{lag}'] = shifted.reindex(indexed.index).to_numpy()
+
+    for column, windows in schema.get('rolling', {}).items():
+        series = indexed[column]
+        for window, lag in windows:
+            # A window with fewer than `window` hourly values (the start of the data or a gap) is NaN
+            rolled = series.rolling(pd.Timedelta(hours=window), min_periods=window).mean()
+            if lag:
+                rolled = rolled.shift(freq=pd.Timedelta(hours=lag)).reindex(indexed.index)
+            features[f'{column}_mean{window}' + (f'_lag{lag}' if lag else '')] = rolled.to_numpy()
+
+    return pd.DataFrame(features, index=df.index)
+
+
+class FeatureBuilder:
+    """
+    Builds features incrementally: only the rows that are appended are calculated.
+
+    The builder keeps the last history_span() hours of data, which is all the lagged and
+    rolling features need, so appending a day costs the same however long the history is.
+    """
+
+    def __init__(self, schema=DEFAULT_SCHEMA, history=None):
+        self.schema = schema
+        self.span = pd.Timedelta(hours=history_span(schema))
+        self.tail = None
+        if history is not None and len(history):
+            self._keep(add_time_features(history))
+
+    def _keep(self, df):
+        """Keep only the rows the next append can need."""
+        if self.span > pd.Timedelta(0):
+            df = df[df['timestamp'] > df['timestamp'].max() - self.span]
+        else:
+            df = df.iloc[0:0]
+        self.tail = df.reset_index(drop=True)
+
+    def append(self, df):
+        """
+        Calculate the features for new rows and remember them as history.
+
+        Args:
+            df (DataFrame): New rows with a 'timestamp' column and the raw data columns.
+
+        Returns:
+            DataFrame: The feature columns for the new rows, in schema order and with df's index.
+        """
+        new = add_time_features(df)
+        if self.tail is not None and len(self.tail):
+            # Drop history rows that are being replaced by the new rows
+            tail = self.tail[~self.tail['timestamp'].isin(new['timestamp'])]
+            combined = pd.concat([tail, new], ignore_index=True)
+        else:
+            combined = new.reset_index(drop=True)
+        combined = combined.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+        computed = pd.concat([combined, _time_features(combined, self.schema)], axis=1)
+        self._keep(combined)
+
+        # Pick out the new rows again and give them back the caller's index
+        result = computed.set_index('timestamp').loc[new['timestamp'], feature_columns(self.schema)]
+        result.index = df.index
+        return result
+
+
+def build_features(df, schema=DEFAULT_SCHEMA, history=None):
+    """
+    Build the feature matrix for all rows at once.
+
+    Args:
+        df (DataFrame): Rows with a 'timestamp' column and the weather and price columns.
+        schema (dict): The feature schema, normally the one stored with the model.
+        history (DataFrame): Earlier rows used for lagged and rolling features.
+
+    Returns:
+        DataFrame: The features in schema order, with df's index.
+    """
+    return FeatureBuilder(schema, history).append(df)
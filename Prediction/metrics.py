@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from influxdb_client import Point, WritePrecision
+
+# Timers, counters and histograms for the collection and prediction scripts, so a run shows
+# where its time goes (DMI station lists, observations, resampling, file and database writes).
+#
+#   from metrics import metrics
+#
+#   with metrics.timer("dmi_observations", parameter="temp_dry"):
+#       ...
+#   metrics.count("observations", len(observations))
+#
+# At the end of a run metrics.report() prints the totals, to_points() gives InfluxDB points
+# (measurement METRICS) and to_prometheus() the Prometheus text format, e.g. for the
+# node_exporter textfile collector.
+#
+# export() starts a new run afterwards, so in a long-running process (Pipeline/daemon.py)
+# each export to InfluxDB covers one run; the Prometheus counters keep counting up.
+
+METRICS = "pipeline_metrics"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds
+
+
+class Histogram:
+    """Count, sum, max and cumulative bucket counts of observed values."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def merge(self, other):
+        """Add the observations of another histogram with the same buckets."""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _prometheus_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}" if pairs else ""
+
+
+class Metrics:
+    def __init__(self, job=None):
+        """
+        Args:
+            job (str): Added as a tag/label to everything, e.g. "ml_data". Defaults to the script name.
+        """
+        self.job = job
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value, this run
+        self.histograms = {}  # (name, labels) -> Histogram, this run
+        self.total_counters = {}    # The earlier runs, for the cumulative Prometheus values
+        self.total_histograms = {}
+        self.started = datetime.now()
+
+    def count(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time a block into the histogram <name>_seconds; a block that raises also counts <name>_errors."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.count(name + "_errors", **labels)
+            raise
+        finally:
+            self.observe(name + "_seconds", time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator version of timer."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        """Start a new run: the current values are added to the totals and cleared."""
+        with self.lock:
+            for key, value in self.counters.items():
+                self.total_counters[key] = self.total_counters.get(key, 0) + value
+            for key, hist in self.histograms.items():
+                self.total_histograms.setdefault(key, Histogram(hist.buckets)).merge(hist)
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = datetime.now()
+
+    def _totals(self):
+        """Counters and histograms of every run so far, including the current one."""
+        counters = dict(self.total_counters)
+        for key, value in self.counters.items():
+            counters[key] = counters.get(key, 0) + value
+        histograms = {}
+        for source in (self.total_histograms, self.histograms):
+            for key, hist in source.items():
+                histograms.setdefault(key, Histogram(hist.buckets)).merge(hist)
+        return counters, histograms
+
+    def _job(self):
+        return self.job or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+    def report(self):
+        """The timers sorted by total time, then the counters, as text."""
+        with self.lock:
+            timers = sorted(self.histograms.items(), key=lambda item: -item[1].sum)
+            counters = sorted(self.counters.items())
+        lines = [f"{'timer':<48} {'count':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+        for (name, labels), hist in timers:
+            label = name + _prometheus_labels(labels)
+            lines.append(f"{label:<48} {hist.count:>7} {hist.sum:>9.2f} {hist.mean * 1000:>9.1f} {hist.max * 1000:>9.1f}")
+        for (name, labels), value in counters:
+            lines.append(f"{name + _prometheus_labels(labels):<48} {value:>7}")
+        return "\n".join(lines)
+
+    def to_points(self, timestamp=None):
+        """Returns the metrics of the current run as InfluxDB points, one per metric and label set."""
+        timestamp = timestamp or datetime.now()
+        points = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                point = Point(METRICS).tag("job", self._job()).tag("metric", name)
+                for key, label in labels:
+                    point = point.tag(key, label)
+                points.append(point.field("value", float(value)).time(timestamp, WritePrecision.NS))
+            for (name, labels), hist in sorted(self.histograms.items()):
+                point = Point(METRICS).tag("job", self._job()).tag("metric", name)
+                for key, label in labels:
+                    point = point.tag(key, label)
+                points.append(
+                    point.field("count", hist.count)
+                    .field("sum", hist.sum)
+                    .field("mean", hist.mean)
+                    .field("max", hist.max)
+                    .time(timestamp, WritePrecision.NS)
+                )
+        return points
+
+    def to_prometheus(self):
+        """Returns the metrics of all runs in the Prometheus text exposition format."""
+        job = ("job", self._job())
+        lines = []
+        with self.lock:
+            counters, histograms = self._totals()
+            for name in sorted({name for name, _ in counters}):
+                lines.append(f"# TYPE {name}_total counter")
+                for (other, labels), value in sorted(counters.items()):
+                    if other == name:
+                        lines.append(f"{name}_total{_prometheus_labels((job,) + labels)} {value}")
+            for name in sorted({name for name, _ in histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (other, labels), hist in sorted(histograms.items()):
+                    if other != name:
+                        continue
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{_prometheus_labels((job,) + labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_prometheus_labels((job,) + labels, [('le', '+Inf')])} {hist.count}")
+                    lines.append(f"{name}_sum{_prometheus_labels((job,) + labels)} {hist.sum}")
+                    lines.append(f"{name}_count{_prometheus_labels((job,) + labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, db=None, prometheus_file=None):
+        """
+        Print the report and write the metrics to InfluxDB and/or a Prometheus text file,
+        then start a new run (see reset).
+
+        Args:
+            db (Influx): Where to write the points, None to skip.
+            prometheus_file (str): File to write, None to skip (written whole, then renamed).
+        """
+        print(self.report())
+        points = self.to_points()
+        if db is not None and points:
+            db.write_points(points)
+        if prometheus_file:
+            tmp_file = prometheus_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_file, prometheus_file)
+        self.reset()
+
+
+# Shared by the modules of one script
+metrics = Metrics()
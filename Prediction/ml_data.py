@@ -6,6 +6,12 @@ from dotenv import load_dotenv
 import pandas as pd  # Import pandas for data manipulation
 from dmi_open_data import DMIOpenDataClient, Parameter
 import time
+import sys
+from metrics import metrics
+
+# The Influx class lives in the Influx folder next to this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Influx'))
+from influx import Influx
 
 # Load environment variables
 load_dotenv()
@@ -60,7 +66,8 @@ def get_stations(parameter_name):
     Returns:
         list: A list of stations that have the specified parameter.
     """
-    stations = client.get_stations(limit=500)
+    with metrics.timer("dmi_stations", parameter=parameter_name):
+        stations = client.get_stations(limit=500)
     stations_with_parameter = [
         station for station in stations 
         if parameter_name in station['properties'].get('parameterId', [])
@@ -90,15 +97,19 @@ def get_observations(parameter, station_id, from_time, to_time, limit=144):
     """
     Get weather observations for a specified parameter and station.
     """
-    observations = client.get_observations(
-        parameter=parameter,
-        station_id=station_id,
-        from_time=from_time,
-        to_time=to_time,
-        limit=limit
-    )
+    name = getattr(parameter, 'value', parameter)
+    with metrics.timer("dmi_observations", parameter=name):
+        observations = client.get_observations(
+            parameter=parameter,
+            station_id=station_id,
+            from_time=from_time,
+            to_time=to_time,
+            limit=limit
+        )
+    metrics.count("observations", len(observations), parameter=name)
     return observations
 
+@metrics.timed("resample")
 def average_hourly(observations, decimals=1):
     """
     Average observations over each hour to get 24 measurements.
@@ -218,13 +229,15 @@ def fetch_response_data(api_time, retries=3, delay=2):
     
     for attempt in range(retries):
         try:
-            response = requests.get(url)
+            with metrics.timer("energifyn_request"):
+                response = requests.get(url)
             if response.status_code == 200:
                 return response.json()  # Assuming the response is in JSON format
             else:
                 print(f"Attempt {attempt + 1} failed: {response.status_code}")
         except requests.exceptions.RequestException as e:
             print(f"Attempt {attempt + 1} failed with exception: {e}")
+        metrics.count("energifyn_retries")
 
         time.sleep(delay)
 
@@ -292,6 +305,7 @@ def combine_hourly_data(start_timex, cloud_cover_data, temperature_data, wind_sp
 
     return combined_data
 
+@metrics.timed("file_write")
 def save_to_json(data, filename):
     """
     Save data to a JSON file, appending to existing data if the file already exists.
@@ -317,38 +331,59 @@ def save_to_json(data, filename):
     with open(filename, 'w') as json_file:
         json.dump(existing_data, json_file, indent=4)
 
+def collect_day(day):
+    """
+    Collect the prices and the weather for one day.
+
+    Args:
+        day (datetime): The day to collect.
+
+    Returns:
+        list: 24 hourly rows in the dataset format, or None if some of the weather is missing.
+    """
+    global response_data  # Read by get_daily_prices
+    api_time, from_time, to_time = get_date_ranges(day)
+
+    # Fetch consumption and price data
+    response_data = fetch_response_data(api_time)
+
+    # Fetch weather data
+    cloud_cover_data = get_cloud_cover(from_time, to_time)
+    temperature_data = get_temperature(from_time, to_time)
+    wind_speed_data = get_wind_speed(from_time, to_time)
+
+    # If any of the weather data is missing, skip the day
+    if cloud_cover_data is None or temperature_data is None or wind_speed_data is None:
+        print(f"Skipping data collection for {day.date()} due to missing data.")
+        return None
+
+    # Fetch price data
+    west_prices, east_prices = get_daily_prices()
+
+    # Check for empty elements (can be omitted if we already skip missing data)
+    check_for_empty_elements(cloud_cover_data, temperature_data, wind_speed_data, west_prices, east_prices)
+
+    # Combine hourly data
+    return combine_hourly_data(day, cloud_cover_data, temperature_data, wind_speed_data, west_prices, east_prices)
+
 def main():
-    global response_data  # Declare it as global if you plan to modify it in other functions
     last_date = read_last_date()  # Read last date at the start
     start_date = last_date - timedelta(days=1)
     num_days = 100
+
+    # Also write the weather to InfluxDB when it's configured, so the model can be trained from there
+    db = None
+    if os.getenv('influxToken'):
+        db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket="elpris")
     
     for day in range(num_days):
-        combined_hourly_data = []
         current_date = start_date - timedelta(days=day)
-        api_time, from_time, to_time = get_date_ranges(current_date)
-
-        # Fetch consumption and price data
-        response_data = fetch_response_data(api_time)
-        
-        # Fetch weather data
-        cloud_cover_data = get_cloud_cover(from_time, to_time)
-        temperature_data = get_temperature(from_time, to_time)
-        wind_speed_data = get_wind_speed(from_time, to_time)
-
-        # If any of the weather data is missing, skip the day
-        if cloud_cover_data is None or temperature_data is None or wind_speed_data is None:
-            print(f"Skipping data collection for {current_date.date()} due to missing data.")
+        with metrics.timer("collect_day"):
+            combined_hourly_data = collect_day(current_date)
+        if combined_hourly_data is None:
+            metrics.count("days_skipped")
             continue  # Skip to the next day
-        
-        # Fetch price data
-        west_prices, east_prices = get_daily_prices()
-
-        # Check for empty elements (can be omitted if we already skip missing data)
-        check_for_empty_elements(cloud_cover_data, temperature_data, wind_speed_data, west_prices, east_prices)
-
-        # Combine hourly data
-        combined_hourly_data.extend(combine_hourly_data(current_date, cloud_cover_data, temperature_data, wind_speed_data, west_prices, east_prices))
+        metrics.count("days_collected")
         
         # Calculate and print the progress
         percentage_done = ((day + 1) / num_days) * 100
@@ -356,8 +391,15 @@ def main():
     
         # Save the combined data for the current day
         save_to_json(combined_hourly_data, 'ml_data.json')
+        if db is not None:
+            with metrics.timer("influx_write"):
+                db.write_weather(combined_hourly_data)
         save_last_date(current_date)  
     
+    # Where the time went, to InfluxDB and (if PROMETHEUS_FILE is set) for Prometheus
+    metrics.export(db, os.getenv('PROMETHEUS_FILE'))
+    if db is not None:
+        db.exit()
     print("Data saved to ml_data.json")
 
 if __name__ == "__main__":
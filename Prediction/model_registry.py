@@ -0,0 +1,242 @@
+import os
+import json
+import hashlib
+import shutil
+import threading
+from datetime import datetime
+import joblib
+
+# Default location of the registry (relative to the working directory, like the old .pkl files)
+REGISTRY_DIR = 'models'
+CURRENT_FILE = 'CURRENT'
+BUNDLE_FILE = 'bundle.pkl'
+METADATA_FILE = 'metadata.json'
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """
+    Calculate the sha256 checksum of a file.
+
+    Args:
+        path (str): Path to the file.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """A model and the scaler it was trained with, plus the metadata written next to them."""
+
+    def __init__(self, version, model, scaler, metadata):
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.metadata = metadata
+
+    @property
+    def features(self):
+        return self.metadata.get('features', [])
+
+    @property
+    def feature_schema(self):
+        # Models published before the schema was stored only use the plain columns
+        return self.metadata.get('feature_schema') or {'base': self.features}
+
+    def predict(self, features_df):
+        """
+        Scale the features and make a prediction with the bundled model.
+
+        Args:
+            features_df (DataFrame): Features, must contain the columns listed in the metadata.
+
+        Returns:
+            ndarray: The predicted prices (one column per output).
+        """
+        if self.features:
+            features_df = features_df[self.features]
+        return self.model.predict(self.scaler.transform(features_df))
+
+
+class ModelRegistry:
+    """
+    Stores versioned model/scaler bundles on disk and keeps a pointer to the current one.
+
+    Every version lives in its own directory (models/<version>/) with the pickled bundle
+    and a metadata.json containing the checksum, training window, metrics and feature list.
+    The version directory is written under a temporary name and renamed into place, and the
+    CURRENT pointer is swapped with os.replace, so a reader never sees a half-written model.
+    """
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._bundle = None
+        self._pointer_stamp = None
+
+    def _version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def _current_path(self):
+        return os.path.join(self.root, CURRENT_FILE)
+
+    def versions(self):
+        """Returns a sorted list of all published versions."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and os.path.isfile(os.path.join(self.root, name, METADATA_FILE))
+        )
+
+    def current_version(self):
+        """Returns the version the CURRENT pointer refers to, or None if nothing is published."""
+        try:
+            with open(self._current_path(), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, model, scaler, features, training_window=None, metrics=None, feature_schema=None, activate=True):
+        """
+        Save a model and its scaler as a new version.
+
+        Args:
+            model: The trained model.
+            scaler: The fitted scaler belonging to the model.
+            features (list): The feature columns in the order the model expects them.
+            training_window (tuple): (first timestamp, last timestamp) of the training data.
+            metrics (dict): Evaluation metrics, e.g. {'west_rmse': 0.31}.
+            feature_schema (dict): The schema used to build the features (see features.py).
+            activate (bool): Point CURRENT at the new version straight away.
+
+        Returns:
+            str: The new version.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        tmp_dir = os.path.join(self.root, '.tmp-' + version)
+        os.makedirs(tmp_dir)
+
+        try:
+            bundle_path = os.path.join(tmp_dir, BUNDLE_FILE)
+            joblib.dump({'model': model, 'scaler': scaler}, bundle_path)
+
+            metadata = {
+                'version': version,
+                'created': datetime.now().isoformat(),
+                'checksum': file_checksum(bundle_path),
+                'features': list(features),
+                'training_window': [str(t) for t in training_window] if training_window else None,
+                'metrics': metrics or {},
+                'feature_schema': feature_schema,
+            }
+            with open(os.path.join(tmp_dir, METADATA_FILE), 'w') as f:
+                json.dump(metadata, f, indent=4)
+
+            # Renaming the directory is atomic, so the version appears complete or not at all
+            os.replace(tmp_dir, self._version_dir(version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """
+        Point CURRENT at an already published version (also used to roll back).
+
+        Args:
+            version (str): The version to activate.
+        """
+        if not os.path.isfile(os.path.join(self._version_dir(version), METADATA_FILE)):
+            raise ValueError(f"Unknown model version: {version}")
+
+        tmp_path = self._current_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._current_path())
+
+    def load(self, version=None):
+        """
+        Load a bundle from disk and verify its checksum.
+
+        Args:
+            version (str): The version to load. Defaults to the current version.
+
+        Returns:
+            ModelBundle: The loaded bundle.
+        """
+        version = version or self.current_version()
+        if version is None:
+            raise FileNotFoundError(f"No model has been published to {self.root}")
+
+        version_dir = self._version_dir(version)
+        with open(os.path.join(version_dir, METADATA_FILE), 'r') as f:
+            metadata = json.load(f)
+
+        bundle_path = os.path.join(version_dir, BUNDLE_FILE)
+        if file_checksum(bundle_path) != metadata['checksum']:
+            raise ValueError(f"Checksum mismatch for model version {version}")
+
+        data = joblib.load(bundle_path)
+        return ModelBundle(version, data['model'], data['scaler'], metadata)
+
+    def get(self):
+        """
+        Returns the current bundle, reloading it only when the CURRENT pointer has changed.
+
+        Predictions that are already running keep their reference to the old bundle,
+        so swapping to a new version never blocks them.
+        """
+        try:
+            stat = os.stat(self._current_path())
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except FileNotFoundError:
+            stamp = None
+
+        if self._bundle is not None and stamp == self._pointer_stamp:
+            return self._bundle
+
+        with self._lock:
+            # Another thread may have done the reload while we waited for the lock
+            if self._bundle is None or stamp != self._pointer_stamp:
+                version = self.current_version()
+                if self._bundle is None or self._bundle.version != version:
+                    self._bundle = self.load(version)
+                self._pointer_stamp = stamp
+        return self._bundle
+
+
+if __name__ == "__main__":
+    import sys
+
+    registry = ModelRegistry()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+
+    if command == 'list':
+        current = registry.current_version()
+        for version in registry.versions():
+            marker = '*' if version == current else ' '
+            print(f"{marker} {version}")
+    elif command == 'activate':
+        registry.activate(sys.argv[2])
+        print("Activated:", sys.argv[2])
+    elif command == 'import':
+        # Import the old loose files: python model_registry.py import multi_output_model.pkl scaler.pkl
+        model = joblib.load(sys.argv[2])
+        scaler = joblib.load(sys.argv[3])
+        features = list(getattr(scaler, 'feature_names_in_', []))
+        print("Published:", registry.publish(model, scaler, features))
+    else:
+        print("Usage: python model_registry.py [list | activate <version> | import <model.pkl> <scaler.pkl>]")
@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+from collections import deque
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# The Influx class lives in the Influx folder next to this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Influx'))
+from influx import Influx
+from influxdb_client import Point, WritePrecision
+
+load_dotenv()
+
+STATE_FILE = 'monitor_state.json'
+ERROR_MEASUREMENT = 'prediction_error'
+
+# Default drift thresholds (kr/kWh), checked on the rolling window per area and hour
+DEFAULT_THRESHOLDS = {'rmse': 0.5, 'mae': 0.4, 'bias': 0.25}
+
+
+class RollingErrorStats:
+    """
+    RMSE, MAE and bias over the last `window` errors.
+
+    The sums are updated when an error is added and when the oldest one drops out of the
+    window, so each update is O(1) however large the window is.
+    """
+
+    def __init__(self, window=30):
+        self.window = window
+        self.errors = deque()
+        self.sum = 0.0
+        self.sum_squared = 0.0
+        self.sum_absolute = 0.0
+        self.total_count = 0  # All errors ever added, not just those in the window
+
+    def add(self, error):
+        self.errors.append(error)
+        self.sum += error
+        self.sum_squared += error * error
+        self.sum_absolute += abs(error)
+        self.total_count += 1
+
+        if len(self.errors) > self.window:
+            old = self.errors.popleft()
+            self.sum -= old
+            self.sum_squared -= old * old
+            self.sum_absolute -= abs(old)
+
+    @property
+    def count(self):
+        return len(self.errors)
+
+    @property
+    def bias(self):
+        return self.sum / self.count if self.count else 0.0
+
+    @property
+    def mae(self):
+        return self.sum_absolute / self.count if self.count else 0.0
+
+    @property
+    def rmse(self):
+        # max() guards against tiny negative values from floating point subtraction
+        return (max(self.sum_squared, 0.0) / self.count) ** 0.5 if self.count else 0.0
+
+    def to_dict(self):
+        return {'window': self.window, 'errors': list(self.errors), 'total_count': self.total_count}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['window'])
+        for error in data['errors']:
+            stats.add(error)
+        stats.total_count = data['total_count']
+        return stats
+
+
+class DriftMonitor:
+    """
+    Keeps rolling error statistics per area and hour of the day and flags drift.
+
+    Feed it each predicted/actual pair as the actual prices arrive; a window of 30 means
+    the statistics for an hour cover the last 30 days.
+    """
+
+    def __init__(self, window=30, thresholds=None, min_count=7):
+        self.window = window
+        self.thresholds = thresholds or dict(DEFAULT_THRESHOLDS)
+        self.min_count = min_count  # Don't flag drift before there is enough data
+        self.stats = {}
+        self.last_time = None
+
+    def update(self, timestamp, area, predicted, actual):
+        """
+        Add one predicted/actual pair.
+
+        Args:
+            timestamp (datetime): The hour the price is for.
+            area (str): 'west' or 'east'.
+            predicted (float): The predicted price.
+            actual (float): The actual price.
+
+        Returns:
+            list: Alerts (dicts) for the thresholds this area and hour now exceed.
+        """
+        key = (area, timestamp.hour)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = RollingErrorStats(self.window)
+        stats.add(predicted - actual)
+
+        if self.last_time is None or timestamp > self.last_time:
+            self.last_time = timestamp
+        return self.check(key)
+
+    def update_rows(self, rows):
+        """
+        Add rows like those returned by Influx.read_predicted_vs_actual.
+
+        Rows where the prediction or the actual price is missing are skipped.
+
+        Returns:
+            list: All alerts raised while adding the rows.
+        """
+        # Compare with the watermark from before this batch, since update() moves it forward
+        # and the other area's row for the same hour would then look already counted
+        last_time = self.last_time
+        alerts = []
+        for row in rows:
+            if row['predicted'] is None or row['actual'] is None:
+                continue
+            if last_time is not None and row['time'] <= last_time:
+                continue  # Already counted in an earlier run
+            alerts.extend(self.update(row['time'], row['area'], row['predicted'], row['actual']))
+        return alerts
+
+    def check(self, key):
+        """Returns the alerts for one (area, hour) key."""
+        stats = self.stats[key]
+        if stats.count < self.min_count:
+            return []
+
+        alerts = []
+        values = {'rmse': stats.rmse, 'mae': stats.mae, 'bias': abs(stats.bias)}
+        for metric, limit in self.thresholds.items():
+            if values[metric] > limit:
+                alerts.append({'area': key[0], 'hour': key[1], 'metric': metric, 'value': values[metric], 'threshold': limit})
+        return alerts
+
+    def to_points(self, timestamp=None):
+        """Returns the current state as InfluxDB points, one per area and hour."""
+        timestamp = timestamp or self.last_time or datetime.now()
+        points = []
+        for (area, hour), stats in sorted(self.stats.items()):
+            points.append(
+                Point(ERROR_MEASUREMENT)
+                .tag("area", area)
+                .tag("hour", f"{hour:02d}")
+                .field("rmse", stats.rmse)
+                .field("mae", stats.mae)
+                .field("bias", stats.bias)
+                .field("count", stats.count)
+                .field("drift", bool(self.check((area, hour))))
+                .time(timestamp, WritePrecision.NS)
+            )
+        return points
+
+    def to_prometheus(self):
+        """Returns the current state in the Prometheus text exposition format."""
+        lines = []
+        metrics = [
+            ('prediction_rmse', 'gauge', 'Rolling RMSE of the predicted price', lambda s: s.rmse),
+            ('prediction_mae', 'gauge', 'Rolling MAE of the predicted price', lambda s: s.mae),
+            ('prediction_bias', 'gauge', 'Rolling bias (predicted - actual) of the predicted price', lambda s: s.bias),
+            ('prediction_errors_total', 'counter', 'Predicted/actual pairs seen', lambda s: s.total_count),
+            ('prediction_drift', 'gauge', '1 if a drift threshold is exceeded', None),
+        ]
+        for name, kind, description, value in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (area, hour), stats in sorted(self.stats.items()):
+                result = value(stats) if value else int(bool(self.check((area, hour))))
+                lines.append(f'{name}{{area="{area}",hour="{hour:02d}"}} {result}')
+        return "\n".join(lines) + "\n"
+
+    def save(self, filename=STATE_FILE):
+        """Save the state, so the next run continues where this one stopped."""
+        state = {
+            'window': self.window,
+            'thresholds': self.thresholds,
+            'min_count': self.min_count,
+            'last_time': self.last_time.isoformat() if self.last_time else None,
+            'stats': [[area, hour, stats.to_dict()] for (area, hour), stats in self.stats.items()],
+        }
+        tmp_file = filename + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, filename)
+
+    @classmethod
+    def load(cls, filename=STATE_FILE, **kwargs):
+        """Load a saved state, or start a new monitor if there is none."""
+        if not os.path.exists(filename):
+            return cls(**kwargs)
+
+        with open(filename, 'r') as f:
+            state = json.load(f)
+        monitor = cls(state['window'], state['thresholds'], state['min_count'])
+        monitor.last_time = datetime.fromisoformat(state['last_time']) if state['last_time'] else None
+        for area, hour, stats in state['stats']:
+            monitor.stats[(area, hour)] = RollingErrorStats.from_dict(stats)
+        return monitor
+
+
+def main():
+    db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket="elpris")
+    monitor = DriftMonitor.load()
+
+    # Only read what has arrived since the last run
+    start = monitor.last_time + timedelta(hours=1) if monitor.last_time else datetime.now() - timedelta(days=monitor.window)
+    rows = db.read_predicted_vs_actual(start, datetime.now())
+    alerts = monitor.update_rows(rows)
+
+    for alert in alerts:
+        print(f"Drift: {alert['area']} {alert['hour']:02d}:00 {alert['metric']} = {alert['value']:.3f} (threshold {alert['threshold']})")
+    if not alerts:
+        print("No drift detected.")
+
+    db.write_points(monitor.to_points())
+    monitor.save()
+    db.exit()
+
+
+if __name__ == "__main__":
+    main()
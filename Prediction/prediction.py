@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import requests
 from datetime import datetime, timedelta
@@ -6,7 +7,13 @@ import pandas as pd
 from dmi_open_data import DMIOpenDataClient, Parameter
 import time
 from dotenv import load_dotenv
-import joblib
+from model_registry import ModelRegistry
+from features import DATA_FILE, build_features, history_span, load_dataset
+from metrics import metrics
+
+# The Influx class lives in the Influx folder next to this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Influx'))
+from influx import Influx
 
 # Load environment variables
 load_dotenv()
@@ -19,6 +26,14 @@ client = DMIOpenDataClient(api_key=API_KEY)
 # Default coordinates (Odense)
 DEFAULT_COORDS = [10.3883, 55.3959]
 
+# InfluxDB setup, predictions are stored so dashboards and the scheduler can reuse them
+INFLUX_URL = "http://localhost:8086"
+INFLUX_ORG = "ucl"
+INFLUX_BUCKET = "elpris"
+
+# Model registry, picks up newly published models without a restart
+registry = ModelRegistry()
+
 def get_date_ranges(start_date):
     """
     Get the date range for weather observations.
@@ -32,7 +47,8 @@ def get_stations(parameter_name):
     """
     Get a list of stations that provide a specific parameter.
     """
-    stations = client.get_stations(limit=10000)
+    with metrics.timer("dmi_stations", parameter=parameter_name):
+        stations = client.get_stations(limit=10000)
     return [station for station in stations if parameter_name in station['properties'].get('parameterId', [])]
 
 def find_closest_station(stations, coords):
@@ -50,14 +66,19 @@ def get_observations(parameter, station_id, from_time, to_time, limit=144):
     """
     Get weather observations for a specified parameter and station.
     """
-    return client.get_observations(
-        parameter=parameter,
-        station_id=station_id,
-        from_time=from_time,
-        to_time=to_time,
-        limit=limit
-    )
-
+    name = getattr(parameter, 'value', parameter)
+    with metrics.timer("dmi_observations", parameter=name):
+        observations = client.get_observations(
+            parameter=parameter,
+            station_id=station_id,
+            from_time=from_time,
+            to_time=to_time,
+            limit=limit
+        )
+    metrics.count("observations", len(observations), parameter=name)
+    return observations
+
+@metrics.timed("resample")
 def average_hourly(observations, decimals=1):
     """
     Average observations over each hour to get 24 measurements.
@@ -105,7 +126,8 @@ def get_temperature(from_time, to_time, coords=DEFAULT_COORDS):
 
 def fetch_response_data(api_time):
     url = "https://api.energifyn.dk/api/graph/consumptionprice?date=" + api_time
-    response = requests.get(url)
+    with metrics.timer("energifyn_request"):
+        response = requests.get(url)
     return response.json() if response.status_code == 200 else None
 
 def prepare_data(EW: str, data: dict):
@@ -136,15 +158,13 @@ def combine_hourly_data(start_timex, cloud_cover_data, temperature_data, wind_sp
 
     return combined_data
 
-def main():
+def collect_day(day):
+    """Fetch the prices and weather for a day and combine them into 24 hourly rows."""
     global response_data
 
-    # Get yesterday's date
-    yesterday = datetime.now() - timedelta(days=7)
-
-    print("Getting data for:", str(yesterday))
+    print("Getting data for:", str(day))
     # Prepare time ranges for weather and price data retrieval
-    api_time, from_time, to_time = get_date_ranges(yesterday)
+    api_time, from_time, to_time = get_date_ranges(day)
 
     # Fetch electricity prices
     response_data = fetch_response_data(api_time)
@@ -158,43 +178,68 @@ def main():
     west_prices, east_prices = get_daily_prices()
 
     # Combine the data, now including wind speed
-    combined_hourly_data = combine_hourly_data(yesterday, cloud_cover_data, temperature_data, wind_speed_data, west_prices, east_prices)
+    return combine_hourly_data(day, cloud_cover_data, temperature_data, wind_speed_data, west_prices, east_prices)
 
-    # Load pre-trained model and scaler
-    model = joblib.load('multi_output_model.pkl')
-    scaler = joblib.load('scaler.pkl')  # Load the scaler
+def price_text(price):
+    """A price with two decimals, or '-' if it is missing."""
+    return "-" if price is None or price != price else f"{price:.2f}"
 
-    # Prepare features for prediction (cloud cover, temperature, wind speed, hour, day_of_week, month)
-    features = []
-    for hour in range(24):
-        entry = combined_hourly_data[hour]
-        timestamp = pd.to_datetime(entry['timestamp'])  # Convert timestamp to datetime
-        hour_of_day = timestamp.hour
-        day_of_week = timestamp.dayofweek
-        month = timestamp.month
-
-        features.append([
-            entry['cloud_cover'],
-            entry['temperature'],
-            entry['wind_speed'],  # Include wind speed as a feature
-            hour_of_day,
-            day_of_week,
-            month
-        ])
-
-    # Convert features to a DataFrame or array
-    features_df = pd.DataFrame(features, columns=['cloud_cover', 'temperature', 'wind_speed', 'hour', 'day_of_week', 'month'])
-
-    # Scale the features before making predictions
-    features_scaled = scaler.transform(features_df)
+def main(day=None, rows=None, export_metrics=True):
+    """
+    Predict the prices for a day and compare them with the actual prices.
+    Raises ValueError if a feature is missing, e.g. when the dataset lacks the week before the day.
+
+    Args:
+        day (datetime): The day to predict, default a week ago (for a date range use backtest.py).
+        rows (list): The day's 24 hourly rows if they have already been collected (e.g. by
+                     ml_data.collect_day in the pipeline daemon); fetched when None.
+        export_metrics (bool): Export the metrics at the end; False when the caller exports
+                               them for a larger run (the pipeline daemon).
+
+    Returns:
+        array: The predicted west and east price per hour.
+    """
+    combined_hourly_data = rows if rows is not None else collect_day(day or datetime.now() - timedelta(days=7))
+
+    # Get the current model and its scaler from the registry
+    bundle = registry.get()
+    print("Using model version:", bundle.version)
+
+    # Build the features the model was trained with, using the local dataset as history
+    day_df = pd.DataFrame(combined_hourly_data)
+    day_df['timestamp'] = pd.to_datetime(day_df['timestamp'])
+    history = None
+    if os.path.exists(DATA_FILE):
+        with metrics.timer("dataset_load"):
+            history = load_dataset(DATA_FILE)
+        history = history[history['timestamp'] < day_df['timestamp'].min()]
+    with metrics.timer("features"):
+        features_df = build_features(day_df, bundle.feature_schema, history)
+
+    # The model was only trained on complete rows, it can't predict from missing features
+    missing = features_df.columns[features_df.isna().any()].tolist()
+    if missing:
+        raise ValueError(f"Missing features {', '.join(missing)}; {DATA_FILE} needs the {history_span(bundle.feature_schema)} hours "
+                         f"before the day, and the day's weather has to be complete")
 
     print("Making prediction...")
-    # Make predictions
-    predicted_prices = model.predict(features_scaled)
+    # Scale the features and make predictions
+    with metrics.timer("predict"):
+        predicted_prices = bundle.predict(features_df)
+
+    # Store the predictions, tagged with the model version
+    token = os.getenv('influxToken')
+    db = None
+    if token:
+        db = Influx(url=INFLUX_URL, org=INFLUX_ORG, token=token, bucket=INFLUX_BUCKET)
+        with metrics.timer("influx_write"):
+            db.write_predictions(day_df['timestamp'].dt.to_pydatetime(), predicted_prices, bundle.version)
+    else:
+        print("influxToken is not set, predictions are not stored.")
 
     # Compare predicted and actual prices
-    actual_west_prices = [price[1] for price in west_prices]
-    actual_east_prices = [price[1] for price in east_prices]
+    actual_west_prices = [row['west_price'] for row in combined_hourly_data]
+    actual_east_prices = [row['east_price'] for row in combined_hourly_data]
     final_prices_Prediction = []
     final_prices_actual = []
 
@@ -202,10 +247,10 @@ def main():
     for hour in range(24):
         #print(f"{hour:02d}:00 | {predicted_prices[hour][0]:.2f}                 | {actual_west_prices[hour]:.2f}              | "
          #     f"{predicted_prices[hour][1]:.2f}                 | {actual_east_prices[hour]:.2f}")
-        print(f"{hour:02d}:00 | {predicted_prices[hour][0]:.2f}/{predicted_prices[hour][1]:.2f}  | {actual_west_prices[hour]:.2f}/{actual_east_prices[hour]:.2f}")
+        print(f"{hour:02d}:00 | {predicted_prices[hour][0]:.2f}/{predicted_prices[hour][1]:.2f}  | {price_text(actual_west_prices[hour])}/{price_text(actual_east_prices[hour])}")
         # Create the Excel-compatible lists
         final_prices_Prediction.append(f"{predicted_prices[hour][0]:.2f}/{predicted_prices[hour][1]:.2f}")
-        final_prices_actual.append(f"{actual_west_prices[hour]:.2f}/{actual_east_prices[hour]:.2f}")
+        final_prices_actual.append(f"{price_text(actual_west_prices[hour])}/{price_text(actual_east_prices[hour])}")
 
     print("Prediction of prices Excel compatible:")
     for i in final_prices_Prediction:
@@ -214,8 +259,16 @@ def main():
     print("Actual prices Excel compatible:")
     for i in final_prices_actual:
         print(i)
+
+    # Where the time went, to InfluxDB and (if PROMETHEUS_FILE is set) for Prometheus
+    if export_metrics:
+        metrics.export(db, os.getenv('PROMETHEUS_FILE'))
+    if db is not None:
+        db.exit()
+
+    return predicted_prices
     
 
 
 if __name__ == "__main__":
-    main()
+    main(datetime.strptime(sys.argv[1], "%Y-%m-%d") if len(sys.argv) > 1 else None)
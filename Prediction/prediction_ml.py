@@ -1,42 +1,35 @@
-import json
-import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.multioutput import MultiOutputRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import root_mean_squared_error, r2_score
-import joblib
-
-# Step 1: Load the data from the JSON file
-with open('ml_data.json') as f:
-    data = json.load(f)
-
-# Convert the loaded JSON data to a pandas DataFrame
-df = pd.DataFrame(data)
+from model_registry import ModelRegistry
+import sys
+from features import DEFAULT_SCHEMA, build_features, feature_columns, load_dataset
+
+# Step 1: Load the data from the JSON file (sorted by timestamp).
+# With --influx the newest prices and weather are exported from InfluxDB first and used instead.
+if '--influx' in sys.argv:
+    from export_influx import EXPORT_FILE, export_from_env
+    export_from_env()
+    df = load_dataset(EXPORT_FILE)
+else:
+    df = load_dataset('ml_data.json')
 
 # Check if 'timestamp' is a valid column in the DataFrame
 if 'timestamp' not in df.columns:
     raise KeyError("The 'timestamp' column is missing from the dataset.")
 
-# Step 2: Feature extraction from the timestamp
-df['timestamp'] = pd.to_datetime(df['timestamp'])
-df['hour'] = df['timestamp'].dt.hour
-df['day_of_week'] = df['timestamp'].dt.dayofweek
-df['month'] = df['timestamp'].dt.month
-
-# Drop the original timestamp column (if you want to keep it for sorting, comment this out)
-# df = df.drop('timestamp', axis=1)
-
-# Step 3: Handle NaN values
-df = df.dropna(subset=['west_price', 'east_price'])
+# Step 2: Build the features (time, weather, lagged and rolling prices) for the whole dataset
+FEATURES = feature_columns(DEFAULT_SCHEMA)
+features = build_features(df, DEFAULT_SCHEMA)
 
-# **Reverse the dataset** - Uncomment the next two lines if you want to reverse it
-df = df.sort_values('timestamp')  # Ensure it’s sorted in chronological order
-df = df.reset_index(drop=True)     # Reset index after sorting
+# Step 3: Handle NaN values (the first week has no lagged prices yet)
+complete = features.notna().all(axis=1) & df[['west_price', 'east_price']].notna().all(axis=1)
+df = df[complete]
 
 # Step 4: Define the feature matrix (X) and the target vector (y)
-# Updated X to include wind_speed along with cloud_cover, temperature, and timestamp-related features
-X = df[['cloud_cover', 'temperature', 'wind_speed', 'hour', 'day_of_week', 'month']]
+X = features[complete]
 y = df[['west_price', 'east_price']]
 
 # Step 5: Train-test split
@@ -68,6 +61,18 @@ mses_east = r2_score(y_test['east_price'], y_pred[:, 1])
 print(f'West Price r2 score: {mses_west}')
 print(f'East Price r2 score: {mses_east}')
 
-# Step 9: Save the model and the scaler
-joblib.dump(model, 'multi_output_model.pkl')
-joblib.dump(scaler, 'scaler.pkl')
+# Step 9: Publish the model and the scaler together as a new version in the registry
+version = ModelRegistry().publish(
+    model,
+    scaler,
+    FEATURES,
+    feature_schema=DEFAULT_SCHEMA,
+    training_window=(df['timestamp'].min(), df['timestamp'].max()),
+    metrics={
+        'west_rmse': float(mse_west),
+        'east_rmse': float(mse_east),
+        'west_r2': float(mses_west),
+        'east_r2': float(mses_east),
+    },
+)
+print(f'Published model version {version}')
@@ -0,0 +1,254 @@
+import os
+import sys
+import gzip
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# Synthetic prices and weather for load tests: any date range, number of sites and resolution.
+#
+# Weather is a regional field shared by all sites (seasons, day/night, fronts lasting days)
+# plus local noise per site, so sites are correlated like real ones. Prices follow the
+# regional weather: wind pushes them down, cold pushes them up, and on top of that come the
+# daily and weekly demand shape, a level that changes from year to year, short spikes and,
+# with strong wind at night or in weekends, negative prices.
+#
+# Output is the training dataset format (one file per site, like ml_data.json) and InfluxDB
+# line protocol in schema v2 (prices per area, weather per site), to a file or straight to
+# InfluxDB.
+#
+#   python synthetic_data.py --years 10 --sites 1000 --lines load.lp
+#   python synthetic_data.py --years 3 --dataset synthetic/
+
+load_dotenv()
+
+START = "2015-01-01"
+ODENSE = (10.3883, 55.3959)  # Site 0, where the real data is collected
+STOREBAELT = 11.0            # Sites east of this longitude are in the east price area
+LINES_PER_WRITE = 5000       # Lines per request when writing to InfluxDB
+
+
+def smooth_noise(rng, n, steps, sigma=1.0):
+    """
+    Noise with unit variance (times sigma) that changes slowly: an AR(1) process with a time
+    constant of `steps`, made by convolving white noise with its exponential kernel (FFT).
+    With steps below 1 (coarse resolutions) the kernel is short and the noise close to white.
+    """
+    phi = np.exp(-1.0 / steps)
+    k = min(int(6 * steps) + 1, n)
+    kernel = phi ** np.arange(k)
+    kernel /= np.sqrt(np.sum(kernel ** 2))
+    white = rng.standard_normal(n + k)
+    size = n + 2 * k
+    smooth = np.fft.irfft(np.fft.rfft(white, size) * np.fft.rfft(kernel, size), size)
+    return sigma * smooth[k:k + n]
+
+
+def make_sites(count, rng):
+    """Site 0 is Odense, the rest are spread over Denmark. Returns a DataFrame with name, lon, lat, area."""
+    lon = np.concatenate([[ODENSE[0]], rng.uniform(8.1, 12.6, count - 1)])
+    lat = np.concatenate([[ODENSE[1]], rng.uniform(54.6, 57.7, count - 1)])
+    names = ["odense"] + [f"site{i:04d}" for i in range(1, count)]
+    return pd.DataFrame({"name": names, "lon": lon, "lat": lat, "area": np.where(lon > STOREBAELT, "east", "west")})
+
+
+class SyntheticData:
+    def __init__(self, start=START, stop=None, sites=1, resolution=60, seed=1):
+        """
+        Args:
+            start (str): First timestamp, e.g. "2015-01-01".
+            stop (str): End (not included), default 10 years after start.
+            sites (int): Number of weather sites.
+            resolution (int): Minutes between rows.
+            seed (int): Same seed, same data.
+        """
+        start = pd.Timestamp(start)
+        stop = pd.Timestamp(stop) if stop else start + pd.DateOffset(years=10)
+        self.times = pd.date_range(start, stop, freq=f"{resolution}min", inclusive="left")
+        self.steps_per_hour = 60 / resolution
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.sites = make_sites(sites, self.rng)
+
+        hour = self.times.hour.to_numpy() + self.times.minute.to_numpy() / 60
+        season = np.cos(2 * np.pi * (self.times.dayofyear.to_numpy() - 20) / 365.25)  # 1 in winter, -1 in summer
+        self.hour, self.season = hour, season
+        self.weekend = self.times.dayofweek.to_numpy() >= 5
+        self.regional = self._regional_weather()
+        self.prices = self._prices()
+        self._timestamps = None
+
+    def _hours(self, hours):
+        return hours * self.steps_per_hour
+
+    def _regional_weather(self):
+        n, rng = len(self.times), self.rng
+        fronts = smooth_noise(rng, n, self._hours(48))
+        temperature = (8.5 - 8 * self.season + (3 - self.season) * np.sin(2 * np.pi * (self.hour - 9) / 24)
+                       + 3 * smooth_noise(rng, n, self._hours(72)) - 1.5 * fronts)
+        wind_speed = np.maximum(6 + 1.5 * self.season + 3 * fronts + smooth_noise(rng, n, self._hours(6)), 0)
+        cloud = 55 + 15 * self.season + 25 * fronts + 15 * smooth_noise(rng, n, self._hours(8))
+        return {"temperature": temperature, "wind_speed": wind_speed, "cloud_cover": np.clip(cloud, 0, 100)}
+
+    def _prices(self):
+        """Price and tariff per area, in DKK/kWh."""
+        n, rng = len(self.times), self.rng
+        years = self.times.year.to_numpy()
+        level = {year: np.exp(rng.normal(0, 0.3)) for year in np.unique(years)}  # Some years are expensive
+        demand = (0.55 + 0.35 * np.exp(-((self.hour - 8) ** 2) / 6) + 0.5 * np.exp(-((self.hour - 18) ** 2) / 5)
+                  - 0.2 * self.weekend)
+        spot = (np.vectorize(level.get)(years) * (0.6 + 0.2 * self.season) * demand
+                - 0.05 * (self.regional["wind_speed"] - 6) - 0.01 * (self.regional["temperature"] - 10)
+                + 0.08 * smooth_noise(rng, n, self._hours(24)))
+
+        # Spikes of a few hours (at least one step at coarse resolutions), mostly when demand is high
+        starts = rng.random(n) < 0.002 / self.steps_per_hour * demand
+        spikes = np.convolve(starts * rng.exponential(1.5, n), np.ones(max(1, round(self._hours(3)))), "full")[:n]
+
+        # Strong wind with low demand: the surplus pushes the price below zero
+        surplus = np.maximum(self.regional["wind_speed"] - 10, 0) * (demand < 0.7) * 0.1
+
+        peak = (self.hour >= 17) & (self.hour < 21)
+        tarif = np.where(peak, np.where(self.season > 0, 0.9, 0.4), 0.2)
+        prices = {}
+        for area, offset, wind in (("west", 0.0, 1.0), ("east", 0.05, 0.7)):
+            area_spot = spot + offset + (1 - wind) * 0.05 * (self.regional["wind_speed"] - 6) + spikes - surplus * wind
+            prices[f"{area}_price"] = np.round(area_spot * 1.25 + tarif, 4)  # With VAT, and the tariff on top
+            prices[f"{area}_tarif"] = tarif
+        return prices
+
+    def site_weather(self, index):
+        """Weather at one site: the regional field plus local noise and a fixed local offset."""
+        rng = np.random.default_rng([self.seed, index])
+        n = len(self.times)
+        coast = rng.uniform(-1, 2)
+        temperature = self.regional["temperature"] + rng.normal(0, 0.7) + smooth_noise(rng, n, self._hours(12))
+        wind_speed = np.maximum(self.regional["wind_speed"] + coast + 1.2 * smooth_noise(rng, n, self._hours(3)), 0)
+        cloud_cover = np.clip(self.regional["cloud_cover"] + 10 * smooth_noise(rng, n, self._hours(4)), 0, 100)
+        return {
+            "cloud_cover": np.round(cloud_cover, 1),
+            "temperature": np.round(temperature, 1),
+            "wind_speed": np.round(wind_speed, 1),
+        }
+
+    def dataset(self, index=0):
+        """One site in the training dataset format (the columns of ml_data.json)."""
+        weather = self.site_weather(index)
+        return pd.DataFrame({
+            "timestamp": self.timestamps(),
+            **weather,
+            "west_price": self.prices["west_price"],
+            "east_price": self.prices["east_price"],
+        })
+
+    def timestamps(self):
+        """The times as ISO strings, made once and shared by every site."""
+        if self._timestamps is None:
+            self._timestamps = self.times.strftime("%Y-%m-%dT%H:%M:%S")
+        return self._timestamps
+
+    def write_dataset(self, folder, sites=None):
+        """Write <folder>/<site>.json for each site. Returns the number of rows written."""
+        os.makedirs(folder, exist_ok=True)
+        rows = 0
+        for index in sites if sites is not None else range(len(self.sites)):
+            df = self.dataset(index)
+            df.to_json(os.path.join(folder, self.sites.name[index] + ".json"), orient="records")
+            rows += len(df)
+        return rows
+
+    def _seconds(self):
+        # Naive times are stored as if they were UTC, like everywhere else
+        return ((self.times - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).to_numpy()
+
+    def write_lines(self, out):
+        """
+        Write everything as line protocol to a text stream: prices per area, then weather per site.
+
+        Returns:
+            int: The number of lines written.
+        """
+        seconds = self._seconds()
+        lines = 0
+        for area in ("west", "east"):
+            table = np.column_stack([self.prices[f"{area}_price"], self.prices[f"{area}_tarif"], seconds])
+            np.savetxt(out, table, fmt=f"prices,area={area} price=%.4f,tarif_price=%.2f %d")
+            lines += len(table)
+        for index, name in enumerate(self.sites.name):
+            weather = self.site_weather(index)
+            table = np.column_stack([weather["cloud_cover"], weather["temperature"], weather["wind_speed"], seconds])
+            np.savetxt(out, table, fmt=f"weather,site={name} cloud_cover=%.1f,temperature=%.1f,wind_speed=%.1f %d")
+            lines += len(table)
+        return lines
+
+
+class InfluxStream:
+    """A text stream that sends complete lines to InfluxDB in batches, for write_lines."""
+
+    def __init__(self, db, batch=LINES_PER_WRITE):
+        self.db = db
+        self.batch = batch
+        self.buffer = []
+        self.rest = ""
+        self.failed = 0
+
+    def write(self, text):
+        lines = (self.rest + text).split("\n")
+        self.rest = lines.pop()
+        self.buffer += lines
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.buffer and not self.db.write_lines(self.buffer):
+            self.failed += len(self.buffer)
+        self.buffer = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic prices and weather.")
+    parser.add_argument("--start", default=START)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--sites", type=int, default=1)
+    parser.add_argument("--resolution", type=int, default=60, help="Minutes between rows")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dataset", help="Folder for one dataset file per site")
+    parser.add_argument("--lines", help="Line protocol file (.gz to compress)")
+    parser.add_argument("--influx", action="store_true", help="Write the line protocol to InfluxDB")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stop = pd.Timestamp(args.start) + pd.Timedelta(days=round(args.years * 365.25))
+    data = SyntheticData(args.start, stop, args.sites, args.resolution, args.seed)
+    print(f"{len(data.times)} timestamps x {args.sites} sites, prices in {time.perf_counter() - start:.1f} s")
+
+    if args.dataset:
+        start = time.perf_counter()
+        rows = data.write_dataset(args.dataset)
+        print(f"Dataset: {rows} rows in {time.perf_counter() - start:.1f} s ({rows / (time.perf_counter() - start):,.0f} rows/s)")
+
+    if args.lines:
+        start = time.perf_counter()
+        opener = gzip.open if args.lines.endswith(".gz") else open
+        with opener(args.lines, "wt") as out:
+            lines = data.write_lines(out)
+        print(f"Line protocol: {lines} lines in {time.perf_counter() - start:.1f} s ({lines / (time.perf_counter() - start):,.0f} lines/s)")
+
+    if args.influx:
+        # The Influx class lives in the Influx folder next to this one
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Influx'))
+        from influx import Influx
+
+        db = Influx(url="http://localhost:8086", org="ucl", token=os.getenv('influxToken'), bucket="elpris")
+        start = time.perf_counter()
+        stream = InfluxStream(db)
+        lines = data.write_lines(stream)
+        stream.flush()
+        db.exit()
+        print(f"InfluxDB: {lines - stream.failed} of {lines} lines written in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()